@@ -28,5 +28,6 @@ setup(
 
     # requirements
     install_requires=["abjad"],
+    extras_require={"render": ["numpy"]},
     python_requires='>=3.7',
 )
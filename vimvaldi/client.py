@@ -0,0 +1,149 @@
+"""A module for the thin client of the editor server (see server.py). It only sends the
+keys to a session of the server and draws the frame diffs that it receives, so it
+doesn't import abjad (or anything else that is slow to import)."""
+
+import curses
+import json
+import os
+import select
+import signal
+import socket
+import sys
+
+from vimvaldi.utilities import *
+
+
+class Client:
+    """A client attached to a session of the server."""
+
+    def __init__(self, connection: socket.socket, session: str):
+        self.connection = connection
+        self.session = session
+
+        # the attributes of the color pairs of the server (by their numbers)
+        self.pairs: Dict[int, int] = {0: 0}
+
+    def send(self, message: dict):
+        """Send the message to the server."""
+        self.connection.sendall((json.dumps(message) + "\n").encode())
+
+    def run(self, window):
+        """Attach to the session and forward the keys/draw the frames until either the
+        session or the connection is closed."""
+        Colors.initialize()
+
+        window.nodelay(True)
+
+        # like the editor itself, the client isn't terminated by ^C
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        # the resizes are noticed through a pipe, since they don't make stdin readable
+        resizes, resize_writer = os.pipe()
+        os.set_blocking(resize_writer, False)
+
+        signal.signal(signal.SIGWINCH, lambda _, __: None)
+        signal.set_wakeup_fd(resize_writer)
+
+        self.send({"attach": self.session, "size": window.getmaxyx()})
+
+        received = b""
+        while True:
+            readable, _, _ = select.select(
+                [sys.stdin, self.connection, resizes], [], []
+            )
+
+            if resizes in readable:
+                os.read(resizes, 1024)
+
+                size = os.get_terminal_size(sys.stdin.fileno())
+                curses.resizeterm(size.lines, size.columns)
+
+                self.send({"size": window.getmaxyx()})
+
+            if sys.stdin in readable:
+                keys = []
+
+                while True:
+                    try:
+                        keys.append(window.get_wch())
+                    except curses.error as e:
+                        break
+
+                keys = [k for k in keys if k != curses.KEY_RESIZE]
+                if len(keys) != 0:
+                    self.send({"keys": keys})
+
+            if self.connection in readable:
+                data = self.connection.recv(1 << 16)
+
+                if len(data) == 0:
+                    return
+
+                *lines, received = (received + data).split(b"\n")
+
+                for line in lines:
+                    message = json.loads(line)
+
+                    if message.get("quit"):
+                        return
+
+                    self.draw(window, message)
+
+    def draw(self, window, frame: dict):
+        """Draw the frame diff."""
+        for pair, foreground, background in frame["pairs"]:
+            if (
+                pair < curses.COLOR_PAIRS
+                and foreground < curses.COLORS
+                and background < curses.COLORS
+            ):
+                curses.init_pair(pair, foreground, background)
+                self.pairs[pair] = curses.color_pair(pair)
+            else:
+                self.pairs[pair] = 0
+
+        if frame["clear"]:
+            window.erase()
+
+        for y, runs in frame["rows"]:
+            for x, text, attribute in runs:
+                attribute = attribute & ~curses.A_COLOR | self.pairs.get(
+                    Colors.pair_number(attribute), 0
+                )
+
+                # the bottom right corner (or a terminal smaller than the screen)
+                try:
+                    window.addstr(y, x, text, attribute)
+                except curses.error as e:
+                    pass
+
+        if frame["cursor"] is not None:
+            try:
+                window.move(*frame["cursor"])
+                curses.curs_set(1)
+            except curses.error as e:
+                curses.curs_set(0)
+        else:
+            curses.curs_set(0)
+
+        window.refresh()
+
+
+def attach(path: str, session: str):
+    """Attach to the session (creating it, if it doesn't exist) of the server listening
+    on the socket with the given path."""
+    # a socket that isn't the user's might be of someone else's server
+    try:
+        check_socket(path)
+    except PermissionError as e:
+        sys.exit(f"Not attaching: {e}")
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        connection.connect(path)
+    except OSError as e:
+        sys.exit(f"No server is listening on {path} (start it by vimvaldi --server).")
+
+    with connection:
+        curses.wrapper(Client(connection, session).run)
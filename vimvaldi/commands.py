@@ -10,10 +10,43 @@ class Command:
     """The default command class that is inherited by all other command classes."""
 
 
+class CommandDispatcher:
+    """A table of command handlers, keyed by the type of the command. A command is
+    handled by the handler of the most specific type in its MRO, which is only looked
+    up once per type and then cached, so dispatching a command is O(1)."""
+
+    def __init__(self, handlers: Dict[type, Callable[[Command], Any]]):
+        self.handlers = handlers
+        self.cache: Dict[type, Optional[Callable[[Command], Any]]] = {}
+
+    def get_handler(self, command: Command) -> Optional[Callable[[Command], Any]]:
+        """Return the handler of the given command (None if there isn't one)."""
+        command_type = type(command)
+
+        if command_type not in self.cache:
+            self.cache[command_type] = next(
+                (self.handlers[t] for t in command_type.__mro__ if t in self.handlers),
+                None,
+            )
+
+        return self.cache[command_type]
+
+    def dispatch(self, command: Command) -> Optional[List[Command]]:
+        """Let the appropriate handler handle the command, returning its result."""
+        handler = self.get_handler(command)
+
+        if handler is not None:
+            return handler(command)
+
+
 class GeneralCommand(Command):
     """Other commands that didn't really fit anywhere else."""
 
 
+class ExitCommand(GeneralCommand):
+    """Terminate the program (or close the session, when running in the server)."""
+
+
 @dataclass
 class ToggleFocusCommand(GeneralCommand):
     """A command to toggle focus from the status line to the current main component."""
@@ -21,6 +54,39 @@ class ToggleFocusCommand(GeneralCommand):
     suppress_clear = False
 
 
+@dataclass
+class ProfileCommand(GeneralCommand):
+    """Start/stop the profiler or dump its results to a file."""
+
+    action: str  # start/stop/dump
+    path: str = None  # where to dump the results
+
+
+@dataclass
+class RecordMacroCommand(GeneralCommand):
+    """Start recording the keys into a register (stop recording if it's None)."""
+
+    register: str = None
+
+
+@dataclass
+class ReplayMacroCommand(GeneralCommand):
+    """Replay the keys recorded in a register (@ for the previously replayed one)."""
+
+    register: str
+    count: int = 1
+
+
+@dataclass
+class BackgroundCommand(GeneralCommand):
+    """Run the job in the background -- a function on a background thread or a
+    coroutine on the event loop. The commands that it returns are resolved once it
+    finishes."""
+
+    job: Union[Callable[[], List[Command]], Awaitable[List[Command]]]
+    description: str  # what the job does (for the error message if it fails)
+
+
 class IOCommand(Command):
     """Things related to file IO."""
 
@@ -48,6 +114,37 @@ class OpenCommand(IOCommand):
     forced: bool = False  # o! (overwrite currently open file)
 
 
+@dataclass
+class EditCommand(IOCommand):
+    """Switch to the buffer of a file, opening it in a new one if it isn't open."""
+
+    path: str = None
+
+
+@dataclass
+class LoadBuffersCommand(IOCommand):
+    """Read the files into new buffers in the background (in parallel)."""
+
+    paths: List[str]
+
+
+@dataclass
+class ExportCommand(IOCommand):
+    """Export the score to a file of another format (MIDI or MusicXML)."""
+
+    path: str = None
+    forced: bool = False  # export! (overwrite an existing file)
+
+
+@dataclass
+class RenderCommand(IOCommand):
+    """Render the score to an audio (WAV) file."""
+
+    path: str = None
+    tempo: str = None  # in quarter notes per minute
+    forced: bool = False  # render! (overwrite an existing file)
+
+
 @dataclass
 class NewCommand(IOCommand):
     """Throw away the currently edited score."""
@@ -104,6 +201,78 @@ class InsertCommand(EditorCommand):
     text: str
 
 
+@dataclass
+class SearchCommand(EditorCommand):
+    """Search for a sequence of items (None to repeat the previous search)."""
+
+    pattern: str = None
+    backward: bool = False  # N
+
+
+@dataclass
+class TransposeCommand(EditorCommand):
+    """Transpose the items in the range of measures (the entire score by default)."""
+
+    interval: str  # +M3, -P8, -2 (semitones)...
+    range: str = None  # N or N-M
+
+
+@dataclass
+class ScaleDurationsCommand(EditorCommand):
+    """Scale the durations of the items in the range of measures."""
+
+    factor: str  # 2, 1/2, 3/2...
+    range: str = None  # N or N-M
+
+
+@dataclass
+class FillScoreCommand(EditorCommand):
+    """Fill the chunks of the lazily loaded score that were decoded in the background
+    (if the score is still the one being edited)."""
+
+    score: Sequence  # the LazyScore that the chunks were decoded from
+    chunks: Dict[range, list]
+
+
+@dataclass
+class AddBufferCommand(EditorCommand):
+    """Add a buffer that was loaded in the background (see LoadBuffersCommand)."""
+
+    buffer: Any  # the Buffer (which is defined by the editor)
+
+
+@dataclass
+class SwitchBufferCommand(EditorCommand):
+    """Switch to the next/previous buffer."""
+
+    delta: int  # 1 for :bn, -1 for :bp
+
+
+class ListBuffersCommand(EditorCommand):
+    """List the open buffers on the status line."""
+
+
+@dataclass
+class SplitCommand(EditorCommand):
+    """Split the current pane into two panes of the same buffer."""
+
+    vertical: bool = False  # :vsplit (the panes side by side)
+
+
+@dataclass
+class ClosePaneCommand(EditorCommand):
+    """Close the current pane (or all of the other panes)."""
+
+    others: bool = False  # :only
+
+
+@dataclass
+class GoToMeasureCommand(EditorCommand):
+    """Move the cursor to the start of the given measure (numbered from 1)."""
+
+    measure: int
+
+
 @dataclass
 class SetCommand(EditorCommand):
     """Set an editor option to some value."""
@@ -3,10 +3,12 @@
 from __future__ import annotations
 
 import curses
-import logging  # DEBUG; TO BE REMOVED
+import logging
 import os
+import re
 import sys
 from abc import ABC, abstractmethod
+from fractions import Fraction
 from typing import *
 from signal import signal, SIGINT
 
@@ -16,10 +18,16 @@ sys.stdout = open(os.devnull, "w")
 import abjad
 
 from vimvaldi.commands import *
+from vimvaldi.keymaps import *
+from vimvaldi.lilypond import *
+from vimvaldi.midi import *
+from vimvaldi.musicxml import *
+from vimvaldi.music import *
+from vimvaldi.native import *
+from vimvaldi.render import *
+from vimvaldi.score import *
 
-# for debug
-logging.basicConfig(filename="vimvaldi.log", level=logging.DEBUG)
-print = logging.info
+logger = logging.getLogger(__name__)
 
 # catch SIGINT and prevent it from terminating the script
 signal(SIGINT, lambda _, __: None)
@@ -77,6 +85,20 @@ class Menu(Component):
         self.index = 0
         self.items = items
 
+        # which method handles which action of the keymap
+        self.keymap = KeyMap("menu")
+        self.actions = {
+            "next": lambda: self.__move(1),
+            "previous": lambda: self.__move(-1),
+            "page-down": lambda: self.__move(3),
+            "page-up": lambda: self.__move(-3),
+            "select": lambda: self.get_selected().commands,
+            "command-line": lambda: [
+                ToggleFocusCommand(),
+                SetStatusLineStateCommand(State.NORMAL),
+            ],
+        }
+
     def __move_index(self, delta):
         """Moves the index of the menu by delta positions (ignoring Nulls)."""
         self.index = min(max((self.index + delta), 0), len(self.items) - 1)
@@ -105,6 +127,11 @@ class Menu(Component):
         """Return the currently selected MenuItem object."""
         return self.items[self.index]
 
+    def __move(self, delta) -> List[Command]:
+        """Move the index of the menu, updating the status line."""
+        self.__move_index(delta)
+        return self.update_status_line()
+
     def update_status_line(self) -> List[Command]:
         """Return the command necessary for the status line to change label."""
         return [
@@ -115,33 +142,13 @@ class Menu(Component):
     def _handle_command(self, command: Command) -> Optional[List[Command]]:
         """React to Quit command by quitting."""
         if isinstance(command, QuitCommand):
-            quit()
+            return [ExitCommand()]
 
     def _handle_keypress(self, key) -> Optional[List[Command]]:
-        if key in ("j", 258):
-            self.next()
-            return self.update_status_line()
-
-        if key in ("k", 259):
-            self.previous()
-            return self.update_status_line()
-
-        if key == chr(4):  # ^D
-            self.__move_index(3)
-            return self.update_status_line()
+        action = self.keymap.feed(key)
 
-        if key == chr(21):  # ^U
-            self.__move_index(-3)
-            return self.update_status_line()
-
-        if key in (curses.KEY_ENTER, "\n", "\r", "l", 261):
-            return self.get_selected().commands
-
-        if key == ":":
-            return [
-                ToggleFocusCommand(),
-                SetStatusLineStateCommand(State.NORMAL),
-            ]
+        if action is not None:
+            return self.actions[action]()
 
 
 class LogoDisplay(Component):
@@ -150,15 +157,17 @@ class LogoDisplay(Component):
     def __init__(self, text: str):
         self.text = text
 
+        self.keymap = KeyMap("logo")
+
     def _handle_keypress(self, key) -> Optional[List[Command]]:
         """Go away from the logo when enter is pressed."""
-        if key in (curses.KEY_ENTER, "\n", "\r"):
+        if self.keymap.feed(key) == "close":
             return [PopComponentCommand()]
 
     def _handle_command(self, command: Command) -> Optional[List[Command]]:
         """React to Quit command by quitting."""
         if isinstance(command, QuitCommand):
-            quit()
+            return [ExitCommand()]
 
 
 class TextDisplay(Component):
@@ -170,22 +179,30 @@ class TextDisplay(Component):
         # the current offset of the text display (by lines)
         self.line_offset = 0
 
+        # which method handles which action of the keymap (the drawable adds paging,
+        # since only it knows the height of the text)
+        self.keymap = KeyMap("help")
+        self.actions = {
+            "scroll-down": lambda: self.scroll(1),
+            "scroll-up": lambda: self.scroll(-1),
+            "close": lambda: [PopComponentCommand()],
+        }
+
+    def scroll(self, delta: int):
+        """Scroll the text by delta lines."""
+        self.line_offset += delta
+        self.set_changed(True)
+
     def _handle_command(self, command: Command) -> Optional[List[Command]]:
         """React to Quit command by quitting."""
         if isinstance(command, QuitCommand):
-            quit()
+            return [ExitCommand()]
 
     def _handle_keypress(self, key) -> Optional[List[Command]]:
-        if key in ("j", curses.KEY_ENTER, "\n", "\r"):
-            self.line_offset += 1
-            self.set_changed(True)
+        action = self.keymap.feed(key)
 
-        elif key == "k":
-            self.line_offset -= 1
-            self.set_changed(True)
-
-        elif key == "q":
-            return [PopComponentCommand()]
+        if action in self.actions:
+            return self.actions[action]()
 
 
 class StatusLine(Component):
@@ -196,10 +213,28 @@ class StatusLine(Component):
 
     def __init__(self):
         self.text = ["", "", ""]  # left, center, right text
+        self.timing = ""  # the timing HUD (shown left of the right text)
 
         # current position of the cursor on the status line
         self.cursor_offset = 0
 
+        # which method handles which action of the keymap
+        self.keymap = KeyMap("status")
+        self.actions = {
+            "backspace": self.__backspace,
+            "delete": self.__delete,
+            "cancel": self.__cancel,
+            "left": lambda: self.__move_cursor(max(1, self.cursor_offset - 1)),
+            "right": lambda: self.__move_cursor(
+                min(len(self.text[0]), self.cursor_offset + 1)
+            ),
+            "word-left": self.__word_left,
+            "word-right": self.__word_right,
+            "home": lambda: self.__move_cursor(0),
+            "end": lambda: self.__move_cursor(len(self.text[0])),
+            "confirm": self.__confirm,
+        }
+
     def set_text(self, position: Position, text: str):
         """Change text at the specified position (left/center/right). Also, if the
         position is left, move the cursor to the very end (done when adding a partial
@@ -220,6 +255,11 @@ class StatusLine(Component):
 
         self.set_changed(True)
 
+    def set_timing(self, text: str):
+        """Set the text of the timing HUD."""
+        self.timing = text
+        self.set_changed(True)
+
     def clear(self):
         """Clear all text from the StatusLine."""
         for pos in Position:
@@ -236,214 +276,680 @@ class StatusLine(Component):
     def _handle_keypress(self, key) -> Optional[List[Command]]:
         self.set_changed(True)
 
-        # to simplify the code
+        action = self.keymap.feed(key)
+
+        if action is not None:
+            return self.actions[action]()
+
+        # else add the character to the first position (unless it may be a part of a
+        # sequence of the keymap)
+        if not self.keymap.is_pending():
+            pos = self.cursor_offset
+
+            self.text[0] = self.text[0][:pos] + str(key) + self.text[0][pos:]
+            self.cursor_offset += len(str(key))
+
+    def __backspace(self) -> Optional[List[Command]]:
+        """Delete the previous character (or transfer focus, if there is no text)."""
         pos = self.cursor_offset
 
-        # backspace: delete previous character
-        if key in (curses.KEY_BACKSPACE, "\b", chr(127)):
-            # delete when it's not in the first position
-            if pos > 0:
-                self.text[0] = self.text[0][: pos - 1] + self.text[0][pos:]
-                self.cursor_offset -= 1
+        # delete when it's not in the first position
+        if pos > 0:
+            self.text[0] = self.text[0][: pos - 1] + self.text[0][pos:]
+            self.cursor_offset -= 1
 
-            # if there is no text left, transfer focus
-            else:
-                if len(self.text[0]) == 0:
-                    self.clear_text(Position.LEFT)
-                    return [ToggleFocusCommand()]
+        # if there is no text left, transfer focus
+        else:
+            if len(self.text[0]) == 0:
+                self.clear_text(Position.LEFT)
+                return [ToggleFocusCommand()]
 
-        # delete: delete next character
-        elif key == curses.KEY_DC:
-            self.text[0] = self.text[0][:pos] + self.text[0][pos + 1 :]
+    def __delete(self):
+        """Delete the next character."""
+        pos = self.cursor_offset
+        self.text[0] = self.text[0][:pos] + self.text[0][pos + 1 :]
 
-        # escape: clear and transfer focus
-        elif isinstance(key, str) and ord(key) == 27:  # esc
-            self.clear()
-            return [ToggleFocusCommand()]
+    def __cancel(self) -> List[Command]:
+        """Clear and transfer focus."""
+        self.clear()
+        return [ToggleFocusCommand()]
 
-        # left: move cursor to the left
-        elif key == curses.KEY_LEFT:  # move cursor left
-            self.cursor_offset = max(1, pos - 1)
+    def __move_cursor(self, offset: int):
+        """Move the cursor to the offset."""
+        self.cursor_offset = offset
 
-        # right: move cursor to the right
-        elif key == curses.KEY_RIGHT:  # move cursor right
-            self.cursor_offset = min(len(self.text[0]), pos + 1)
+    def __word_left(self):
+        """Move the cursor to the start of the previous word."""
+        space_pos = self.text[0].rfind(" ", 0, self.cursor_offset - 1)
+        self.cursor_offset = space_pos + 1 if space_pos != -1 else 1
 
-        # ctrl + right: move by words
-        elif key == 553:
-            space_pos = self.text[0].rfind(" ", 0, self.cursor_offset - 1)
-            self.cursor_offset = space_pos + 1 if space_pos != -1 else 1
+    def __word_right(self):
+        """Move the cursor to the end of the next word."""
+        space_pos = self.text[0].find(" ", self.cursor_offset + 1)
+        self.cursor_offset = space_pos if space_pos != -1 else len(self.text[0])
 
-        # ctrl + left: move by words
-        elif key == 568:  # ctrl + right
-            space_pos = self.text[0].find(" ", self.cursor_offset + 1)
-            self.cursor_offset = space_pos if space_pos != -1 else len(self.text[0])
+    def __confirm(self) -> List[Command]:
+        """Execute the command (or insert/search)."""
+        # always toggle focus
+        commands = [ToggleFocusCommand()]
 
-        # home: move to position 0
-        elif key == curses.KEY_HOME:
-            self.cursor_offset = 0
+        # get and clear the text
+        text = self.text[0]
+        self.clear_text(Position.LEFT)
+
+        # send an insert command if the mode is insert
+        if self.current_state is State.INSERT:
+            commands.append(InsertCommand(text))
 
-        # end: move to the last position
-        elif key == curses.KEY_END:
-            self.cursor_offset = len(self.text[0])
+        # send a search command if the mode is search
+        elif self.current_state is State.SEARCH:
+            commands.append(SearchCommand(text))
 
-        # execute the command on enter
-        elif key in (curses.KEY_ENTER, "\n", "\r"):
-            # always toggle focus
-            commands = [ToggleFocusCommand()]
+        # else parse the various : commands
+        elif self.current_state is State.NORMAL:
+            command = text.strip()
+            command_parts = command.split()
 
-            # get and clear the text
-            text = self.text[0]
-            self.clear_text(Position.LEFT)
+            # return if there isn't anything in the command line
+            if len(command_parts) == 0:
+                return commands
 
-            # send an insert command if the mode is insert
-            if self.current_state is State.INSERT:
-                commands.append(InsertCommand(text))
+            # set command
+            if command_parts[0] == "set":
+                rest = command[len(command_parts[0]) :].strip()
 
-            # else parse the various : commands
-            elif self.current_state is State.NORMAL:
-                command = text.strip()
-                command_parts = command.split()
+                # set a=b
+                if rest.count("=") == 1:
+                    commands.append(SetCommand(*rest.split("=")))
 
-                # return if there isn't anything in the command line
-                if len(command_parts) == 0:
-                    return commands
+                # set a b
+                elif len(command_parts) >= 3:
+                    option = command_parts[1]
+                    value = rest[len(command_parts[1]) :].strip()
 
-                # set command
-                if command_parts[0] == "set":
-                    rest = command[len(command_parts[0]) :].strip()
+                    commands.append(SetCommand(option, value))
 
-                    # set a=b
-                    if rest.count("=") == 1:
-                        commands.append(SetCommand(*rest.split("=")))
+                # set a (a flag, like showtiming/noshowtiming)
+                elif len(command_parts) == 2:
+                    commands.append(SetCommand(command_parts[1], ""))
 
-                    # set a b
-                    elif len(command_parts) >= 3:
-                        option = command_parts[1]
-                        value = rest[len(command_parts[1]) :].strip()
+                else:
+                    commands[0].suppress_clear = True
 
-                        commands.append(SetCommand(option, value))
+                    return commands + [
+                        SetStatusLineTextCommand(
+                            "Invalid 'set' format.", Position.CENTER
+                        )
+                    ]
 
-                    else:
-                        commands[0].suppress_clear = True
+            # profile start/stop/dump path
+            if command_parts[0] == "profile":
+                if command_parts[1:] in (["start"], ["stop"]):
+                    commands.append(ProfileCommand(command_parts[1]))
 
-                        return commands + [
-                            SetStatusLineTextCommand(
-                                "Invalid 'set' format.", Position.CENTER
-                            )
-                        ]
+                elif len(command_parts) >= 3 and command_parts[1] == "dump":
+                    path = command[command.index("dump") + 4 :].strip()
+                    commands.append(ProfileCommand("dump", path))
 
-                # help and info screens from anywhere
-                if command in ("help", "info"):
-                    commands.append(PushComponentCommand(command))
+                else:
+                    commands[0].suppress_clear = True
 
-                if command in ("q", "quit"):
-                    commands += [QuitCommand()]
+                    return commands + [
+                        SetStatusLineTextCommand(
+                            "Invalid 'profile' format.", Position.CENTER
+                        )
+                    ]
 
-                if command in ("q!", "quit!"):
-                    commands += [QuitCommand(forced=True)]
+            # help and info screens from anywhere
+            if command in ("help", "info"):
+                commands.append(PushComponentCommand(command))
 
-                # whatever is left after anything after w is stripped
-                possible_path = command[len(command_parts[0]) :].strip()
+            # transpose interval [range], scale-durations factor [range]
+            if command_parts[0] in ("transpose", "scale-durations"):
+                if len(command_parts) not in (2, 3):
+                    commands[0].suppress_clear = True
 
-                if command_parts[0] in ("n", "new"):
-                    commands += [NewCommand()]
+                    return commands + [
+                        SetStatusLineTextCommand(
+                            f"Invalid '{command_parts[0]}' format.",
+                            Position.CENTER,
+                        )
+                    ]
 
-                if command_parts[0] in ("n!", "new!"):
-                    commands += [NewCommand(forced=True)]
+                command_type = (
+                    TransposeCommand
+                    if command_parts[0] == "transpose"
+                    else ScaleDurationsCommand
+                )
+                commands.append(command_type(*command_parts[1:]))
 
-                if command_parts[0] in ("w", "write"):
-                    commands += [SaveCommand(path=possible_path)]
+            # :N -- go to the N-th measure
+            if command.isdigit():
+                commands.append(GoToMeasureCommand(int(command)))
 
-                if command_parts[0] in ("w!", "write!"):
-                    commands += [SaveCommand(forced=True, path=possible_path)]
+            if command in ("q", "quit"):
+                commands += [QuitCommand()]
 
-                if command_parts[0] in ("o", "open"):
-                    commands += [OpenCommand(path=possible_path)]
+            if command in ("q!", "quit!"):
+                commands += [QuitCommand(forced=True)]
 
-                if command_parts[0] in ("o!", "open!"):
-                    commands += [OpenCommand(forced=True, path=possible_path)]
+            # whatever is left after anything after w is stripped
+            possible_path = command[len(command_parts[0]) :].strip()
 
-                if command_parts[0] == "wq":
-                    commands += [SaveCommand(path=possible_path), QuitCommand()]
+            if command_parts[0] in ("n", "new"):
+                commands += [NewCommand()]
 
-                if command_parts[0] == "wq!":
-                    commands += [
-                        SaveCommand(forced=True, path=possible_path),
-                        QuitCommand(),
-                    ]
+            if command_parts[0] in ("n!", "new!"):
+                commands += [NewCommand(forced=True)]
 
-            return commands
+            if command_parts[0] in ("w", "write"):
+                commands += [SaveCommand(path=possible_path)]
 
-        else:
-            # else add the character to the first position
-            self.text[0] = self.text[0][:pos] + str(key) + self.text[0][pos:]
-            self.cursor_offset += len(str(key))
+            if command_parts[0] in ("w!", "write!"):
+                commands += [SaveCommand(forced=True, path=possible_path)]
+
+            if command_parts[0] in ("o", "open"):
+                commands += [OpenCommand(path=possible_path)]
+
+            if command_parts[0] in ("o!", "open!"):
+                commands += [OpenCommand(forced=True, path=possible_path)]
+
+            if command_parts[0] in ("e", "edit"):
+                commands += [EditCommand(path=possible_path)]
+
+            if command in ("bn", "bnext", "bp", "bprevious"):
+                commands += [SwitchBufferCommand(1 if command[1] == "n" else -1)]
+
+            if command in ("ls", "buffers"):
+                commands += [ListBuffersCommand()]
+
+            if command in ("sp", "split", "vs", "vsplit"):
+                commands += [SplitCommand(vertical=command[0] == "v")]
+
+            if command in ("clo", "close", "on", "only"):
+                commands += [ClosePaneCommand(others=command[0] == "o")]
+
+            if command_parts[0] in ("export", "export!"):
+                commands += [
+                    ExportCommand(
+                        path=possible_path, forced=command_parts[0] == "export!"
+                    )
+                ]
+
+            # render[!] path [tempo]
+            if command_parts[0] in ("render", "render!"):
+                path, tempo = possible_path, None
+
+                if len(command_parts) > 2 and command_parts[-1].isdigit():
+                    path, tempo = possible_path.rsplit(maxsplit=1)
+
+                commands += [
+                    RenderCommand(
+                        path=path, tempo=tempo, forced=command_parts[0] == "render!"
+                    )
+                ]
+
+            if command_parts[0] == "wq":
+                commands += [SaveCommand(path=possible_path), QuitCommand()]
+
+            if command_parts[0] == "wq!":
+                commands += [
+                    SaveCommand(forced=True, path=possible_path),
+                    QuitCommand(),
+                ]
+
+        return commands
+
+
+def buffer_attribute(name: str) -> property:
+    """Return a property of the editor that is the attribute of its current buffer."""
+    return property(
+        lambda self: getattr(self.buffer, name),
+        lambda self, value: setattr(self.buffer, name, value),
+    )
+
+
+def pane_attribute(name: str) -> property:
+    """Return a property of the editor that is the attribute of its current pane."""
+    return property(
+        lambda self: getattr(self.pane, name),
+        lambda self, value: setattr(self.pane, name, value),
+    )
+
+
+class Buffer:
+    """A score opened in the editor, along with its indexes and where it's edited (so
+    switching between the buffers is instant and keeps the cursor where it was)."""
+
+    def __init__(
+        self,
+        score: MutableSequence[Event],
+        signatures: SignatureIndex,
+        prefix: MutableSequence[int] = None,
+        starts: MutableSequence[int] = None,
+        path: str = None,
+    ):
+        """Create the buffer of the score (and its signatures), building the indexes
+        (the measure index can be seeded with the prefix sums and the measure starts,
+        if they are known)."""
+        # the events are kept in chunks, so the background jobs can read snapshots
+        self.score = score if isinstance(score, ChunkedScore) else ChunkedScore(score)
+        self.signatures = signatures
+
+        # the prefix sums of the durations and the starts of the measures
+        self.measures = MeasureIndex(self.score, self.signatures, prefix, starts)
+
+        # the n-grams of the pitches (for searching)
+        self.patterns = PatternIndex(self.score)
+
+        # the LilyPond text of the measures (for saving)
+        self.formats = FormatCache(self.score, self.signatures)
+
+        # where the cursor was when the buffer was last shown (see Pane)
+        self.position = 0
+        self.position_offset = 0
+
+        self.current_file_path = path  # the file to which to save
+        self.changed_since_saving = False
+
+        # the position of the file on the command line (the buffers loaded from it
+        # are kept in its order, regardless of which one is loaded first)
+        self.order: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        """Return True if the buffer is an untouched new score (which an opened file
+        can replace)."""
+        return (
+            len(self.score) == 0
+            and self.current_file_path is None
+            and not self.changed_since_saving
+        )
+
+    def close(self):
+        """Close the file from which the score is mapped (if it is), once the buffer is
+        no longer shown."""
+        if isinstance(self.score, NativeScore):
+            self.score.close()
+
+
+class Pane:
+    """A view of a buffer, with its own cursor. The editor can show more panes next to
+    each other (see :split and :vsplit), possibly of the same buffer."""
+
+    def __init__(
+        self, buffer: Buffer, position: int = None, position_offset: int = None
+    ):
+        self.buffer = buffer
+
+        # position within the score and from which item the drawing starts
+        self.position = buffer.position if position is None else position
+        self.position_offset = (
+            buffer.position_offset if position_offset is None else position_offset
+        )
+
+    def show(self, buffer: Buffer):
+        """Show the buffer in the pane, remembering where the cursor was in the buffer
+        that was shown before."""
+        self.remember()
+        self.buffer = buffer
+
+        self.position = min(buffer.position, len(buffer.score))
+        self.position_offset = min(buffer.position_offset, self.position)
+
+    def remember(self):
+        """Remember where the cursor is in the buffer (for when it's shown again)."""
+        self.buffer.position = self.position
+        self.buffer.position_offset = self.position_offset
+
+    def shift(self, position: int, delta: int):
+        """Shift the cursor (and the drawing) by delta if it's after the position that
+        the items were inserted at (delta > 0) or deleted from (delta < 0)."""
+        for name in ("position", "position_offset"):
+            value = getattr(self, name)
+
+            if value >= position:
+                setattr(self, name, max(position, value + delta))
+
+
+def read_buffer(path: str) -> Buffer:
+    """Read the file into a new buffer. Only the buffer is touched, so the files can be
+    read on the background threads (see LoadBuffersCommand)."""
+    # native files are mapped and only decoded as they're displayed/edited
+    if is_native(path):
+        return Buffer(*read_vvd(path), path=path)
+
+    # MIDI and MusicXML files are imported (they can't be saved back to, so there is
+    # no path)
+    if os.path.splitext(path)[1].lower() in (".mid", ".midi") or is_musicxml(path):
+        reader = read_musicxml if is_musicxml(path) else read_midi
+        buffer = Buffer(*reader(path))
+
+        # the measures are computed here rather than once the buffer is displayed
+        buffer.measures.measure_count()
+
+        return buffer
+
+    # LilyPond files saved by Vimvaldi are parsed lazily around the cursor (the rest
+    # of the score is parsed in the background, see Editor.decode_in_background)
+    if is_lilypond(path):
+        try:
+            return Buffer(*read_ly(path), path=path)
+        except ValueError:
+            logger.debug("Can't open %r lazily.", path, exc_info=True)
+
+    with open(path, "r") as f:
+        leaves = abjad.iterate(abjad.Score(f.read())[0]).leaves()
+
+    score, signatures = [], SignatureIndex()
+    for position, leaf in enumerate(leaves):
+        score.append(Event.from_leaf(leaf))
+
+        for indicator in abjad.inspect(leaf).indicators():
+            for kind, signature_type in (
+                ("time", abjad.TimeSignature),
+                ("key", abjad.KeySignature),
+                ("clef", abjad.Clef),
+            ):
+                if isinstance(indicator, signature_type):
+                    signatures.set(kind, position, indicator)
+
+    buffer = Buffer(score, signatures, path=path)
+    buffer.measures.measure_count()
+
+    return buffer
 
 
 class Editor(Component):
     """A class for working with the notesheet."""
 
+    # the score being edited is the one of the current buffer (the buffer of the
+    # current pane) and the cursor is the one of the current pane
+    score = buffer_attribute("score")
+    signatures = buffer_attribute("signatures")
+    measures = buffer_attribute("measures")
+    patterns = buffer_attribute("patterns")
+    formats = buffer_attribute("formats")
+    current_file_path = buffer_attribute("current_file_path")
+    changed_since_saving = buffer_attribute("changed_since_saving")
+    position = pane_attribute("position")
+
     def __init__(self):
-        self.__initialize_score()
+        # the opened scores (in the order of :bn)
+        self.buffers = [Buffer([], SignatureIndex())]
 
-    def __initialize_score(self):
-        """Initialize a default score."""
-        # internal note representation (with some defaults)
-        self.score = abjad.Score(simultaneous=False)
+        # the panes that show the buffers (tiled vertically or side by side) and the
+        # one being edited
+        self.panes = [Pane(self.buffers[0])]
+        self.pane = self.panes[0]
+        self.vertical = False
 
-        self.key = abjad.KeySignature("c", "major")
-        self.clef = abjad.Clef("treble")
-        self.time = abjad.TimeSignature((4, 4))
+        self.__initialize_score()
 
-        self.position = 0  # position within the container
+        # which method handles which action of the keymap (and of the keymap used while
+        # recording a macro)
+        self.keymap = KeyMap("editor")
+        self.recording_keymap = KeyMap("recording")
+        self.actions = {
+            "command-line": lambda: self.__focus_status_line(State.NORMAL),
+            "insert": lambda: self.__focus_status_line(State.INSERT),
+            "search": lambda: self.__focus_status_line(State.SEARCH),
+            "next-match": lambda: self.__handle_search_command(SearchCommand()),
+            "previous-match": lambda: self.__handle_search_command(
+                SearchCommand(backward=True)
+            ),
+            "next-measure": lambda: self.__move_to(self.__next_measure_position()),
+            "previous-measure": lambda: self.__move_to(
+                self.__previous_measure_position()
+            ),
+            "measure-end": lambda: self.__move_to(self.__measure_end_position()),
+            "start": lambda: self.__move_to(0),
+            "end": lambda: self.__move_to(len(self.score)),
+            "right": lambda: self.__move_to(min(len(self.score), self.position + 1)),
+            "left": lambda: self.__move_to(max(0, self.position - 1)),
+            "repeat": self.__repeat,
+            "delete": self.__delete,
+            "paste": self.__paste,
+            "record-macro": self.__record_macro,
+            "stop-recording": self.__stop_recording,
+            "replay-macro": lambda: [
+                ReplayMacroCommand(self.keymap.register, max(self.count, 1))
+            ],
+            "next-pane": self.__next_pane,
+            "close-pane": lambda: self.__handle_close_pane_command(ClosePaneCommand()),
+            "only-pane": lambda: self.__handle_close_pane_command(
+                ClosePaneCommand(others=True)
+            ),
+        }
+
+        # which method handles which command type
+        self.dispatcher = CommandDispatcher(
+            {
+                InsertCommand: self.__handle_insert_command,
+                SaveCommand: self.__handle_save_command,
+                ExportCommand: self.__handle_export_command,
+                RenderCommand: self.__handle_render_command,
+                QuitCommand: self.__handle_quit_command,
+                OpenCommand: self.__handle_open_command,
+                EditCommand: self.__handle_edit_command,
+                LoadBuffersCommand: self.__handle_load_buffers_command,
+                AddBufferCommand: self.__handle_add_buffer_command,
+                SwitchBufferCommand: self.__handle_switch_buffer_command,
+                ListBuffersCommand: self.__handle_list_buffers_command,
+                NewCommand: self.__handle_new_command,
+                SetCommand: self.__handle_set_command,
+                GoToMeasureCommand: self.__handle_go_to_measure_command,
+                SearchCommand: self.__handle_search_command,
+                TransposeCommand: self.__handle_transpose_command,
+                ScaleDurationsCommand: self.__handle_scale_durations_command,
+                FillScoreCommand: self.__handle_fill_score_command,
+                SplitCommand: self.__handle_split_command,
+                ClosePaneCommand: self.__handle_close_pane_command,
+            }
+        )
 
-        self.current_file_path = None  # the file to which to save
-        self.changed_since_saving = False
+    @property
+    def buffer(self) -> Buffer:
+        """The buffer being edited (the one of the current pane)."""
+        return self.pane.buffer
+
+    def __initialize_score(self):
+        """Initialize a default score (in place of the current buffer)."""
+        self.__replace_buffer(Buffer([], SignatureIndex()))
 
         self.previous_repeatable_command = None  # the previous command (to repeat on .)
+        self.count = 0  # the count typed before a key (for N@<reg>)
+
+        self.recording_macro = False  # whether q was pressed to start recording
+
+        self.search_pattern = None  # the items searched for by the last search
+        self.transposed_search = False  # whether to search for the intervals instead
 
         self.deleted_items = []  # last deleted items (to be possibly pasted back)
+        self.item_registers: Dict[str, List[Event]] = {}  # the items deleted by "<reg>x
+
+    def __replace_buffer(self, buffer: Buffer):
+        """Replace the current buffer by the buffer (in all of the panes)."""
+        previous = self.buffer
+        self.buffers[self.buffers.index(previous)] = buffer
+
+        for pane in self.panes:
+            if pane.buffer is previous:
+                pane.show(buffer)
+
+        previous.close()
+
+        self.set_changed(True)
+
+    def __shift_panes(self, position: int, delta: int):
+        """Shift the cursors of the other panes of the current buffer after an edit, so
+        they stay on the same items."""
+        for pane in self.panes:
+            if pane is not self.pane and pane.buffer is self.buffer:
+                pane.shift(position, delta)
 
     def get_score(self) -> abjad.Container:
-        """Return the abjad container that stores the notes."""
-        return self.score
+        """Return an abjad container with the notes and the signature changes (for
+        exporting)."""
+        leaves = [item.to_leaf() for item in self.score]
+
+        for kind in SIGNATURE_KINDS:
+            positions = self.signatures.positions[kind]
+            signatures = self.signatures.signatures[kind]
+
+            for position, signature in zip(positions, signatures):
+                if position < len(leaves):
+                    abjad.attach(signature, leaves[position])
+
+        return abjad.Score([abjad.Staff(leaves)])
+
+    def insert_items(self, position: int, items: Sequence[Event]):
+        """Insert the items at the given position, keeping the indexes up to date."""
+        self.score[position:position] = items
+
+        self.signatures.shift(position, len(items))
+        self.measures.invalidate(position)
+        self.patterns.insert(position, len(items))
+        self.__shift_panes(position, len(items))
+
+        self.changed_since_saving = True
+
+    def replace_items(self, position: int, items: Sequence[Event]):
+        """Replace the items at the given position by the same number of other items,
+        keeping the indexes up to date."""
+        self.score[position : position + len(items)] = items
+
+        self.measures.invalidate(position)
+        self.patterns.delete(position, len(items))
+        self.patterns.insert(position, len(items))
+
+        self.changed_since_saving = True
+
+    def delete_items(self, position: int, count: int = 1) -> List[Event]:
+        """Delete (and return) the items at the given position, keeping the indexes up
+        to date."""
+        items = self.score[position : position + count]
+        del self.score[position : position + count]
+
+        self.signatures.shift(position, -len(items))
+        self.measures.invalidate(position)
+        self.patterns.delete(position, len(items))
+        self.__shift_panes(position, -len(items))
+
+        self.changed_since_saving = True
+
+        return items
 
     def _handle_keypress(self, key) -> Optional[List[Command]]:
-        if key == ":":
-            return [
-                ToggleFocusCommand(),
-                SetStatusLineStateCommand(State.NORMAL),
-            ]
+        # the count typed before the keys (only for N@<reg> so far)
+        if not self.keymap.is_pending() and isinstance(key, str) and key.isdigit():
+            self.count = self.count * 10 + int(key)
+            return
 
-        if key == "i":
-            return [
-                ToggleFocusCommand(),
-                SetStatusLineStateCommand(State.INSERT),
-            ]
+        action = None
 
-        if key == ".":
-            self.set_changed(True)
-            return self._handle_command(self.previous_repeatable_command)
+        # q stops the recording of a macro (see the recording keymap)
+        if self.recording_macro and not self.keymap.is_pending():
+            action = self.recording_keymap.feed(key)
 
-        if key in ("l", 261):
-            self.set_changed(True)
-            self.position = min(len(self.score), self.position + 1)
+            if self.recording_keymap.is_pending():
+                return
+
+        if action is None:
+            action = self.keymap.feed(key)
+
+            # wait for the rest of the keys (keeping the count for them)
+            if self.keymap.is_pending():
+                return
 
-        if key in ("h", 260):
+        commands = self.actions[action]() if action is not None else None
+        self.count = 0
+
+        return commands
+
+    def __focus_status_line(self, state: State) -> List[Command]:
+        """Focus the status line in the given state (a command, insert or search)."""
+        return [
+            ToggleFocusCommand(),
+            SetStatusLineStateCommand(state),
+        ]
+
+    def __move_to(self, position: int):
+        """Move the cursor to the position."""
+        self.set_changed(True)
+        self.position = position
+
+    def __next_measure_position(self) -> int:
+        """Return the position of the start of the next measure."""
+        measure = self.measures.measure_of(self.position)
+        return self.measures.measure_position(measure + 1)
+
+    def __repeat(self) -> Optional[List[Command]]:
+        """Repeat the last repeatable command."""
+        self.set_changed(True)
+        return self._handle_command(self.previous_repeatable_command)
+
+    def __delete(self):
+        """Delete the item under the cursor (into the register, if one was given)."""
+        if self.position != len(self.score):
+            self.deleted_items = self.delete_items(self.position)
             self.set_changed(True)
-            self.position = max(0, self.position - 1)
 
-        if key == "x":
-            if self.position != len(self.score):
-                self.deleted_items = [self.score.pop(self.position)]
-                self.set_changed(True)
+            if self.keymap.register is not None:
+                self.item_registers[self.keymap.register] = self.deleted_items
+
+    def __paste(self):
+        """Paste the last deleted items (or the ones in the register, if one was
+        given)."""
+        items = self.item_registers.get(self.keymap.register, self.deleted_items)
 
-        if key == "p":
-            for item in self.deleted_items:
-                self.score.insert(self.position, type(item)(item))
-                self.position += 1
-                self.set_changed(True)
+        self.insert_items(self.position, items)
+        self.position += len(items)
+        self.set_changed(True)
+
+    def __record_macro(self) -> List[Command]:
+        """Start recording the keys into the register."""
+        self.recording_macro = True
+        return [RecordMacroCommand(self.keymap.register)]
+
+    def __stop_recording(self) -> List[Command]:
+        """Stop recording the macro."""
+        self.recording_macro = False
+        return [RecordMacroCommand()]
+
+    def __previous_measure_position(self) -> int:
+        """Return the position of the start of the current measure (or the previous
+        one, if the cursor is already at the start)."""
+        measure = self.measures.measure_of(self.position)
+
+        while True:
+            position = self.measures.measure_position(measure)
+
+            if position < self.position or measure == 0:
+                return min(position, self.position)
+
+            measure -= 1
+
+    def __measure_end_position(self) -> int:
+        """Return the position of the last item of the current measure (or of the next
+        one, if the cursor is already at the end)."""
+        measure = self.measures.measure_of(self.position)
+
+        while measure < self.measures.measure_count():
+            position = self.measures.measure_position(measure + 1) - 1
+
+            if position > self.position:
+                return position
+
+            measure += 1
+
+        return len(self.score)
+
+    def __handle_go_to_measure_command(self, command: GoToMeasureCommand):
+        """Move the cursor to the start of the given measure."""
+        measure = min(max(command.measure, 1), self.measures.measure_count())
+        self.position = self.measures.measure_position(measure - 1)
+
+        self.set_changed(True)
 
     def __save_path_valid(self, path: str) -> List[Command]:
         """Checks, whether we can save to this path -- if it either doesn't exist or
@@ -456,45 +962,29 @@ class Editor(Component):
         )
 
     def _handle_command(self, command: Command) -> Optional[List[Command]]:
-        if isinstance(command, InsertCommand):
-            return self.__handle_insert_command(command)
-
-        elif isinstance(command, SaveCommand):
-            return self.__handle_save_command(command)
-
-        elif isinstance(command, QuitCommand):
-            return self.__handle_quit_command(command)
-
-        elif isinstance(command, OpenCommand):
-            return self.__handle_open_command(command)
-
-        elif isinstance(command, NewCommand):
-            return self.__handle_new_command(command)
-
-        elif isinstance(command, SetCommand):
-            return self.__handle_set_command(command)
+        return self.dispatcher.dispatch(command)
 
     def __handle_set_command(self, command: SetCommand) -> List[Command]:
-        """Handle set commands."""
-        try:
-            if command.option == "clef":
-                self.clef = abjad.Clef(command.value)
-
-            elif command.option == "time":
-                pair = command.value.split("/" if "/" in command.value else " ")
-                self.time = abjad.TimeSignature(tuple(map(int, pair)))
+        """Handle set commands (the signatures change from the current position)."""
+        if command.option in ("transposedsearch", "notransposedsearch"):
+            self.transposed_search = command.option == "transposedsearch"
+            return [
+                SetStatusLineTextCommand(f"'{command.option}' set.", Position.CENTER)
+            ]
 
-            elif command.option == "key":
-                self.key = abjad.KeySignature(*command.value.split(" "))
+        if command.option not in SIGNATURE_KINDS:
+            return [
+                SetStatusLineTextCommand(
+                    f"Invalid option '{command.option}'.", Position.CENTER
+                )
+            ]
 
-            else:
-                return [
-                    SetStatusLineTextCommand(
-                        f"Invalid option '{command.option}'.", Position.CENTER
-                    )
-                ]
+        try:
+            signature = parse_signature(command.option, command.value)
 
         except Exception as e:
+            logger.debug("Could not parse %r as %r.", command.value, command.option)
+
             return [
                 SetStatusLineTextCommand(
                     f"Could not parse '{command.value}' as '{command.option}'",
@@ -502,6 +992,12 @@ class Editor(Component):
                 )
             ]
 
+        self.signatures.set(command.option, self.position, signature)
+        self.measures.invalidate(self.position)
+
+        self.changed_since_saving = True
+        self.set_changed(True)
+
         return [SetStatusLineTextCommand(f"'{command.option}' set.", Position.CENTER,)]
 
     def __handle_insert_command(self, command: InsertCommand) -> List[Command]:
@@ -514,39 +1010,132 @@ class Editor(Component):
 
         try:
             # objects to add
-            objects = []
+            objects = self.__parse_items(text.split(";"))
 
-            for item in text.split(";"):
-                item = item.strip()
+            self.insert_items(self.position, objects)
+            self.position += len(objects)
 
-                if item[0] == "r":
-                    obj = abjad.Rest(item)
-                elif item[0] == "<":
-                    obj = abjad.Chord(item)
-                else:
-                    obj = abjad.Note(item)
+            self.previous_repeatable_command = command
 
-                objects.append(obj)
+        except Exception as e:
+            logger.debug("Could not parse %r.", text, exc_info=True)
 
-            for obj in objects:
-                self.score.insert(self.position, obj)
-                self.position += 1
+            return [
+                SetStatusLineTextCommand(
+                    "The string could not be parsed.", Position.CENTER
+                )
+            ]
 
-            self.changed_since_saving = True
-            self.previous_repeatable_command = command
+    def __parse_items(self, items: Sequence[str]) -> List[Event]:
+        """Parse the items (notes/rests/chords in the LilyPond syntax)."""
+        return [parse_item(item.strip()) for item in items]
+
+    def __handle_search_command(self, command: SearchCommand) -> List[Command]:
+        """Move the cursor to the next (or previous) occurrence of the pattern."""
+        if command.pattern is not None:
+            # the items are separated by ';' or by spaces (outside of chords)
+            try:
+                items = re.findall(r"<[^>]*>[^\s;]*|[^\s;]+", command.pattern)
+                self.search_pattern = self.__parse_items(items)
+
+            except Exception as e:
+                logger.debug("Could not parse %r.", command.pattern, exc_info=True)
+
+                return [
+                    SetStatusLineTextCommand(
+                        "The pattern could not be parsed.", Position.CENTER
+                    )
+                ]
+
+        if not self.search_pattern:
+            return [SetStatusLineTextCommand("No pattern.", Position.CENTER)]
+
+        position = self.patterns.find(
+            self.search_pattern,
+            self.position,
+            backward=command.backward,
+            transposed=self.transposed_search,
+        )
+
+        if position is None:
+            return [SetStatusLineTextCommand("Pattern not found.", Position.CENTER)]
+
+        self.position = position
+        self.set_changed(True)
+
+    def __parse_range(self, text: Optional[str]) -> Tuple[int, int]:
+        """Parse a range of measures (N or N-M, numbered from 1), returning the
+        positions of the items in it (the entire score if the range is None)."""
+        if text is None:
+            return 0, len(self.score)
+
+        first, _, last = text.partition("-")
+        first, last = int(first), int(last or first)
+
+        if not 1 <= first <= last:
+            raise ValueError(f"Invalid range '{text}'.")
+
+        return (
+            self.measures.measure_position(first - 1),
+            self.measures.measure_position(last),
+        )
+
+    def __handle_transpose_command(self, command: TransposeCommand) -> List[Command]:
+        """Transpose the items in the range."""
+        try:
+            staff_spaces, semitones = parse_interval(command.interval)
+            start, end = self.__parse_range(command.range)
 
         except Exception as e:
+            logger.debug("Could not parse %r.", command, exc_info=True)
+            return [SetStatusLineTextCommand("Invalid arguments.", Position.CENTER)]
+
+        columns = Columns.from_items(self.score[start:end])
+        self.replace_items(start, columns.transpose(staff_spaces, semitones).to_items())
+
+        self.set_changed(True)
+        return [SetStatusLineTextCommand("Transposed.", Position.CENTER)]
+
+    def __handle_scale_durations_command(
+        self, command: ScaleDurationsCommand
+    ) -> List[Command]:
+        """Scale the durations of the items in the range. The items are only split at
+        the barlines when they are drawn, so the measure index is just updated from the
+        start of the range."""
+        try:
+            factor = Fraction(command.factor)
+            start, end = self.__parse_range(command.range)
+
+            if factor <= 0:
+                raise ValueError(f"Invalid factor '{factor}'.")
+
+            columns = Columns.from_items(self.score[start:end]).scale(factor)
+
+            # each of the resulting durations has to be writable
+            for ticks in set(columns.ticks.tolist()):
+                if not ticks_to_duration(ticks).is_assignable:
+                    raise ValueError(f"The durations can't be scaled by {factor}.")
+
+        except Exception as e:
+            logger.debug("Could not scale by %r.", command, exc_info=True)
+
             return [
                 SetStatusLineTextCommand(
-                    "The string could not be parsed.", Position.CENTER
+                    "The durations could not be scaled.", Position.CENTER
                 )
             ]
 
+        self.replace_items(start, columns.to_items())
+
+        self.set_changed(True)
+        return [SetStatusLineTextCommand("Durations scaled.", Position.CENTER)]
+
     def __handle_save_command(self, command: SaveCommand) -> List[Command]:
         path = command.path  # the path to save file to
         previous_save_file = self.current_file_path
 
-        if path is None:
+        # :w without a path saves to the current file
+        if not path:
             # if there isn't a file currently open, warn
             if self.current_file_path is None:
                 return [self.__get_empty_name_warning()]
@@ -563,12 +1152,20 @@ class Editor(Component):
 
         # attempt to write the score to the file
         try:
-            with open(self.current_file_path, "w") as f:
-                sys.stdout = f  # abjad prints to stdout and we don't want that
-                abjad.f(self.score)
-                self.changed_since_saving = False
+            if is_native(self.current_file_path):
+                write_vvd(
+                    self.current_file_path, self.score, self.signatures, self.measures
+                )
+            else:
+                # a lazily loaded score might still be reading the old file
+                with atomic_write(self.current_file_path) as f:
+                    self.formats.write(f)
+
+            self.changed_since_saving = False
 
         except Exception as e:
+            logger.exception("Error writing to %r.", self.current_file_path)
+
             # restore the previous file name if something went amiss (we didn't save...)
             self.current_file_path = previous_save_file
 
@@ -581,6 +1178,74 @@ class Editor(Component):
             SetStatusLineTextCommand("Saved.", Position.CENTER),
         ]
 
+    def __handle_export_command(self, command: ExportCommand) -> List[Command]:
+        """Export the score to a MIDI or a MusicXML file."""
+        if not command.path:
+            return [self.__get_empty_name_warning()]
+
+        is_midi = os.path.splitext(command.path)[1].lower() in (".mid", ".midi")
+
+        if not is_midi and not is_musicxml(command.path):
+            return [SetStatusLineTextCommand("Unsupported format.", Position.CENTER)]
+
+        if os.path.isfile(command.path) and not command.forced:
+            return [
+                SetStatusLineTextCommand("The file already exists.", Position.CENTER)
+            ]
+
+        try:
+            if is_midi:
+                write_midi(command.path, self.score, self.signatures)
+            else:
+                write_musicxml(command.path, self.score, self.signatures, self.measures)
+
+        except Exception as e:
+            logger.exception("Error exporting to %r.", command.path)
+            return [SetStatusLineTextCommand("Error writing to file.", Position.CENTER)]
+
+        return [SetStatusLineTextCommand("Exported.", Position.CENTER)]
+
+    def __handle_render_command(self, command: RenderCommand) -> List[Command]:
+        """Render the score to a WAV file (on a background thread)."""
+        if not is_available():
+            return [
+                SetStatusLineTextCommand(
+                    "Rendering requires NumPy (pip install vimvaldi[render]).",
+                    Position.CENTER,
+                )
+            ]
+
+        if not command.path:
+            return [self.__get_empty_name_warning()]
+
+        if os.path.isfile(command.path) and not command.forced:
+            return [
+                SetStatusLineTextCommand("The file already exists.", Position.CENTER)
+            ]
+
+        tempo = int(command.tempo) if command.tempo is not None else DEFAULT_TEMPO
+        if tempo <= 0:
+            return [SetStatusLineTextCommand("Invalid tempo.", Position.CENTER)]
+
+        # the score is rendered from a snapshot, so it can be edited in the meantime
+        path, score = command.path, self.score.snapshot()
+
+        def render() -> List[Command]:
+            render_wav(path, score, tempo)
+            return [SetStatusLineTextCommand(f"Rendered {path}.", Position.CENTER)]
+
+        return [
+            BackgroundCommand(render, f"Rendering {path}"),
+            SetStatusLineTextCommand("Rendering...", Position.CENTER),
+        ]
+
+    def __handle_fill_score_command(self, command: FillScoreCommand):
+        """Fill the chunks that were decoded in the background (if the score is still
+        opened in one of the buffers)."""
+        for buffer in self.buffers:
+            if command.score is buffer.score:
+                buffer.score.fill(command.chunks)
+
     def __handle_new_command(self, command: NewCommand) -> List[Command]:
         """Discard current work in favour of a new file."""
         if self.changed_since_saving and not command.forced:
@@ -588,55 +1253,269 @@ class Editor(Component):
 
         self.__initialize_score()
 
+    def __open_buffer(self, path: str) -> Tuple[Optional[Buffer], List[Command]]:
+        """Read the file into a new buffer, returning it (None if it can't be read) and
+        the commands to issue once it's opened."""
+        try:
+            buffer = read_buffer(path)
+
+        except Exception as e:
+            logger.exception("Error reading %r.", path)
+
+            return None, [
+                SetStatusLineTextCommand("Error reading the file.", Position.CENTER)
+            ]
+
+        return buffer, self.decode_in_background(buffer) + [
+            self.get_file_name_command(buffer),
+            SetStatusLineTextCommand(
+                "Opened." if buffer.current_file_path is not None else "Imported.",
+                Position.CENTER,
+            ),
+        ]
+
+    def decode_in_background(self, buffer: Buffer) -> List[Command]:
+        """Return the commands that decode the rest of the lazily parsed LilyPond score
+        of the buffer in the background."""
+        if not isinstance(buffer.score, LilyPondScore):
+            return []
+
+        score, chunks = buffer.score, buffer.score.undecoded()
+
+        def decode() -> List[Command]:
+            return [
+                FillScoreCommand(
+                    score, {chunk: score.decode(chunk) for chunk in chunks}
+                )
+            ]
+
+        return [BackgroundCommand(decode, f"Reading {buffer.current_file_path}")]
+
     def __handle_open_command(self, command: OpenCommand) -> List[Command]:
-        """Attempt to open the specified file."""
+        """Attempt to open the specified file (in place of the current buffer)."""
         path = command.path
 
         if self.changed_since_saving and not command.forced:
             return [self.__get_unsaved_changes_warning()]
 
-        if path is None:
+        if not path:
             return [self.__get_empty_name_warning()]
 
-        # attempt to read the score from
-        try:
-            with open(path, "r") as f:
-                self.score = abjad.Score(f.read())[0]
+        buffer, commands = self.__open_buffer(path)
 
-            self.changed_since_saving = False
-            self.current_file_path = path
+        if buffer is not None:
+            self.__replace_buffer(buffer)
 
-        except Exception as e:
+        return commands
+
+    def __find_buffer(self, path: str) -> Optional[Buffer]:
+        """Return the buffer of the file with the given path (None if it isn't open)."""
+        for buffer in self.buffers:
+            if buffer.current_file_path is not None and os.path.abspath(
+                buffer.current_file_path
+            ) == os.path.abspath(path):
+                return buffer
+
+    def __switch_to_buffer(self, buffer: Buffer) -> List[Command]:
+        """Show the buffer in the current pane."""
+        self.pane.show(buffer)
+        self.set_changed(True)
+
+        return [self.get_file_name_command()]
+
+    def __handle_edit_command(self, command: EditCommand) -> List[Command]:
+        """Switch to the buffer of the file, opening it in a new one if it isn't open
+        (the current buffer is kept, unless it's an untouched new score)."""
+        if not command.path:
+            return [self.__get_empty_name_warning()]
+
+        buffer = self.__find_buffer(command.path)
+        if buffer is not None:
+            return self.__switch_to_buffer(buffer)
+
+        buffer, commands = self.__open_buffer(command.path)
+
+        if buffer is not None:
+            if self.buffer.is_empty():
+                self.__replace_buffer(buffer)
+            else:
+                self.buffers.insert(self.buffers.index(self.buffer) + 1, buffer)
+                self.__switch_to_buffer(buffer)
+
+        return commands
+
+    def __handle_load_buffers_command(
+        self, command: LoadBuffersCommand
+    ) -> List[Command]:
+        """Read the files into new buffers in the background (a few of them at once,
+        on the job threads of the interface)."""
+        commands = []
+
+        for order, path in enumerate(command.paths):
+
+            def load(path=path, order=order) -> List[Command]:
+                buffer = read_buffer(path)
+                buffer.order = order
+
+                return [AddBufferCommand(buffer)]
+
+            commands.append(BackgroundCommand(load, f"Reading {path}"))
+
+        return commands
+
+    def __handle_add_buffer_command(self, command: AddBufferCommand) -> List[Command]:
+        """Add the buffer that was loaded in the background. It's only switched to if
+        the current buffer is an untouched new score (or an untouched buffer of a file
+        that comes after it on the command line)."""
+        buffer = command.buffer
+
+        if self.buffer.is_empty():
+            self.__replace_buffer(buffer)
+
+            return self.decode_in_background(buffer) + [self.get_file_name_command()]
+
+        switch = (
+            self.buffer.order is not None
+            and self.buffer.order > buffer.order
+            and self.buffer.position == 0
+            and not self.buffer.changed_since_saving
+        )
+
+        # after the buffers of the files that precede it on the command line
+        position = next(
+            (
+                i
+                for i, other in enumerate(self.buffers)
+                if other.order is not None and other.order > buffer.order
+            ),
+            len(self.buffers),
+        )
+
+        self.buffers.insert(position, buffer)
+
+        if switch:
+            return self.decode_in_background(buffer) + self.__switch_to_buffer(buffer)
+
+        return self.decode_in_background(buffer)
+
+    def __handle_switch_buffer_command(
+        self, command: SwitchBufferCommand
+    ) -> List[Command]:
+        """Switch to the next/previous buffer (wrapping around)."""
+        index = self.buffers.index(self.buffer) + command.delta
+        return self.__switch_to_buffer(self.buffers[index % len(self.buffers)])
+
+    def __handle_list_buffers_command(
+        self, command: ListBuffersCommand
+    ) -> List[Command]:
+        """List the buffers on the status line (% marks the current one and + the ones
+        with unsaved changes)."""
+        entries = []
+        for i, buffer in enumerate(self.buffers):
+            name = self.__get_buffer_name(buffer)
+
+            flags = ("%" if buffer is self.buffer else "") + (
+                "+" if buffer.changed_since_saving else ""
+            )
+
+            entries.append(f"{i + 1}{flags} {name}")
+
+        return [SetStatusLineTextCommand("  ".join(entries), Position.CENTER)]
+
+    def __handle_quit_command(self, command: QuitCommand) -> List[Command]:
+        """Quit (if there are either no unsaved changes in any of the buffers or the
+        command is forced), else warn about there being unsaved changes. If there are
+        more panes, only the current one is closed (its buffer stays open)."""
+        if len(self.panes) > 1:
+            return self.__handle_close_pane_command(ClosePaneCommand())
+
+        if command.forced:
+            return [ExitCommand()]
+
+        changed = [buffer for buffer in self.buffers if buffer.changed_since_saving]
+
+        if len(changed) == 0:
+            return [ExitCommand()]
+
+        if self.buffer in changed:
+            return [self.__get_unsaved_changes_warning()]
+
+        name = self.__get_buffer_name(changed[0])
+        text = f"Unsaved changes in {name} (maybe append '!'?)."
+        return [SetStatusLineTextCommand(text, Position.CENTER)]
+
+    def __handle_split_command(self, command: SplitCommand) -> List[Command]:
+        """Split the current pane into two panes of its buffer (the new one, which
+        becomes the current one, starts where the current one is). The panes are tiled
+        in the direction of the last split. The split is refused if it would leave a
+        pane without enough room."""
+        if not self.has_room_for_pane(command.vertical):
+            return [SetStatusLineTextCommand("Not enough room.", Position.CENTER)]
+
+        pane = Pane(self.buffer, self.position, self.pane.position_offset)
+
+        self.panes.insert(self.panes.index(self.pane), pane)
+        self.pane = pane
+        self.vertical = command.vertical
+
+        self.set_changed(True)
+
+    def has_room_for_pane(self, vertical: bool) -> bool:
+        """Return True if there is room for another pane tiled in the direction (only
+        the drawable editor knows the size of its window)."""
+        return True
+
+    def __next_pane(self) -> List[Command]:
+        """Go to the next pane (wrapping around)."""
+        self.pane = self.panes[(self.panes.index(self.pane) + 1) % len(self.panes)]
+        self.set_changed(True)
+
+        return [self.get_file_name_command()]
+
+    def __handle_close_pane_command(self, command: ClosePaneCommand) -> List[Command]:
+        """Close the current pane (or all of the others)."""
+        if command.others:
+            self.panes = [self.pane]
+
+        elif len(self.panes) == 1:
             return [
-                SetStatusLineTextCommand("Error reading the file.", Position.CENTER,)
+                SetStatusLineTextCommand("Can't close the last pane.", Position.CENTER)
             ]
 
-        return [
-            self.get_file_name_command(),
-            SetStatusLineTextCommand("Opened.", Position.CENTER,),
-        ]
+        else:
+            index = self.panes.index(self.pane)
+            self.pane.remember()
+            del self.panes[index]
 
-    def __handle_quit_command(self, command: QuitCommand) -> List[Command]:
-        """Quit (if there are either no unsaved changes or the command is forced), else
-        warn about there being unsaved changes."""
-        if not self.changed_since_saving or command.forced:
-            quit()
+            self.pane = self.panes[min(index, len(self.panes) - 1)]
 
-        return [self.__get_unsaved_changes_warning()]
+        self.set_changed(True)
+
+        return [self.get_file_name_command()]
 
     def __get_unsaved_changes_warning(self) -> Command:
         """Return the warning command issued when there are unsaved changes."""
         text = "Unsaved changes (maybe append '!'?)."
         return SetStatusLineTextCommand(text, Position.CENTER)
 
+    @staticmethod
+    def __get_buffer_name(buffer: Buffer) -> str:
+        """Return the name of the buffer's file (as listed by :ls)."""
+        if buffer.current_file_path is None:
+            return "[no file]"
+
+        return os.path.basename(buffer.current_file_path)
+
     def __get_empty_name_warning(self) -> Command:
         return SetStatusLineTextCommand("No file name.", Position.CENTER)
 
-    def get_file_name_command(self) -> Command:
+    def get_file_name_command(self, buffer: Buffer = None) -> Command:
         """Return the appropriate command for changing the label of the status line to
-        the currently opened file."""
+        the file opened in the buffer (the current one by default)."""
+        path = (buffer or self.buffer).current_file_path
+
         return (
             SetStatusLineTextCommand("[no file]", Position.RIGHT)
-            if self.current_file_path is None
-            else SetStatusLineTextCommand(f"[{self.current_file_path}]", Position.RIGHT)
+            if path is None
+            else SetStatusLineTextCommand(f"[{path}]", Position.RIGHT)
         )
@@ -62,11 +62,22 @@ _enter_           | confirm
 _q_ | exit
 
 ### Editor
-_hl_ or _←→_ | move left\/right
-_i_        | insert item (see Insert syntax below)
-_x_        | delete a single item
-_p_        | paste last deleted item
-_._        | repeat the last insert command
+_hl_ or _←→_    | move left\/right
+_w_ \/ _b_       | move to the start of the next\/current (previous) measure
+_e_           | move to the end of the measure
+_gg_ \/ _G_      | move to the start\/end of the score
+_i_           | insert item (see Insert syntax below)
+_x_           | delete a single item
+_p_           | paste last deleted item
+_"<reg>x_ \/ _p_ | delete into\/paste from a register (a-z, 0-9)
+_._           | repeat the last insert command
+_\/_           | search for a sequence of items (like _\/c d e_)
+_n_ \/ _N_       | go to the next\/previous occurrence
+_q<reg>_ \/ _q_  | start\/stop recording the keys into a register (a-z, 0-9)
+_[N]@<reg>_   | replay the keys in the register [N times] (_@@_ for the previous one)
+_CTRL-W w_    | move to the next pane
+_CTRL-W c_    | close the current pane
+_CTRL-W o_    | close all of the other panes
 
 ## Commands
 Commands can be issued from nearly anywhere within the app by pressing _:_ and typing the respective command.
@@ -75,17 +86,34 @@ Commands can be issued from nearly anywhere within the app by pressing _:_ and t
 _:help_ | display this page
 _:info_ | display the info page
 
+_:profile start_ or _:profile stop_ | start\/stop measuring the app's performance
+_:profile dump path_              | write the measured statistics to a file
+
 ### Editor
 _:n[!]_ or _:new[!]_                 | reset score
 _:q[!]_ or _:quit[!]_                | quit [without saving]
-_:w[!] [path]_ or _:write[!] [path]_ | [forcibly] save [to the specified path]
-_:o[!] path_ or _:open[!] path_      | open file [discarding current]
+_:w[!] [path]_ or _:write[!] [path]_ | [forcibly] save [to the specified path] (_.vvd_ for the native format)
+_:o[!] path_ or _:open[!] path_      | open file [discarding current] (_.mid_ and MusicXML files are imported)
+_:e path_ or _:edit path_            | open file in a new buffer (or switch to its buffer)
+_:bn_ \/ _:bp_                        | switch to the next\/previous buffer
+_:ls_                              | list the buffers (_%_ current, _+_ unsaved changes)
+_:sp_ or _:split_                    | split the pane horizontally (both show the buffer)
+_:vs_ or _:vsplit_                   | split the pane vertically
+_:clo_ or _:close_                   | close the current pane
+_:on_ or _:only_                     | close all of the other panes
 _:wq[!] [path]_                    | _:w_ and _:q[!]_ combined
+_:export[!] path_                  | [forcibly] export to a MIDI (_.mid_) or MusicXML (_.musicxml_, _.mxl_) file
+_:render[!] path [tempo]_          | [forcibly] render to a WAV file in the background (requires NumPy)
+_:N_                               | go to the N-th measure
+_:transpose interval [N[-M]]_      | transpose measures N to M (default all) | 'transpose +M3 1-4', 'transpose -2'
+_:scale-durations factor [N[-M]]_  | scale the durations of measures N to M  | 'scale-durations 1\/2'
 
-_:set opt val_ or _:set opt=val_     | set an option to a given value
+_:set opt val_ or _:set opt=val_     | set an option to a given value (signatures change from the cursor onward)
                                  | options: key pitch scale | 'set key c major'
                                  |          clef name       | 'set clef treble'
                                  |          time num\/den    | 'set time 4\/4' 
+_:set [no]showtiming_              | show the timing of the last frame on the status line
+_:set [no]transposedsearch_        | search for the intervals (so transpositions match too)
 
 ## Insert syntax
 The syntax of the insert command follows LilyPond's notation. Currently supported items to insert are:
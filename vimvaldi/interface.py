@@ -0,0 +1,1299 @@
+"""The module containing the GUI -- the drawables of the components and the interface
+that ties them together."""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from signal import SIGWINCH
+from types import SimpleNamespace
+
+from vimvaldi.components import *
+from vimvaldi.profiling import *
+from vimvaldi.utilities import *
+from vimvaldi.graphics import *
+from vimvaldi.music import *
+
+logger = logging.getLogger(__name__)
+
+# the most jobs that run on background threads at once (see Interface.__run_in_thread)
+# -- a few, so a long job (like rendering) doesn't hold up the rest, but not one per job
+JOB_THREADS = 4
+
+
+@dataclass
+class Rectangle:
+    """A rectangle class."""
+
+    x: int
+    y: int
+    width: int
+    height: int
+
+    def contains(self, x: int, y: int):
+        """Whether the rectangle contains the given point."""
+        return 0 <= x <= self.width and 0 <= y <= self.height
+
+
+class WindowView:
+    """A Curses window wrapper to only paint on a part of it because either I'm stupid
+    or Curses is a broken mess and Windows don't work as they should."""
+
+    def __init__(
+        self, parent, view: Rectangle = Rectangle(-1, -1, -1, -1), clip: bool = False
+    ):
+        # the parent window
+        self.parent = parent
+
+        # the restricted view of the parent window
+        self.view = view
+
+        # whether the strings are clipped to the view (instead of raising an exception
+        # when they don't fit)
+        self.clip = clip
+
+        # the number of cells written since the last reset (for the timing HUD)
+        self.cells_written = 0
+
+    def resize(self, view: Rectangle):
+        """Resize view to the given size."""
+        self.view = view
+
+    def width(self) -> int:
+        """Return the width of the window."""
+        return self.view.width
+
+    def height(self) -> int:
+        """Return the height of the window."""
+        return self.view.height
+
+    def clear(self, *args, **kwargs):
+        """Overridden window.clear() (only clears the rectangle of the view)."""
+        _, width = self.parent.getmaxyx()
+
+        for y in range(self.view.height):
+            # the lines of the views that reach the right edge are cleared at once
+            if self.view.x + self.view.width >= width:
+                self.parent.move(y + self.view.y, self.view.x)
+                self.parent.clrtoeol()
+            else:
+                self.parent.addstr(y + self.view.y, self.view.x, " " * self.view.width)
+
+        self.cells_written += self.view.width * self.view.height
+
+    def addstr(self, x: int, y: int, string: str, *args, **kwargs):
+        """Overridden window.addstr()."""
+        if self.clip:
+            if not 0 <= y < self.view.height:
+                return
+
+            string = string[max(0, -x) : max(0, self.view.width - x)]
+            x = max(0, x)
+
+            if len(string) == 0:
+                return
+
+        elif not self.view.contains(x, y) or not self.view.contains(x + len(string), y):
+            WindowView.__raise_out_of_bounds_exception()
+
+        self.parent.addstr(y + self.view.y, x + self.view.x, string, *args, **kwargs)
+        self.cells_written += len(string)
+
+    def move(self, x: int, y: int):
+        """Overridden window.move()."""
+        if not self.view.contains(x, y):
+            WindowView.__raise_out_of_bounds_exception()
+
+        self.parent.move(y + self.view.y, x + self.view.x)
+
+    @classmethod
+    def __raise_out_of_bounds_exception(cls) -> ValueError:
+        """Raise an exception that something reached outside the window."""
+        raise ValueError("Action out of the window bounds.")
+
+
+class Drawable(ABC, Changeable):
+    """A class to be extended by things that write on the curses windows."""
+
+    focused = False  # whether this drawable is currently focused
+    cursor_position = None
+
+    def __init__(self, window: WindowView):
+        self.window = window
+
+    def toggle_focused(self, suppress_clear=False) -> List[Command]:
+        """Toggle the focus on this Drawable."""
+        return self.set_focused(not self.focused, suppress_clear)
+
+    def set_focused(self, value: bool, suppress_clear=False) -> List[Command]:
+        """Set the focus on this Drawable. Possibly return a command if the component
+        wants to do some action (they will override it)."""
+        self.focused = value
+        self.set_changed(True)
+
+        return []
+
+    def is_focused(self) -> bool:
+        """Return True if this Drawable is currently focused."""
+        return self.focused
+
+    @abstractmethod
+    def _draw(self):
+        """The internal implementation that draws on the actual window and has to be
+        implemented by classes that inherit this class."""
+
+    def draw(self):
+        """The function that draws the Drawable (if anything changed). Checks, whether
+        the drawable has changed; if it does, clears the window, calls _draw() and
+        attempts to set the cursor position (if also focused)."""
+        if self.has_changed():
+            self.window.clear()
+            self._draw()
+            self.set_changed(False)
+
+
+class DrawableMenu(Drawable, Menu):
+    """A menu that can be drawn on the window."""
+
+    def __init__(self, window, title: str, items: Sequence[Optional[MenuItem]]):
+        Drawable.__init__(self, window)
+        Menu.__init__(self, items)
+
+        self.title = title
+
+    def _draw(self):
+        lines = self.title.splitlines()
+
+        # the y offset from the top of the window to where to start drawing
+        y_off = center_coordinate(
+            self.window.height(), len(lines) + 1 + len(self.items)
+        )
+
+        # draw the title of the menu, line by line
+        for i, line in enumerate(lines):
+            x_off = center_coordinate(self.window.width(), len(line))
+            self.window.addstr(x_off, y_off + i, line)
+
+        # draw the menu itself
+        for i, item in enumerate(self.items):
+            # ignore spacers
+            if item is None:
+                continue
+
+            # mark the selected label
+            if self.get_selected() is item:
+                text = f"> {item.label} <"
+            else:
+                text = item.label
+
+            x_off = center_coordinate(self.window.width(), len(text))
+            self.window.addstr(x_off, y_off + len(lines) + 2 + i, text)
+
+    def set_focused(self, value: bool, suppress_clear=False) -> List[Command]:
+        """If the focus switched to the menu, set the status line according to the
+        currently selected item."""
+        Drawable.set_focused(self, value)
+        return [] if not value else self.update_status_line()
+
+
+class DrawableLogoDisplay(Drawable, LogoDisplay):
+    """A logo display that can be drawn on the window."""
+
+    def __init__(self, window, text: str):
+        Drawable.__init__(self, window)
+        LogoDisplay.__init__(self, text)
+
+    def _draw(self):
+        """Draws the centered program logo on the window."""
+        lines = self.text.splitlines()
+
+        for y, line in enumerate(lines):
+            for x, char in enumerate(line):
+                self.window.addstr(
+                    x + (self.window.width() - len(line)) // 2,
+                    y + (self.window.height() - len(lines)) // 2,
+                    char,
+                    Colors.get(15 if char != "*" else 34),
+                )
+
+
+class DrawableTextDisplay(Drawable, TextDisplay):
+    """A text display that can be drawn on the window."""
+
+    def __init__(self, window, text: str):
+        Drawable.__init__(self, window)
+        TextDisplay.__init__(self, text)
+
+        self.side_offsets = [3, 1]  # left/right offset, top/bottom offset when drawing
+
+        # paging depends on the height of the text, which TextDisplay doesn't know
+        self.actions["page-down"] = lambda: self.__page(1)
+        self.actions["page-up"] = lambda: self.__page(-1)
+
+    def __page(self, direction: int):
+        """Scroll the text by a third of its height in the direction (^D and ^U)."""
+        self.scroll(direction * (self.__get_content_space()[1] // 3))
+
+    def __get_content_space(self) -> Tuple[int, int]:
+        """Get the width and the height of the area that we can put text on."""
+        return (
+            self.window.width() - 2 * self.side_offsets[0],
+            self.window.height() - 2 * self.side_offsets[1],
+        )
+
+    def _draw(self):
+        # TODO: maybe rewrite this? a little bit of a mess...
+
+        # get the free space that we can draw on
+        width, height = self.__get_content_space()
+
+        # wrap the lines first (adding them to a list)
+        wrapped: List[Tuple[str, int]] = []
+        for line in self.text.splitlines():
+            if line == "":
+                wrapped.append(("", 0))
+
+            # count the heading level (for coloring)
+            heading_level = 0
+            while heading_level < len(line) and line[heading_level] == "#":
+                heading_level += 1
+
+            while line != "":
+                previous_space = -1  # the index of the last space seen
+                i, char_count = 0, 0  # index in line + the number of actual chars
+
+                # count the number of actual characters, until the width
+                while i < len(line) and char_count < width:
+                    if line[i] not in {"*", "/", "_"}:
+                        if line[i] == " ":
+                            previous_space = i
+
+                        elif line[i] == "\\":
+                            i += 1
+
+                        char_count += 1
+                    i += 1
+
+                # if a space was found, wrap on it; else split on the word
+                # TODO: possibly split on other non-alpha characters
+                if previous_space != -1 and char_count == width:
+                    i = previous_space
+
+                wrapped.append((line[:i], heading_level))
+                line = line[i:].strip()
+
+        # restrict the offset to valid values
+        self.line_offset = max(0, min(self.line_offset, len(wrapped) - height))
+
+        # 'flags' for displaying characters
+        flags = {
+            "*": [False, curses.A_BOLD],
+            "/": [False, curses.A_ITALIC],
+            "_": [False, curses.A_UNDERLINE],
+            "~": [False, 0],  # special case for underline
+        }
+
+        y = 0
+        for line, h_level in wrapped[self.line_offset : height + self.line_offset]:
+            x = 0
+
+            # special case for hbar
+            if line.rstrip() == "---":
+                hbar_offset = 3
+
+                self.window.addstr(
+                    self.side_offsets[0] + hbar_offset,
+                    self.side_offsets[1] + y,
+                    "─" * (width - hbar_offset * 2),
+                )
+
+                y += 1
+                continue
+
+            j = 0
+            while x + j < len(line):
+                # possibly toggle flags
+                if line[x + j] in flags:
+                    flags[line[x + j]][0] = not flags[line[x + j]][0]
+                    j += 1
+
+                else:
+                    if line[x + j] == "\\":
+                        j += 1
+
+                    # evaluate flags
+                    evaluated_flags = 0
+                    for flag in flags:
+                        evaluated_flags |= 0 if not flags[flag][0] else flags[flag][1]
+
+                    # special case for strikethrough, since it's unicode
+                    char = (line[x + j] + "\u0336") if flags["~"][0] else line[x + j]
+
+                    # place the char on the screen
+                    self.window.addstr(
+                        self.side_offsets[0] + x,
+                        self.side_offsets[1] + y,
+                        char,
+                        evaluated_flags
+                        | (Colors.get(h_level + 33) if h_level != 0 else 0),
+                    )
+
+                    x += 1
+
+            h_level = 0
+            y += 1
+
+    def set_focused(self, value: bool, suppress_clear=False) -> List[Command]:
+        Drawable.set_focused(self, value)
+
+        if not suppress_clear:
+            return [ClearStatusLineCommand()]
+
+
+class DrawableStatusLine(Drawable, StatusLine):
+    """A status line that can be drawn on the window."""
+
+    def __init__(self, window):
+        Drawable.__init__(self, window)
+        StatusLine.__init__(self)
+
+    def _draw(self):
+        # the right position also contains the timing HUD (if it's on)
+        texts = self.text[:2] + [" ".join(filter(None, (self.timing, self.text[2])))]
+
+        # the offsets of each of the text positions (left, center, right)
+        offsets = [
+            0,
+            center_coordinate(self.window.width(), len(texts[1])),
+            self.window.width() - len(texts[2]) - 1,
+        ]
+
+        if self.is_focused():
+            command_text = self.text[0]
+
+            if self.current_state is State.NORMAL:
+                command_text = ":" + command_text
+            elif self.current_state is State.INSERT:
+                command_text = ">" + command_text
+            elif self.current_state is State.SEARCH:
+                command_text = "/" + command_text
+
+            self.window.addstr(0, 0, command_text)
+            self.cursor_position = (self.cursor_offset + 1, 0)
+        else:
+            for i, offset in enumerate(offsets):
+                self.window.addstr(offset, 0, texts[i])
+
+
+class ItemLayout(NamedTuple):
+    """The layout of an item -- where it starts, where the cursor is when it's on the
+    item and what is drawn for it (relative to the start of its measure layout)."""
+
+    x: int
+    cursor: Tuple[int, int]
+    glyphs: List[Tuple[int, int, str, int]]  # x, y, the text and its attribute
+
+
+class MeasureLayout(NamedTuple):
+    """The layouts of the items that start in a measure and the width of the measure
+    (including its barlines)."""
+
+    items: List[ItemLayout]
+    width: int
+
+
+class LayoutCache:
+    """The layouts of the measures, shared by all of the panes of the editor, so a
+    measure shown in more panes (or in more frames) is only laid out once. Like the
+    FormatCache, the layouts are keyed by the items themselves (along with their
+    signature changes and the barlines that they cross) rather than by their positions,
+    which change when something is inserted before them. Only the layouts used by the
+    last frame are kept."""
+
+    def __init__(self):
+        self.layouts: Dict[tuple, MeasureLayout] = {}
+        self.used: Dict[tuple, MeasureLayout] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self, key: tuple, layout: Callable[[tuple], MeasureLayout]
+    ) -> MeasureLayout:
+        """Return the layout of the key, laying it out if it isn't cached."""
+        if key not in self.used:
+            if key in self.layouts:
+                self.used[key] = self.layouts[key]
+            else:
+                self.used[key] = layout(key)
+                self.misses += 1
+                return self.used[key]
+
+        self.hits += 1
+        return self.used[key]
+
+    def end_frame(self):
+        """Drop the layouts that weren't used by the frame."""
+        self.layouts, self.used = self.used, {}
+
+    def cache_info(self) -> SimpleNamespace:
+        """The statistics of the cache (like functools.lru_cache's, see Profiler)."""
+        return SimpleNamespace(
+            hits=self.hits, misses=self.misses, currsize=len(self.layouts), maxsize=None
+        )
+
+
+class DrawableEditor(Drawable, Editor):
+    """A note sheet editor that can be drawn on the window. Each of its panes is drawn
+    to its part of the window."""
+
+    def __init__(self, window, title: str):
+        Drawable.__init__(self, window)
+        Editor.__init__(self)
+
+        self.title = title
+
+        # drawing offsets
+        self.left_offset = 15  # larger than right (clef, time signature)
+        self.right_offset = 5
+
+        # the smallest size of a pane that a split can leave (the sheet with some space
+        # above and below it, and space for a few notes)
+        self.minimum_pane_size = (self.left_offset + self.right_offset + 12, 9)
+
+        self.layouts = LayoutCache()
+
+    def __pane_views(self, count: int, vertical: bool) -> List[Rectangle]:
+        """Return the parts of the window of the given number of panes (separated by a
+        column if they are side by side)."""
+        view = self.window.view
+
+        if vertical:
+            width = (view.width - count + 1) // count
+            return [
+                Rectangle(
+                    view.x + i * (width + 1),
+                    view.y,
+                    width if i != count - 1 else view.width - i * (width + 1),
+                    view.height,
+                )
+                for i in range(count)
+            ]
+
+        height = view.height // count
+        return [
+            Rectangle(
+                view.x,
+                view.y + i * height,
+                view.width,
+                height if i != count - 1 else view.height - i * height,
+            )
+            for i in range(count)
+        ]
+
+    def has_room_for_pane(self, vertical: bool) -> bool:
+        """Return True if none of the panes would be smaller than the minimum size if
+        another one was added."""
+        minimum_width, minimum_height = self.minimum_pane_size
+
+        return all(
+            view.width >= minimum_width and view.height >= minimum_height
+            for view in self.__pane_views(len(self.panes) + 1, vertical)
+        )
+
+    def _draw(self):
+        self.cursor_position = None
+
+        for pane, view in zip(
+            self.panes, self.__pane_views(len(self.panes), self.vertical)
+        ):
+            # the notes far from the sheet (or a terminal resized to be smaller than
+            # the panes need) would reach outside of the pane, so they're clipped
+            window = WindowView(self.window.parent, view, clip=True)
+
+            # the notes far from the sheet might reach the previous pane
+            if len(self.panes) > 1:
+                window.clear()
+
+            cursor = self.__draw_pane(pane, window)
+            self.window.cells_written += window.cells_written
+
+            # the cursor is the one of the current pane (in the coordinates of the
+            # window of the editor), kept inside of the pane like its glyphs
+            if pane is self.pane:
+                cursor_x = min(max(cursor[0], 0), view.width - 1)
+                cursor_y = min(max(cursor[1], 0), view.height - 1)
+
+                self.cursor_position = (
+                    cursor_x + view.x - self.window.view.x,
+                    cursor_y + view.y - self.window.view.y,
+                )
+
+            # the separator of the panes that are side by side
+            if self.vertical and pane is not self.panes[-1]:
+                for y in range(view.height):
+                    self.window.addstr(
+                        view.x + view.width - self.window.view.x, y, "│"
+                    )
+
+        self.layouts.end_frame()
+
+    def __draw_pane(self, pane: Pane, window: WindowView) -> Tuple[int, int]:
+        """Draw the pane to the window, returning the position of its cursor."""
+        buffer = pane.buffer
+
+        # scroll back if the cursor is before the displayed part of the score
+        if pane.position < pane.position_offset:
+            pane.position_offset = self.__viewport_start(buffer, pane.position)
+
+        line_count = 5  # number of lines in a note sheet
+
+        width = window.width()
+        height = window.height()
+
+        title_sheet_spacing = 3  # distance from the notesheet to the window title
+
+        # the title is only drawn if it fits along with the notes above and below the
+        # sheet (the panes might be short)
+        title = self.title.splitlines()
+        if line_count + len(title) + title_sheet_spacing + 6 > height:
+            title, title_sheet_spacing = [], 0
+
+        # offset to center the logo and the sheet horizontally
+        center = center_coordinate(
+            height, line_count + len(title) + title_sheet_spacing
+        )
+
+        # draw the title of the menu
+        for i, line in enumerate(title):
+            window.addstr(center_coordinate(width, len(line)), center + i, line)
+
+        # the offset to the first line of the note sheet
+        y_start = center + len(title) + title_sheet_spacing
+
+        # draw the sheet lines
+        for y in range(line_count):
+            window.addstr(
+                self.left_offset,
+                y_start + y,
+                " " * (width - self.right_offset - self.left_offset),
+                curses.A_UNDERLINE,
+            )
+
+        # the signatures that apply at the start of the displayed part of the score
+        time = buffer.signatures.get("time", pane.position_offset)
+        clef = buffer.signatures.get("clef", pane.position_offset)
+        key = buffer.signatures.get("key", pane.position_offset)
+
+        # time signature
+        time = f"{time.numerator}/{time.denominator}"
+        window.addstr(self.right_offset, y_start + 1, time)
+
+        # clef
+        clef = getattr(Notation.Clef, clef.name.upper())
+        window.addstr(self.right_offset + 6, y_start + 1, clef)
+
+        # key
+        window.addstr(self.right_offset, y_start + 4, key.name)
+
+        # the starting measure (only if we're at the very beginning)
+        if pane.position_offset == 0:
+            for i in range(4):
+                window.addstr(
+                    self.left_offset + 1,
+                    y_start + 1 + i,
+                    Notation.Bar.DOUBLE,
+                    curses.A_UNDERLINE | curses.A_BOLD,
+                )
+
+        cursor = None
+
+        # more space if we're at the very beginning
+        x = self.left_offset + (3 if pane.position_offset == 0 else 1)
+
+        # draw the measures (from the layouts of their items)
+        position = pane.position_offset
+        while position < len(buffer.score):
+            end = buffer.measures.measure_position(
+                buffer.measures.measure_of(position) + 1
+            )
+
+            layout = self.layouts.get(
+                self.__measure_key(buffer, position, end, pane.position_offset),
+                self.__layout_measure,
+            )
+
+            for i, item in enumerate(layout.items):
+                # stop when there is no space for the next note (and its signature
+                # changes)
+                if x + item.x + 10 >= width - self.right_offset:
+                    # if the cursor is past the displayed part, redraw starting from it
+                    if pane.position >= position + i:
+                        offset = self.__viewport_start(buffer, pane.position)
+
+                        # if even the cursor's measure doesn't fit, start at the cursor
+                        if offset == pane.position_offset:
+                            offset = pane.position
+
+                        if offset != pane.position_offset:
+                            pane.position_offset = offset
+
+                            window.clear()
+                            return self.__draw_pane(pane, window)
+
+                    return cursor or (x + item.x, y_start + 2)
+
+                for glyph_x, glyph_y, text, attribute in item.glyphs:
+                    window.addstr(x + glyph_x, y_start + glyph_y, text, attribute)
+
+                # the cursor, if we're drawing the currently selected item
+                if position + i == pane.position:
+                    cursor = (x + item.cursor[0], y_start + item.cursor[1])
+
+            x += layout.width
+            position = end
+
+        return cursor or (x, y_start + 2)
+
+    @staticmethod
+    def __measure_key(buffer: Buffer, start: int, end: int, offset: int) -> tuple:
+        """Return the key of the layout of the items from start to end (the ones that
+        start in a single measure) -- the items, their signature changes (except at the
+        start of the drawn part, where they are drawn before the sheet) and the ticks of
+        the barlines that they cross (relative to the start of the first item)."""
+        items = tuple(buffer.score[start:end])
+
+        changes = tuple(
+            tuple(buffer.signatures.changes(position).items())
+            if position != offset
+            else ()
+            for position in range(start, end)
+        )
+
+        tick = buffer.measures.tick_of(start)
+        end_tick = buffer.measures.tick_of(end)
+
+        bars = []
+        measure = buffer.measures.measure_of(start)
+        while buffer.measures.measure_end(measure) <= end_tick:
+            bars.append(buffer.measures.measure_end(measure) - tick)
+            measure += 1
+
+        return items, changes, tuple(bars)
+
+    def __layout_measure(self, key: tuple) -> MeasureLayout:
+        """Lay out the items of the key (see __measure_key)."""
+        items, changes, bars = key
+
+        layouts = []
+        x, tick, bar = 0, 0, 0
+
+        for item, item_changes in zip(items, changes):
+            glyphs = []
+            start = x
+
+            x = self.__layout_signature_changes(glyphs, x, dict(item_changes))
+            cursor = None
+
+            # the pieces of the item, since it's split when it extends over the measure
+            pieces = [item]
+
+            while len(pieces) != 0:
+                piece = pieces.pop(0)
+
+                if bar < len(bars) and tick + piece.ticks > bars[bar]:
+                    split = self.__split_to_ticks(piece, bars[bar] - tick)
+                    piece, pieces = split[0], split[1:] + pieces
+
+                if piece.is_rest():  # draw rests
+                    pos = (x, 2)
+                    glyphs.append(
+                        (*pos, Notation.Rest.from_ticks(piece.ticks), curses.A_UNDERLINE)
+                    )
+
+                elif piece.is_chord():  # draw chords
+                    pos = (x, 2)  # TODO
+
+                else:  # draw notes
+                    # magic
+                    note_offset = -(piece.pitches[0].step - 2 * 17 + 1)
+                    in_the_middle = note_offset % 2 == 0  # whether it's between lines
+
+                    pos = (x, note_offset // 2)
+                    glyphs.append(
+                        (*pos, Notation.Note.from_ticks(piece.ticks), curses.A_UNDERLINE)
+                    )
+
+                    # if the note is directly on the line, add a ^ indicator (since we
+                    # can't really draw a note midway through the line
+                    if in_the_middle:
+                        glyphs.append((x + 1, pos[1], "^", curses.A_UNDERLINE))
+                        x += 1
+
+                # the cursor is on the first piece of the item
+                if cursor is None:
+                    cursor = pos
+
+                tick += piece.ticks
+                x += 2
+
+                # draw breaks on full duration
+                while bar < len(bars) and tick >= bars[bar]:
+                    for i in range(4):
+                        glyphs.append(
+                            (
+                                x,
+                                1 + i,
+                                Notation.Bar.SINGLE,
+                                curses.A_UNDERLINE | curses.A_BOLD,
+                            )
+                        )
+
+                    x += 2
+                    bar += 1
+
+            layouts.append(ItemLayout(start, cursor, glyphs))
+
+        return MeasureLayout(layouts, x)
+
+    def set_focused(self, value: bool, suppress_clear=False) -> List[Command]:
+        """For setting status line information."""
+        Drawable.set_focused(self, value)
+
+        if suppress_clear:
+            return [self.get_file_name_command()]
+        else:
+            return [ClearStatusLineCommand(), self.get_file_name_command()]
+
+    @staticmethod
+    def __viewport_start(buffer: Buffer, position: int) -> int:
+        """Return the position from which to draw so the given position is visible (the
+        start of its measure, or of the last measure if it's at the end)."""
+        measure = buffer.measures.measure_of(
+            max(0, min(position, len(buffer.score) - 1))
+        )
+        return buffer.measures.measure_position(measure)
+
+    @staticmethod
+    def __layout_signature_changes(
+        glyphs: list, x: int, changes: Dict[str, Any]
+    ) -> int:
+        """Lay out the signature changes, starting from x. Returns the x coordinate
+        after the changes."""
+        if "clef" in changes:
+            clef = getattr(Notation.Clef, changes["clef"].name.upper())
+            glyphs.append((x, 1, clef, curses.A_UNDERLINE))
+            x += 2
+
+        if "time" in changes:
+            time = changes["time"]
+            width = len(str(max(time.numerator, time.denominator)))
+
+            glyphs.append((x, 1, str(time.numerator), curses.A_UNDERLINE))
+            glyphs.append((x, 3, str(time.denominator), curses.A_UNDERLINE))
+            x += width + 1
+
+        if "key" in changes:
+            key = changes["key"]
+            name = key.tonic.name + ("m" if key.mode.mode_name == "minor" else "")
+
+            glyphs.append((x, 4, name, 0))
+            x += len(name) + 1
+
+        return x
+
+    def __split_to_ticks(self, item: Event, ticks: int) -> List[Event]:
+        """Split the item into written note values that fill the given number of ticks
+        and the remaining item (which may be longer than a written note value)."""
+        items = []
+        remaining_ticks = item.ticks
+
+        while ticks != 0:
+            value = equal_or_lesser_note_value(ticks)
+
+            # the rest of the ticks can't be written as a note (tuplets...)
+            if value == 0:
+                break
+
+            items.append(item.with_ticks(value))
+
+            remaining_ticks -= value
+            ticks -= value
+
+        return items + [item.with_ticks(remaining_ticks)]
+
+
+class Interface:
+    """A high-level class for rendering the user interface."""
+
+    def __init__(self, window, arguments, event_loop: asyncio.AbstractEventLoop = None):
+        # window setup
+        self.window = window
+
+        # derive two windows from the current one -- the main one and the status one
+        self.main_window = WindowView(window)
+        self.status_window = WindowView(window)
+
+        # collects timing statistics of the main loop (see :profile)
+        self.profiler = Profiler()
+        self.profiler.add_cache("parse_item", parse_item)
+
+        # whether to show the timing of the last frame on the status line
+        self.show_timing = False
+
+        # the recorded macros (register -> keys) and the register being recorded into
+        self.registers: Dict[str, list] = {}
+        self.recording: Optional[str] = None
+
+        # the previously replayed register (for @@) and the ones being replayed (so a
+        # macro that replays itself doesn't recurse indefinitely)
+        self.previous_register: Optional[str] = None
+        self.replaying: Set[str] = set()
+
+        # the event loop that the keys, the redraws and the background jobs (see
+        # BackgroundCommand) are handled by (possibly shared with other interfaces, see
+        # server.py), and the jobs that are running (the loop only keeps weak
+        # references to its tasks)
+        self.event_loop = event_loop or asyncio.new_event_loop()
+        self.jobs: Set[asyncio.Task] = set()
+
+        # the functions waiting for a job thread (along with the futures of their
+        # results) and the number of the job threads that were started
+        self.job_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.job_threads = 0
+
+        # whether a redraw is scheduled and when the frame that it finishes started
+        self.draw_scheduled = False
+        self.frame_start = 0.0
+
+        # set when the terminal is too small to draw the currently active component
+        # done so all input to the active component (keystrokes) is disabled
+        self.terminal_too_small = False
+
+        # which method handles which command type (the most specific type wins)
+        self.dispatcher = CommandDispatcher(
+            {
+                PopComponentCommand: self.__handle_pop_component_command,
+                PushComponentCommand: self.__handle_push_component_command,
+                ToggleFocusCommand: self.__handle_toggle_focus_command,
+                ExitCommand: lambda c: self.quit(),
+                StatusLineCommand: lambda c: self.status_line.handle_command(c),
+                ProfileCommand: self.__handle_profile_command,
+                RecordMacroCommand: self.__handle_record_macro_command,
+                ReplayMacroCommand: self.__handle_replay_macro_command,
+                BackgroundCommand: self.__handle_background_command,
+                SetCommand: self.__handle_set_command,
+                # the background loading/decoding finishes regardless of the active
+                # component
+                LoadBuffersCommand: self.__handle_buffer_command,
+                AddBufferCommand: self.__handle_buffer_command,
+                FillScoreCommand: self.__handle_buffer_command,
+                # else just let the active component handle it
+                Command: lambda c: self.component_stack[-1].handle_command(c),
+            }
+        )
+
+        # component initialization
+        self.status_line = DrawableStatusLine(self.status_window)
+
+        self.components = {
+            "logo": DrawableLogoDisplay(self.main_window, vimvaldi_logo),
+            "menu": DrawableMenu(
+                self.main_window,
+                menu_logo,
+                [
+                    MenuItem(
+                        "EDIT", [PushComponentCommand("editor")], "Creates a new score."
+                    ),
+                    None,
+                    MenuItem(
+                        "HELP",
+                        [PushComponentCommand("help")],
+                        "Displays program documentation.",
+                    ),
+                    MenuItem(
+                        "INFO",
+                        [PushComponentCommand("info")],
+                        "Shows information about the program.",
+                    ),
+                    None,
+                    MenuItem("QUIT", [QuitCommand()], "Terminates the program."),
+                ],
+            ),
+            "info": DrawableTextDisplay(self.main_window, info_text),
+            "help": DrawableTextDisplay(self.main_window, help_text),
+            "editor": DrawableEditor(self.main_window, editor_logo),
+        }
+
+        self.profiler.add_cache("layout", self.components["editor"].layouts)
+
+        # the stack of the currently active components
+        # start with logo on top of menu (or with the editor, if there are files to
+        # edit, which are loaded in parallel)
+        self.component_stack = (
+            [self.components["menu"], self.components["editor"]]
+            if len(arguments.files) != 0
+            else [self.components["menu"], self.components["logo"]]
+            if not arguments.no_logo
+            else [self.components["menu"]]
+        )
+        self.resolve_commands(self.component_stack[-1].set_focused(True))
+
+        if len(arguments.files) != 0:
+            self.resolve_commands([LoadBuffersCommand(arguments.files)])
+
+        # the lines of ~/.vimvaldirc with errors are skipped, so the errors are only
+        # reported (and logged)
+        errors = load_keymaps()[1]
+        for error in errors:
+            logger.warning("%s", error)
+
+        if len(errors) != 0:
+            more = f" (and {len(errors) - 1} more)" if len(errors) > 1 else ""
+            self.resolve_commands(
+                [SetStatusLineTextCommand(errors[0] + more, Position.CENTER)]
+            )
+
+        self.resize_windows()
+
+    def get_focused(self):
+        """Get the focused component."""
+        return (
+            self.status_line
+            if self.status_line.is_focused()
+            else self.component_stack[-1]
+        )
+
+    def loop(self):
+        """The main loop of the program. The keys are read when stdin is readable and
+        the interface is redrawn after they (or the background jobs) are handled, so
+        nothing blocks while waiting for them. Runs until the program is terminated."""
+        Colors.initialize()
+
+        self.window.nodelay(True)
+
+        self.event_loop.add_reader(sys.stdin.fileno(), self.__read_keys)
+        self.event_loop.add_signal_handler(SIGWINCH, self.__handle_resize)
+
+        self.schedule_draw()
+
+        try:
+            self.event_loop.run_forever()
+        finally:
+            self.event_loop.close()
+
+    def __read_keys(self):
+        """Handle all of the keys that are available (curses might have read more of
+        them than the one that made stdin readable)."""
+        keys = []
+
+        while True:
+            # done to handle ^C gracefully, since curses sends an error
+            try:
+                keys.append(self.window.get_wch())
+            except curses.error as e:
+                break
+
+        self.handle_keys(keys)
+
+    def handle_keys(self, keys: Sequence):
+        """Handle the keys (in the form that get_wch returns them) and schedule a
+        redraw."""
+        frame_start = time.perf_counter()
+
+        for k in keys:
+            self.__handle_key(k)
+
+        self.schedule_draw(frame_start)
+
+    def __handle_key(self, k):
+        """Handle a single key."""
+        key_start = time.perf_counter()
+
+        # special window resize event handling
+        if k == curses.KEY_RESIZE:
+            self.resize_windows()
+
+        # possibly send the key to the currently focused component
+        elif not self.terminal_too_small:
+            recording = self.recording
+
+            commands = self.get_focused().handle_keypress(k)
+            keypress_end = time.perf_counter()
+
+            self.resolve_commands(commands)
+
+            # record the key, unless it started/stopped the recording
+            if recording is not None and recording == self.recording:
+                self.registers[recording].append(k)
+
+            self.profiler.record("keypress", keypress_end - key_start)
+            self.profiler.record("resolve", time.perf_counter() - keypress_end)
+
+    def __handle_resize(self):
+        """Resize the terminal (curses' own handler of the signal is replaced by the
+        event loop's)."""
+        size = os.get_terminal_size(sys.stdin.fileno())
+        curses.resizeterm(size.lines, size.columns)
+
+        self.resize_windows()
+        self.schedule_draw()
+
+    def schedule_draw(self, frame_start: float = None):
+        """Redraw the interface once the event loop gets to it (the redraws scheduled
+        in the meantime are merged into one). The frame starts now by default."""
+        if self.draw_scheduled:
+            return
+
+        self.draw_scheduled = True
+        self.frame_start = frame_start or time.perf_counter()
+
+        self.event_loop.call_soon(self.__draw)
+
+    def __draw(self):
+        """Redraw the component and the status line."""
+        self.draw_scheduled = False
+
+        try:
+            self.main_window.cells_written = 0
+            self.status_window.cells_written = 0
+            draw_start = time.perf_counter()
+
+            self.component_stack[-1].draw()
+            self.status_line.draw()
+
+            draw_end = time.perf_counter()
+            self.profiler.record("draw", draw_end - draw_start)
+            self.profiler.record("frame", draw_end - self.frame_start)
+
+            # show the timing of this frame on the status line (see :set showtiming)
+            if self.show_timing:
+                cells = (
+                    self.main_window.cells_written + self.status_window.cells_written
+                )
+
+                self.status_line.set_timing(
+                    f"{(draw_end - draw_start) * 1000:.1f}ms draw"
+                    f" {(draw_end - self.frame_start) * 1000:.1f}ms lat"
+                    f" {cells} cells"
+                )
+                self.status_line.draw()
+
+            # move the cursor to the focused component's cursor position
+            focused_component = self.get_focused()
+            if focused_component.cursor_position is not None:
+                self.show_cursor(True)
+                focused_component.window.move(*focused_component.cursor_position)
+            else:
+                self.show_cursor(False)
+
+            self.terminal_too_small = False
+
+        except Exception as e:
+            logger.debug("Could not draw the interface.", exc_info=True)
+
+            # TODO better error handling
+            height, width = self.window.getmaxyx()
+
+            error_text = "Terminal size too small!"[: width - 1]
+
+            self.window.clear()
+            self.window.addstr(
+                height // 2, center_coordinate(width, len(error_text)), error_text,
+            )
+
+            self.terminal_too_small = True
+
+        # the drawing is only written to the terminal when the window is refreshed
+        # (reading a key used to do it implicitly)
+        self.window.refresh()
+
+    def resolve_commands(self, commands: List[Command]):
+        """Resolve the specified commands."""
+        # this is important, since it creates a new deque so we can modify it freely
+        commands = deque(commands)
+
+        while len(commands) != 0:
+            command = commands.popleft()
+            start = time.perf_counter()
+
+            commands.extend(self.dispatcher.dispatch(command) or [])
+
+            self.profiler.record(
+                f"command:{type(command).__name__}", time.perf_counter() - start
+            )
+
+    def __handle_record_macro_command(self, command: RecordMacroCommand):
+        """Start/stop recording the keys into a register."""
+        self.recording = command.register
+
+        if command.register is None:
+            return [SetStatusLineTextCommand("", Position.CENTER)]
+
+        self.registers[command.register] = []
+        return [
+            SetStatusLineTextCommand(f"recording @{command.register}", Position.CENTER)
+        ]
+
+    def __handle_replay_macro_command(self, command: ReplayMacroCommand):
+        """Replay the keys of a register. The keys go straight to the focused component
+        and their commands are resolved right away, without drawing anything (the
+        interface is only redrawn once the entire macro is replayed)."""
+        register = (
+            self.previous_register if command.register == "@" else command.register
+        )
+
+        if register not in self.registers:
+            return [SetStatusLineTextCommand("Nothing recorded.", Position.CENTER)]
+
+        if register in self.replaying:
+            return []
+
+        self.previous_register = register
+        self.replaying.add(register)
+
+        try:
+            for _ in range(command.count):
+                for key in self.registers[register]:
+                    self.resolve_commands(self.get_focused().handle_keypress(key))
+        finally:
+            self.replaying.discard(register)
+
+    def __handle_background_command(self, command: BackgroundCommand):
+        """Run the job in the background -- a coroutine as a task of the event loop and
+        a function on a (daemon) thread. The commands that it returns are resolved once
+        it finishes."""
+        if asyncio.iscoroutine(command.job):
+            job = command.job
+        else:
+            job = self.__run_in_thread(command.job)
+
+        task = self.event_loop.create_task(
+            self.__finish_job(job, command.description)
+        )
+
+        self.jobs.add(task)
+        task.add_done_callback(self.jobs.discard)
+
+    def __run_in_thread(self, function: Callable[[], Any]) -> asyncio.Future:
+        """Run the function on one of the job threads, returning the future of its
+        result. At most JOB_THREADS of them are started (the functions wait in a queue
+        for one to be free). The threads are daemonic (unlike the ones of the loop's
+        executor, which are joined on exit), so quitting doesn't wait for the jobs."""
+        future = self.event_loop.create_future()
+        self.job_queue.put((function, future))
+
+        if self.job_threads < JOB_THREADS:
+            threading.Thread(target=self.__run_jobs, daemon=True).start()
+            self.job_threads += 1
+
+        return future
+
+    def __run_jobs(self):
+        """Run the queued functions, one after another (on a job thread)."""
+        while True:
+            function, future = self.job_queue.get()
+
+            try:
+                result = function()
+            except Exception as e:
+                self.event_loop.call_soon_threadsafe(future.set_exception, e)
+            else:
+                self.event_loop.call_soon_threadsafe(future.set_result, result)
+
+    async def __finish_job(self, job: Awaitable[List[Command]], description: str):
+        """Wait for the job and resolve the commands that it returns."""
+        try:
+            commands = await job
+        except Exception as e:
+            logger.exception("%s failed.", description)
+
+            commands = [
+                SetStatusLineTextCommand(f"{description} failed.", Position.CENTER)
+            ]
+
+        self.resolve_commands(commands)
+        self.schedule_draw()
+
+    def __handle_buffer_command(self, command: EditorCommand) -> List[Command]:
+        """Let the editor handle the command (even if it isn't the active component)."""
+        return self.components["editor"].handle_command(command)
+
+    def __handle_pop_component_command(self, command: PopComponentCommand):
+        """Pop the component, possibly terminating the app."""
+        self.component_stack.pop()
+
+        # if there are no remaining components, return
+        if len(self.component_stack) == 0:
+            self.quit()
+            return
+
+        return self.component_stack[-1].set_focused(True)
+
+    def __handle_push_component_command(self, command: PushComponentCommand):
+        """Add a new component, setting the focus on it."""
+        self.component_stack.append(self.components[command.component])
+
+        commands = self.status_line.set_focused(False)
+        return commands + self.component_stack[-1].set_focused(True)
+
+    def __handle_toggle_focus_command(self, command: ToggleFocusCommand):
+        """Toggle the focus between the status line and the current component."""
+        return (self.status_line.toggle_focused(command.suppress_clear) or []) + (
+            self.component_stack[-1].toggle_focused(command.suppress_clear) or []
+        )
+
+    def __handle_set_command(self, command: SetCommand) -> List[Command]:
+        """The timing HUD is an option of the interface, not of the editor, so handle
+        it here and let the active component handle the rest."""
+        if command.option not in ("showtiming", "noshowtiming"):
+            return self.component_stack[-1].handle_command(command)
+
+        self.show_timing = command.option == "showtiming"
+        self.status_line.set_timing("")
+
+        return [SetStatusLineTextCommand(f"'{command.option}' set.", Position.CENTER)]
+
+    def __handle_profile_command(self, command: ProfileCommand) -> List[Command]:
+        """Start/stop the profiler or dump its results."""
+        if command.action == "start":
+            self.profiler.start()
+            return [SetStatusLineTextCommand("Profiling started.", Position.CENTER)]
+
+        if command.action == "stop":
+            self.profiler.stop()
+            return [SetStatusLineTextCommand("Profiling stopped.", Position.CENTER)]
+
+        if command.action == "dump":
+            try:
+                self.profiler.dump(command.path)
+            except Exception as e:
+                logger.exception("Error writing to %r.", command.path)
+
+                return [
+                    SetStatusLineTextCommand("Error writing to file.", Position.CENTER)
+                ]
+
+            return [SetStatusLineTextCommand("Profile dumped.", Position.CENTER)]
+
+        return []
+
+    def show_cursor(self, visible: bool):
+        """Show/hide the cursor of the terminal."""
+        curses.curs_set(int(visible))
+
+    def quit(self):
+        """Terminate the program (once the last component is popped or on exit)."""
+        sys.exit()
+
+    def resize_windows(self):
+        """Resize the windows of the interface."""
+        height, width = self.window.getmaxyx()
+
+        self.main_window.resize(Rectangle(0, 0, width, height - 1))
+        self.status_window.resize(Rectangle(0, height - 1, width, 1))
+
+        self.status_line.set_changed(True)
+        self.component_stack[-1].set_changed(True)
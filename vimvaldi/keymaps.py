@@ -0,0 +1,338 @@
+"""A module for the keymaps -- which keys (or sequences of keys, like gg or "ax) the
+components react to by which of their actions. Each component has its own mode (with
+its own keymap), the default keymaps of which can be changed in ~/.vimvaldirc:
+
+    " a comment
+    map editor dd delete    (the keys are in Vim's notation, like <C-w>, <CR> or <reg>)
+    map editor <C-n> next-match
+    unmap editor N
+
+The keymaps of the modes are compiled into tries, so each key is matched by a single
+lookup. The compiled tries are cached, so the rc file isn't parsed on each launch."""
+
+import curses
+import hashlib
+import logging
+import marshal
+import os
+import re
+import sys
+from functools import lru_cache
+from itertools import product
+
+from vimvaldi.utilities import *
+
+logger = logging.getLogger(__name__)
+
+RC_PATH = os.path.join(os.path.expanduser("~"), ".vimvaldirc")
+
+CACHE_PATH = os.path.join(CACHE_DIRECTORY, "keymaps.cache")
+
+# the edge of a trie taken by a name of a register (an alphanumeric key or the key
+# before it repeated, like @@), since the real keys are single characters or key codes
+REGISTER = "<reg>"
+
+# the keys of the <...> names of the notation (some of them are sent as several keys)
+KEY_NAMES = {
+    "cr": ("\n", "\r", curses.KEY_ENTER),
+    "enter": ("\n", "\r", curses.KEY_ENTER),
+    "esc": (chr(27),),
+    "bs": (curses.KEY_BACKSPACE, "\b", chr(127)),
+    "del": (curses.KEY_DC,),
+    "tab": ("\t",),
+    "space": (" ",),
+    "lt": ("<",),
+    "up": (curses.KEY_UP,),
+    "down": (curses.KEY_DOWN,),
+    "left": (curses.KEY_LEFT,),
+    "right": (curses.KEY_RIGHT,),
+    "home": (curses.KEY_HOME,),
+    "end": (curses.KEY_END,),
+    "c-left": (553,),
+    "c-right": (568,),
+    "reg": (REGISTER,),
+}
+
+# a key of the notation -- a single character or a <...> name
+KEY = re.compile(r"<[^<>\s]+>|\S")
+
+# the keys of the modes and the actions that they do (see the components)
+DEFAULT_KEYMAPS = {
+    "logo": {
+        "<CR>": "close",
+    },
+    "menu": {
+        "j": "next",
+        "<Down>": "next",
+        "k": "previous",
+        "<Up>": "previous",
+        "<C-d>": "page-down",
+        "<C-u>": "page-up",
+        "<CR>": "select",
+        "l": "select",
+        "<Right>": "select",
+        ":": "command-line",
+    },
+    "help": {
+        "j": "scroll-down",
+        "<CR>": "scroll-down",
+        "k": "scroll-up",
+        "<C-d>": "page-down",
+        "<C-u>": "page-up",
+        "q": "close",
+    },
+    "status": {
+        "<BS>": "backspace",
+        "<Del>": "delete",
+        "<Esc>": "cancel",
+        "<Left>": "left",
+        "<Right>": "right",
+        "<C-Left>": "word-left",
+        "<C-Right>": "word-right",
+        "<Home>": "home",
+        "<End>": "end",
+        "<CR>": "confirm",
+    },
+    "editor": {
+        ":": "command-line",
+        "i": "insert",
+        "/": "search",
+        "n": "next-match",
+        "N": "previous-match",
+        "w": "next-measure",
+        "b": "previous-measure",
+        "e": "measure-end",
+        "gg": "start",
+        "G": "end",
+        ".": "repeat",
+        "l": "right",
+        "<Right>": "right",
+        "h": "left",
+        "<Left>": "left",
+        "x": "delete",
+        "p": "paste",
+        '"<reg>x': "delete",
+        '"<reg>p': "paste",
+        "q<reg>": "record-macro",
+        "@<reg>": "replay-macro",
+        "<C-w>w": "next-pane",
+        "<C-w><C-w>": "next-pane",
+        "<C-w>c": "close-pane",
+        "<C-w>o": "only-pane",
+    },
+    # while a macro is being recorded, these take precedence over the editor's keys
+    "recording": {
+        "q": "stop-recording",
+    },
+}
+
+# changes when the default keymaps do, so their cached compilations aren't used
+DEFAULTS_DIGEST = hashlib.sha1(repr(DEFAULT_KEYMAPS).encode()).hexdigest()
+
+
+def parse_keys(text: str) -> List[tuple]:
+    """Parse the keys in Vim's notation, returning the alternatives of each key (the
+    keys that the names like <CR> stand for). Raise a ValueError if it's invalid."""
+    keys = []
+
+    for key in KEY.findall(text):
+        if len(key) == 1:
+            keys.append((key,))
+            continue
+
+        name = key[1:-1].lower()
+
+        # <C-x> -- control and a letter
+        if re.fullmatch(r"c-[a-z]", name):
+            keys.append((chr(ord(name[2]) & 31),))
+
+        elif name in KEY_NAMES:
+            keys.append(KEY_NAMES[name])
+
+        else:
+            raise ValueError(f"Unknown key {key}.")
+
+    if len(keys) == 0:
+        raise ValueError("No keys.")
+
+    return keys
+
+
+def compile_keymap(keymap: Dict[str, str]) -> dict:
+    """Compile the keymap (keys -> action) into a trie -- nested dictionaries, keyed
+    by the keys, whose leaves are the actions. Since the keys aren't waited for, a
+    sequence can't be a prefix of another one; the later of such two wins."""
+    trie = {}
+
+    for text, action in keymap.items():
+        for keys in product(*parse_keys(text)):
+            node = trie
+
+            for key in keys[:-1]:
+                if not isinstance(node.get(key), dict):
+                    node[key] = {}
+
+                node = node[key]
+
+            node[keys[-1]] = action
+
+    return trie
+
+
+def read_rc(path: str) -> Tuple[Dict[str, Dict[str, str]], List[str]]:
+    """Return the default keymaps changed by the rc file, along with the errors in it
+    (the lines with errors are skipped)."""
+    keymaps = {mode: dict(keymap) for mode, keymap in DEFAULT_KEYMAPS.items()}
+    errors = []
+
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            parts = line.split()
+
+            if len(parts) == 0 or parts[0].startswith('"'):
+                continue
+
+            try:
+                if parts[0] not in ("map", "unmap"):
+                    raise ValueError(f"Unknown command '{parts[0]}'.")
+
+                if len(parts) != (4 if parts[0] == "map" else 3):
+                    raise ValueError(f"Invalid '{parts[0]}' format.")
+
+                mode, keys = parts[1:3]
+
+                if mode not in keymaps:
+                    raise ValueError(f"Unknown mode '{mode}'.")
+
+                parse_keys(keys)
+
+                if parts[0] == "unmap":
+                    if keymaps[mode].pop(keys, None) is None:
+                        raise ValueError(f"No mapping of {keys}.")
+
+                else:
+                    if parts[3] not in DEFAULT_KEYMAPS[mode].values():
+                        raise ValueError(f"Unknown action '{parts[3]}'.")
+
+                    # moved to the end, so it wins over the mappings that it conflicts
+                    # with (see compile_keymap)
+                    keymaps[mode].pop(keys, None)
+                    keymaps[mode][keys] = parts[3]
+
+            except ValueError as e:
+                errors.append(f"{os.path.basename(path)}:{number}: {e}")
+
+    return keymaps, errors
+
+
+def read_cache(key: tuple) -> Optional[Tuple[Dict[str, dict], List[str]]]:
+    """Return the cached compiled keymaps (None if they aren't cached or were compiled
+    from something else than the key describes)."""
+    try:
+        with open(CACHE_PATH, "rb") as f:
+            cached_key, tries, errors = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    return (tries, errors) if cached_key == key else None
+
+
+def write_cache(key: tuple, tries: Dict[str, dict], errors: List[str]):
+    """Cache the compiled keymaps (through atomic_write, so the cache is never read
+    half-written)."""
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+
+    with atomic_write(CACHE_PATH, "wb") as f:
+        marshal.dump((key, tries, errors), f)
+
+
+@lru_cache(maxsize=None)
+def load_keymaps(path: str = RC_PATH) -> Tuple[Dict[str, dict], List[str]]:
+    """Return the compiled keymaps of the modes (changed by the rc file, if there is
+    one) and the errors in the rc file. The compilation is cached, keyed by the rc
+    file's path, modification time and size, so it's only redone when it changes."""
+    try:
+        status = os.stat(path)
+    except OSError:
+        modes = {
+            mode: compile_keymap(keymap) for mode, keymap in DEFAULT_KEYMAPS.items()
+        }
+        return modes, []
+
+    key = (
+        os.path.abspath(path),
+        status.st_mtime_ns,
+        status.st_size,
+        DEFAULTS_DIGEST,
+        sys.hexversion,
+    )
+
+    cached = read_cache(key)
+    if cached is not None:
+        return cached
+
+    try:
+        keymaps, errors = read_rc(path)
+    except (OSError, UnicodeDecodeError) as e:
+        logger.warning("Error reading %r.", path, exc_info=True)
+        keymaps, errors = DEFAULT_KEYMAPS, [f"Error reading {path}."]
+
+    modes = {mode: compile_keymap(keymap) for mode, keymap in keymaps.items()}
+
+    try:
+        write_cache(key, modes, errors)
+    except OSError:
+        pass  # the cache is only an optimization
+
+    return modes, errors
+
+
+class KeyMap:
+    """The keymap of a mode, matching the keys against its trie as they come."""
+
+    def __init__(self, mode: str):
+        self.trie = load_keymaps()[0][mode]
+        self.node = self.trie
+
+        # the register of the matched sequence (None if it has none) and the last key
+        # of the sequence being matched (for the registers like @@)
+        self.register: Optional[str] = None
+        self.previous_key = None
+
+    def is_pending(self) -> bool:
+        """Return True if a sequence of keys is being matched."""
+        return self.node is not self.trie
+
+    def reset(self):
+        """Drop the sequence being matched."""
+        self.node = self.trie
+
+    def feed(self, key) -> Optional[str]:
+        """Match the key, returning the action of the sequence that it finishes (None
+        if it doesn't finish any). If the key doesn't continue the sequence being
+        matched, the sequence is dropped and the key is matched on its own."""
+        node, self.node = self.node, self.trie
+
+        if node is self.trie:
+            self.register = None
+
+        child = node.get(key)
+
+        if child is None and REGISTER in node and self.__is_register(key):
+            child = node[REGISTER]
+            self.register = key
+
+        if child is None:
+            return None if node is self.trie else self.feed(key)
+
+        if isinstance(child, str):
+            return child
+
+        self.node, self.previous_key = child, key
+
+    def __is_register(self, key) -> bool:
+        """Return True if the key is a name of a register."""
+        if not isinstance(key, str) or len(key) != 1:
+            return False
+
+        return key.isalnum() or key == self.previous_key
@@ -0,0 +1,239 @@
+"""A module for opening LilyPond (.ly) files lazily. The files that Vimvaldi saves have
+a single item per line, so a quick pre-scan of the lines finds the durations of the
+items and the byte offsets at which the chunks of the items start, without parsing
+them through abjad. The result of the pre-scan is cached, so reopening a file doesn't
+even scan it."""
+
+import hashlib
+import mmap
+import os
+import re
+import struct
+from array import array
+from typing import *
+
+from vimvaldi.music import *
+from vimvaldi.score import *
+from vimvaldi.utilities import *
+
+CACHE_MAGIC = b"VVI\x01"
+
+# the modification time and the size of the scanned file, the numbers of its items,
+# chunks and measures and the length of its signatures
+CACHE_HEADER = struct.Struct("<4sqqQQQQ")
+
+# the cached pre-scan is laid out like this (all of the numbers are little-endian):
+# - the header
+# - the ticks at which the items start (plus the total duration), as int64s
+# - the byte offsets at which the chunks start (plus the end of the last one), as int64s
+# - the ticks at which the measures start, as int64s
+# - the signature index (lines of "kind position signature", in UTF-8)
+
+# the lines of the file -- a single item (note/rest/chord with an explicit duration),
+# a signature change, or a part of the score/staff around them
+LINE = re.compile(
+    rb"\s*(?:"
+    rb"(?P<item>(?:r|<%(pitch)s(?: %(pitch)s)*>|%(pitch)s)(?P<value>\d+)(?P<dots>\.*))"
+    rb"|\\(?P<kind>time|key|clef) (?P<signature>[^\n]*?)"
+    rb"|\\new (?:Score|Staff)|<<|>>|\{|\}|%%[^\n]*"
+    rb")?\s*" % {b"pitch": rb"[a-g](?:ss|ff|s|f)?[',]*"}
+)
+
+
+def is_lilypond(path: str) -> bool:
+    """Return True if the path is of a LilyPond (.ly) file."""
+    return os.path.splitext(path)[1].lower() == ".ly"
+
+
+def cache_path(path: str) -> str:
+    """Return the path of the cached pre-scan of the file."""
+    name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(CACHE_DIRECTORY, name + ".vvi")
+
+
+def note_value_ticks(value: bytes, dots: bytes) -> int:
+    """Return the number of ticks of the (dotted) note value, like 4 and '.'."""
+    number = int(value)
+    ticks = TICKS_PER_WHOLE // number if number != 0 else 0
+
+    if ticks not in NOTE_VALUES or ticks * number != TICKS_PER_WHOLE:
+        raise ValueError("Unsupported duration.")
+
+    if ticks >> len(dots) << len(dots) != ticks:
+        raise ValueError("Unsupported duration.")
+
+    return 2 * ticks - (ticks >> len(dots))
+
+
+def scan_ly(path: str) -> Tuple[array, array, SignatureIndex]:
+    """Scan the lines of the file, returning the ticks at which the items start, the
+    byte offsets at which the chunks of the items start and the signatures. Raise a
+    ValueError if the file isn't one item per line (like the ones written by hand),
+    since those have to be parsed through abjad."""
+    prefix, offsets, signatures = array("q", [0]), array("q"), SignatureIndex()
+
+    durations: Dict[Tuple[bytes, bytes], int] = {}
+
+    tick, offset, end = 0, 0, 0
+    with open(path, "rb") as f:
+        for line in f:
+            match = LINE.fullmatch(line)
+
+            if match is None:
+                raise ValueError("Not a Vimvaldi LilyPond file.")
+
+            if match["item"] is not None:
+                if (len(prefix) - 1) % LazyScore.CHUNK_SIZE == 0:
+                    offsets.append(offset)
+
+                key = (match["value"], match["dots"])
+                if key not in durations:
+                    durations[key] = note_value_ticks(*key)
+
+                tick += durations[key]
+                prefix.append(tick)
+
+                end = offset + len(line)
+
+            elif match["kind"] is not None:
+                kind = match["kind"].decode()
+                text = match["signature"].decode().replace("\\", "").strip('"')
+
+                signatures.set(kind, len(prefix) - 1, parse_signature(kind, text))
+
+            offset += len(line)
+
+    offsets.append(end)
+
+    return prefix, offsets, signatures
+
+
+def read_cache(path: str) -> Optional[Tuple[array, array, array, SignatureIndex]]:
+    """Return the cached pre-scan of the file (None if it isn't cached or the file
+    changed since, judging by its modification time and size)."""
+    status = os.stat(path)
+
+    try:
+        with open(cache_path(path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if len(data) < CACHE_HEADER.size:
+        return None
+
+    magic, mtime, size, items, chunks, measures, text_length = (
+        CACHE_HEADER.unpack_from(data)
+    )
+
+    if (magic, mtime, size) != (CACHE_MAGIC, status.st_mtime_ns, status.st_size):
+        return None
+
+    prefix_end = CACHE_HEADER.size + (items + 1) * 8
+    offsets_end = prefix_end + (chunks + 1) * 8
+    starts_end = offsets_end + measures * 8
+
+    return (
+        array("q", data[CACHE_HEADER.size : prefix_end]),
+        array("q", data[prefix_end:offsets_end]),
+        array("q", data[offsets_end:starts_end]),
+        parse_signatures(data[starts_end : starts_end + text_length].decode()),
+    )
+
+
+def write_cache(
+    path: str,
+    prefix: array,
+    offsets: array,
+    starts: array,
+    signatures: SignatureIndex,
+):
+    """Cache the pre-scan of the file (keyed by its modification time and size)."""
+    status = os.stat(path)
+
+    text = format_signatures(signatures).encode()
+
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+
+    with atomic_write(cache_path(path), "wb") as f:
+        f.write(
+            CACHE_HEADER.pack(
+                CACHE_MAGIC,
+                status.st_mtime_ns,
+                status.st_size,
+                len(prefix) - 1,
+                len(offsets) - 1,
+                len(starts),
+                len(text),
+            )
+        )
+        f.write(prefix.tobytes())
+        f.write(offsets.tobytes())
+        f.write(starts.tobytes())
+        f.write(text)
+
+
+class LilyPondScore(LazyScore):
+    """A score that is mapped from a .ly file (see LazyScore), whose items are parsed
+    a chunk at a time from the lines between the offsets found by the pre-scan."""
+
+    def __init__(self, path: str, prefix: array, offsets: array):
+        super().__init__(prefix)
+
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.byte_offsets = offsets
+
+    def decode(self, events: range) -> List[Event]:
+        """Parse the range of the items from the file."""
+        if len(events) == 0:
+            return []
+
+        # the ranges are always whole chunks (the offsets are only known for them)
+        k = events.start // self.CHUNK_SIZE
+        start, end = self.byte_offsets[k], self.byte_offsets[k + 1]
+
+        items = []
+        for line in self.map[start:end].splitlines():
+            line = line.strip()
+
+            # skip the signatures (they are in the signature index) and the comments
+            if len(line) != 0 and line[0] not in b"\\%":
+                items.append(parse_item(line.decode()))
+
+        return items
+
+
+def read_ly(path: str) -> Tuple[LilyPondScore, SignatureIndex, array, array]:
+    """Open the file, returning the (lazily loaded) score, its signatures, and the
+    ticks at which its events and measures start (for seeding the measure index). The
+    pre-scan of the file (along with the measures) is cached, so only the first opening
+    of the file scans it. Raise a ValueError if the file can't be opened lazily."""
+    scan = read_cache(path)
+
+    if scan is None:
+        prefix, offsets, signatures = scan_ly(path)
+
+        if len(prefix) == 1:
+            raise ValueError("The file contains no items.")
+
+        score = LilyPondScore(path, prefix, offsets)
+
+        # the measures are computed from the durations, without parsing the items
+        measures = MeasureIndex(score, signatures)
+        measures.measure_count()
+
+        starts = array("q", measures.starts)
+
+        try:
+            write_cache(path, prefix, offsets, starts, signatures)
+        except OSError:
+            pass  # the cache is only an optimization
+
+    else:
+        prefix, offsets, starts, signatures = scan
+        score = LilyPondScore(path, prefix, offsets)
+
+    # the measure index changes its prefix sums, so they're copied
+    return score, signatures, array("q", prefix), starts
@@ -0,0 +1,410 @@
+"""A module for writing the score as a Standard MIDI File and reading it back."""
+
+import struct
+from bisect import bisect_left
+from collections import defaultdict
+from typing import *
+
+import abjad
+
+from vimvaldi.music import *
+from vimvaldi.score import *
+
+# the order of the letters in the circle of fifths (F is one flat, C has none...)
+FIFTHS = "fcgdaeb"
+
+# the tempo of the exported files (in microseconds per quarter note; 120 BPM)
+TEMPO = 500_000
+
+# the velocity of the exported notes
+VELOCITY = 80
+
+# the grid that the imported notes are quantized to (a sixteenth note)
+GRID = TICKS_PER_QUARTER // 4
+
+# the durations (in ticks) that the imported notes can have -- the note values with up
+# to two dots (whose last dot is still on the grid), the longest first
+DURATIONS = sorted(
+    {
+        2 * value - (value >> dots)
+        for value in NOTE_VALUES
+        for dots in range(3)
+        if value >> dots >= GRID
+    },
+    reverse=True,
+)
+
+# the channel of the percussion (which has no pitches, so it isn't imported)
+DRUM_CHANNEL = 9
+
+
+def key_to_fifths(key: abjad.KeySignature) -> Tuple[int, bool]:
+    """Return the number of sharps (positive) or flats (negative) of the key signature
+    and whether it is minor."""
+    name = key.tonic.name
+    minor = key.mode.mode_name == "minor"
+
+    fifths = FIFTHS.index(name[0]) - 1 + 7 * key.tonic.accidental.semitones
+
+    return fifths - 3 * minor, minor
+
+
+def fifths_to_key(fifths: int, minor: bool) -> abjad.KeySignature:
+    """Return the key signature with the number of sharps (positive) or flats
+    (negative)."""
+    alteration, letter = divmod(fifths + 3 * minor + 1, 7)
+    name = FIFTHS[letter] + "s" * max(0, alteration) + "f" * max(0, -alteration)
+
+    return abjad.KeySignature(name, "minor" if minor else "major")
+
+
+class MidiWriter:
+    """A streaming writer of single-track (format 0) MIDI files. The events are written
+    to the (buffered) file as they come, so the memory doesn't depend on the length of
+    the score; the length of the track is only patched into its header at the end."""
+
+    def __init__(self, f: BinaryIO, division: int = TICKS_PER_QUARTER):
+        self.f = f
+
+        # the header (format 0, one track, division ticks per quarter note)
+        f.write(b"MThd" + struct.pack(">IHHH", 6, 0, 1, division))
+
+        # the track header, whose length is written when the writer is closed
+        f.write(b"MTrk\0\0\0\0")
+        self.track_start = f.tell()
+
+        self.tick = 0  # the tick of the last written event
+
+    def __write_event(self, tick: int, data: bytes):
+        """Write an event (preceded by its delta time, as a variable-length number)."""
+        delta, self.tick = tick - self.tick, tick
+
+        # most of the events are simultaneous, so their delta fits into a single byte
+        if delta < 0x80:
+            self.f.write(bytes((delta,)) + data)
+            return
+
+        # the variable-length number, 7 bits per byte, the highest bit marking that
+        # more bytes follow
+        number = bytearray([delta & 0x7F])
+        delta >>= 7
+        while delta != 0:
+            number.insert(0, 0x80 | (delta & 0x7F))
+            delta >>= 7
+
+        self.f.write(bytes(number) + data)
+
+    def meta(self, tick: int, kind: int, data: bytes):
+        """Write a meta event."""
+        self.__write_event(tick, bytes([0xFF, kind, len(data)]) + data)
+
+    def note_on(self, tick: int, note: int, velocity: int = VELOCITY, channel: int = 0):
+        """Write a note on event."""
+        self.__write_event(tick, bytes([0x90 | channel, note, velocity]))
+
+    def note_off(self, tick: int, note: int, channel: int = 0):
+        """Write a note off event."""
+        self.__write_event(tick, bytes([0x80 | channel, note, 0]))
+
+    def time_signature(self, tick: int, time: abjad.TimeSignature):
+        """Write a time signature event (only the ones whose denominator is a power of
+        two can be represented)."""
+        if time.denominator & (time.denominator - 1) == 0:
+            denominator = time.denominator.bit_length() - 1
+            self.meta(tick, 0x58, bytes([time.numerator, denominator, 24, 8]))
+
+    def key_signature(self, tick: int, key: abjad.KeySignature):
+        """Write a key signature event (only the ones with at most 7 sharps/flats can
+        be represented)."""
+        fifths, minor = key_to_fifths(key)
+
+        if -7 <= fifths <= 7:
+            self.meta(tick, 0x59, struct.pack(">bB", fifths, minor))
+
+    def close(self):
+        """Write the end of the track and patch its length into its header."""
+        self.meta(self.tick, 0x2F, b"")
+
+        end = self.f.tell()
+        self.f.seek(self.track_start - 4)
+        self.f.write(struct.pack(">I", end - self.track_start))
+        self.f.seek(end)
+
+
+def write_midi(path: str, score: Sequence[Event], signatures: SignatureIndex):
+    """Write the score (along with its time and key signature changes) to a MIDI file,
+    in a single pass over the events."""
+    # the signature changes, in the order of their positions
+    changes = sorted(
+        (position, kind, signature)
+        for kind in ("time", "key")
+        for position, signature in zip(
+            signatures.positions[kind], signatures.signatures[kind]
+        )
+    )
+    change = 0
+
+    with open(path, "wb", buffering=1 << 16) as f:
+        writer = MidiWriter(f)
+        writer.meta(0, 0x51, TEMPO.to_bytes(3, "big"))
+
+        tick = 0
+
+        def write_changes(position: int):
+            """Write the signature changes up to the position (at the current tick)."""
+            nonlocal change
+
+            while change < len(changes) and changes[change][0] <= position:
+                _, kind, signature = changes[change]
+
+                if kind == "time":
+                    writer.time_signature(tick, signature)
+                else:
+                    writer.key_signature(tick, signature)
+
+                change += 1
+
+        for position, item in enumerate(score):
+            write_changes(position)
+
+            notes = [n for n in (p.number for p in item.pitches) if 0 <= n <= 127]
+
+            for note in notes:
+                writer.note_on(tick, note)
+
+            tick += item.ticks
+
+            for note in notes:
+                writer.note_off(tick, note)
+
+        # the changes after the last item (like the ones set at the end of the score)
+        write_changes(len(score))
+
+        writer.close()
+
+
+def split_ticks(ticks: int) -> List[int]:
+    """Split the number of ticks (a multiple of the grid) into the durations that the
+    imported notes can have, the longest first."""
+    durations = []
+
+    for duration in DURATIONS:
+        while ticks >= duration:
+            durations.append(duration)
+            ticks -= duration
+
+    return durations
+
+
+def read_variable_number(data: bytes, offset: int) -> Tuple[int, int]:
+    """Read a variable-length number at the offset, returning it and the offset after
+    it."""
+    number = 0
+
+    while True:
+        byte = data[offset]
+        offset += 1
+
+        number = (number << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return number, offset
+
+
+def read_track(
+    data: bytes, offset: int, end: int, notes: List[Tuple[int, int, int]], metas: list
+):
+    """Read the events of a track from the offset to the end, adding its notes (start,
+    end, MIDI number) and its time/key signature meta events (tick, kind, data)."""
+    tick = 0
+    status = 0  # the running status
+
+    # channel * 128 + note -> the ticks at which the currently sounding notes started
+    sounding = defaultdict(list)
+
+    while offset < end:
+        # most deltas fit into a single byte
+        if data[offset] < 0x80:
+            tick += data[offset]
+            offset += 1
+        else:
+            delta, offset = read_variable_number(data, offset)
+            tick += delta
+
+        # a new status (else the previous one is reused)
+        if data[offset] >= 0x80:
+            event = data[offset]
+            offset += 1
+
+            # meta events and system exclusive messages
+            if event >= 0xF0:
+                if event == 0xFF:
+                    kind = data[offset]
+                    length, offset = read_variable_number(data, offset + 1)
+
+                    if kind in (0x58, 0x59):
+                        metas.append((tick, kind, data[offset : offset + length]))
+
+                    # end of track
+                    if kind == 0x2F:
+                        break
+                else:
+                    length, offset = read_variable_number(data, offset)
+
+                offset += length
+                continue
+
+            status = event
+
+        kind, channel = status & 0xF0, status & 0x0F
+
+        # note on/off (a note on with no velocity is a note off)
+        if kind == 0x90 or kind == 0x80:
+            note, velocity = data[offset], data[offset + 1]
+            offset += 2
+
+            if channel == DRUM_CHANNEL:
+                continue
+
+            starts = sounding[channel << 7 | note]
+
+            if kind == 0x90 and velocity != 0:
+                starts.append(tick)
+            elif len(starts) != 0:
+                notes.append((starts.pop(0), tick, note))
+
+        # program change and channel pressure have one data byte, the rest two
+        elif kind == 0xC0 or kind == 0xD0:
+            offset += 1
+        else:
+            offset += 2
+
+    # the notes that weren't turned off end with the track
+    for key, starts in sounding.items():
+        notes.extend((start, tick, key & 0x7F) for start in starts)
+
+
+def read_midi(path: str) -> Tuple[List[Event], SignatureIndex]:
+    """Read a MIDI file, returning its events and signatures. The notes (of all of the
+    tracks) are quantized to the grid; the notes that start at the same time become a
+    chord, which lasts until the next one starts (or until its longest note ends, the
+    rest of the time being filled with rests)."""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if data[:4] != b"MThd":
+        raise ValueError("Not a MIDI file.")
+
+    length, _, _, division = struct.unpack_from(">IHHH", data, 4)
+
+    if division & 0x8000:
+        raise ValueError("SMPTE time division is not supported.")
+
+    notes, metas = [], []
+
+    # the chunks (the ones that aren't tracks are skipped)
+    offset = 8 + length
+    while offset + 8 <= len(data):
+        chunk, length = struct.unpack_from(">4sI", data, offset)
+        offset += 8
+
+        if chunk == b"MTrk":
+            read_track(data, offset, min(offset + length, len(data)), notes, metas)
+
+        offset += length
+
+    # the tick of the file t is quantized to (2 * t * a + b) // c * GRID
+    a, b, c = TICKS_PER_QUARTER, division * GRID, 2 * division * GRID
+
+    def quantize(tick: int) -> int:
+        """Convert the tick of the file to the (nearest) tick of the grid."""
+        return (2 * tick * a + b) // c * GRID
+
+    # the pitches and the ends of the chords (by their starts)
+    pitches_of: Dict[int, Set[int]] = {}
+    end_of: Dict[int, int] = {}
+
+    for start, end, note in notes:
+        start, end = quantize(start), quantize(end)
+
+        if start in pitches_of:
+            pitches_of[start].add(note)
+
+            if end > end_of[start]:
+                end_of[start] = end
+        else:
+            pitches_of[start] = {note}
+            end_of[start] = max(end, start + GRID)
+
+    # the signatures, by their (quantized) ticks
+    times = sorted(
+        (quantize(tick), abjad.TimeSignature((data[0], 1 << data[1])))
+        for tick, kind, data in metas
+        if kind == 0x58 and len(data) >= 2
+    )
+    keys = sorted(
+        (quantize(tick), struct.unpack(">bB", data[:2]))
+        for tick, kind, data in metas
+        if kind == 0x59 and len(data) >= 2
+    )
+
+    score: List[Event] = []
+    starts: List[int] = []  # the ticks at which the events start
+
+    # the splits of the durations (there are only a few distinct ones)
+    splits: Dict[int, List[int]] = {}
+
+    def add(start: int, ticks: int, pitches: Tuple[Pitch, ...] = ()):
+        """Add the event, splitting it into the durations that the notes can have (each
+        part keeps the pitches, so the notes are re-attacked rather than cut short)."""
+        if ticks not in splits:
+            splits[ticks] = split_ticks(ticks)
+
+        for duration in splits[ticks]:
+            starts.append(start)
+            score.append(Event(duration, pitches))
+
+            start += duration
+
+    # the spellings of the MIDI numbers (with sharps and flats) and of the chords
+    spellings = {
+        flats: [Pitch.from_number(number, flats) for number in range(128)]
+        for flats in (False, True)
+    }
+    chords: Dict[Tuple[bool, Tuple[int, ...]], Tuple[Pitch, ...]] = {}
+
+    # the index of the next key signature (in keys)
+    tick, next_key, flats = 0, 0, False
+    onsets = sorted(pitches_of)
+    for i, onset in enumerate(onsets):
+        end = end_of[onset]
+
+        # spell the pitches according to the key signature
+        while next_key < len(keys) and keys[next_key][0] <= onset:
+            flats = keys[next_key][1][0] < 0
+            next_key += 1
+
+        if onset > tick:
+            add(tick, onset - tick)
+
+        if i + 1 < len(onsets):
+            end = min(end, onsets[i + 1])
+
+        numbers = tuple(sorted(pitches_of[onset]))
+        if (flats, numbers) not in chords:
+            chords[flats, numbers] = tuple(spellings[flats][n] for n in numbers)
+
+        add(onset, end - onset, chords[flats, numbers])
+        tick = end
+
+    # the signatures change at the first event that starts at (or after) their tick
+    signatures = SignatureIndex()
+
+    for tick, time in times:
+        signatures.set("time", bisect_left(starts, tick), time)
+
+    for tick, (fifths, minor) in keys:
+        if -7 <= fifths <= 7:
+            key = fifths_to_key(fifths, minor)
+            signatures.set("key", bisect_left(starts, tick), key)
+
+    return score, signatures
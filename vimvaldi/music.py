@@ -1,19 +1,307 @@
 """A module for storing musical-related classes."""
 
+from __future__ import annotations
+
+from array import array
+from fractions import Fraction
+from functools import lru_cache
+from typing import *
+
 import abjad
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the number of ticks in a quarter note -- the durations of the events are stored as
+# integer numbers of ticks, so the layout doesn't need any rational arithmetic (960 is
+# divisible enough to exactly represent dotted 1/64 notes, as well as triplets)
+TICKS_PER_QUARTER = 960
+TICKS_PER_WHOLE = 4 * TICKS_PER_QUARTER
+
+# the written (undotted) note values, from the whole note to the 1/64 note
+NOTE_VALUES = [TICKS_PER_WHOLE >> i for i in range(7)]
+
+# the number of semitones from C to the natural notes of the octave
+NATURAL_SEMITONES = (0, 2, 4, 5, 7, 9, 11)
+
+# the number of the most recently parsed items that are kept (see parse_item)
+PARSE_CACHE_SIZE = 1024
+
+
+def duration_to_ticks(duration: abjad.Duration) -> int:
+    """Convert a rational duration to ticks."""
+    return duration.numerator * TICKS_PER_WHOLE // duration.denominator
+
+
+def ticks_to_duration(ticks: int) -> abjad.Duration:
+    """Convert ticks to a rational duration."""
+    return abjad.Duration(ticks, TICKS_PER_WHOLE)
+
+
+def equal_or_lesser_note_value(ticks: int) -> int:
+    """Return the longest written note value (in ticks) that fits into the given number
+    of ticks (0 if not even a 1/64 note does)."""
+    for value in NOTE_VALUES:
+        if value <= ticks:
+            return value
+
+    return 0
+
+
+class Pitch(NamedTuple):
+    """A spelled pitch. The step is the number of diatonic steps from C0 (so it directly
+    determines the position on the staff) and the alteration is in semitones."""
+
+    step: int
+    alteration: int = 0
+
+    @property
+    def letter(self) -> str:
+        """The letter of the pitch (c to b)."""
+        return "cdefgab"[self.step % 7]
+
+    @property
+    def octave(self) -> int:
+        """The octave of the pitch (c' is in the octave 4)."""
+        return self.step // 7
+
+    @property
+    def number(self) -> int:
+        """The MIDI number of the pitch (c' is 60)."""
+        natural = NATURAL_SEMITONES[self.step % 7]
+        return (self.octave + 1) * 12 + natural + self.alteration
+
+    @property
+    def name(self) -> str:
+        """The LilyPond name of the pitch (like cs' or ef,)."""
+        accidental = "s" * max(0, self.alteration) + "f" * max(0, -self.alteration)
+        octave = "'" * (self.octave - 3) if self.octave > 3 else "," * (3 - self.octave)
+
+        return self.letter + accidental + octave
+
+    @classmethod
+    def from_number(cls, number: int, flats: bool = False) -> Pitch:
+        """Create the pitch from a MIDI number, spelling the black keys with sharps (or
+        flats, if flats is True)."""
+        octave, semitone = divmod(number, 12)
+
+        letter = (
+            (0, 1, 1, 2, 2, 3, 4, 4, 5, 5, 6, 6)
+            if flats
+            else (0, 0, 1, 1, 2, 3, 3, 4, 4, 5, 5, 6)
+        )[semitone]
+
+        return cls((octave - 1) * 7 + letter, semitone - NATURAL_SEMITONES[letter])
+
+    @classmethod
+    def from_abjad(cls, pitch: abjad.NamedPitch) -> Pitch:
+        """Create the pitch from an abjad pitch."""
+        alteration = pitch.accidental.semitones
+
+        if alteration != int(alteration):
+            raise ValueError("Microtonal pitches are not supported.")
+
+        step = pitch.octave.number * 7 + "cdefgab".index(pitch.name[0])
+
+        return cls(step, int(alteration))
+
+    def to_abjad(self) -> abjad.NamedPitch:
+        """Return the corresponding abjad pitch."""
+        return abjad.NamedPitch(self.name)
+
+
+class Event(NamedTuple):
+    """An item of the score -- a rest (no pitches), a note (one pitch) or a chord (more
+    pitches) lasting the given number of ticks. Events are immutable, so they can be
+    freely shared (between the score, the deleted items...)."""
+
+    ticks: int
+    pitches: Tuple[Pitch, ...] = ()
+
+    def is_rest(self) -> bool:
+        """Return True if the event is a rest."""
+        return len(self.pitches) == 0
+
+    def is_chord(self) -> bool:
+        """Return True if the event is a chord."""
+        return len(self.pitches) > 1
+
+    def with_ticks(self, ticks: int) -> Event:
+        """Return the same event with a different duration."""
+        return self._replace(ticks=ticks)
+
+    @classmethod
+    def from_leaf(cls, leaf: abjad.Leaf) -> Event:
+        """Create the event from an abjad note/rest/chord."""
+        ticks = duration_to_ticks(leaf.written_duration)
+
+        if isinstance(leaf, abjad.Note):
+            return cls(ticks, (Pitch.from_abjad(leaf.written_pitch),))
+
+        if isinstance(leaf, abjad.Chord):
+            return cls(ticks, tuple(map(Pitch.from_abjad, leaf.written_pitches)))
+
+        if isinstance(leaf, abjad.Rest):
+            return cls(ticks)
 
-def from_duration(cls, duration: abjad.utilities.Duration) -> str:
-    """Return the note/rest string corresponding with the given duration."""
+        raise ValueError(f"Unsupported leaf '{leaf}'.")
+
+    def to_leaf(self) -> abjad.Leaf:
+        """Return the corresponding abjad note/rest/chord (for exporting)."""
+        duration = ticks_to_duration(self.ticks)
+
+        if self.is_rest():
+            return abjad.Rest(duration)
+
+        if self.is_chord():
+            return abjad.Chord([p.name for p in self.pitches], duration)
+
+        return abjad.Note(self.pitches[0].name, duration)
+
+
+def column(values: Iterable[int]) -> Union[array, "np.ndarray"]:
+    """Return the values as a column -- a NumPy array (if NumPy is installed, see the
+    render extra), so the operations over the columns are vectorized, else an array."""
+    if np is not None:
+        return np.fromiter(values, dtype=np.int64)
+
+    return array("q", values)
+
+
+class Columns(NamedTuple):
+    """Items of a score stored column-wise, for operations over many items at once.
+    The pitches of all of the items are stored in flat columns and the counts say how
+    many of them belong to each of the items (see column)."""
+
+    ticks: Union[array, "np.ndarray"]
+    counts: Union[array, "np.ndarray"]
+    steps: Union[array, "np.ndarray"]
+    alterations: Union[array, "np.ndarray"]
+
+    @classmethod
+    def from_items(cls, items: Sequence[Event]) -> Columns:
+        """Split the items into columns."""
+        return cls(
+            column(item.ticks for item in items),
+            column(len(item.pitches) for item in items),
+            column(p.step for item in items for p in item.pitches),
+            column(p.alteration for item in items for p in item.pitches),
+        )
+
+    def to_items(self) -> List[Event]:
+        """Join the columns back into items."""
+        pitches = list(map(Pitch, self.steps.tolist(), self.alterations.tolist()))
+
+        items, i = [], 0
+        for ticks, count in zip(self.ticks.tolist(), self.counts.tolist()):
+            items.append(Event(ticks, tuple(pitches[i : i + count])))
+            i += count
+
+        return items
+
+    def transpose(self, staff_spaces: int, semitones: int) -> Columns:
+        """Return the columns transposed by the given interval (the number of staff
+        spaces determines the spelling)."""
+        # the alteration changes by however much the natural notes don't cover
+        if np is not None:
+            naturals = np.array(NATURAL_SEMITONES)
+
+            steps = self.steps + staff_spaces
+            old = 12 * (self.steps // 7) + naturals[self.steps % 7]
+            new = 12 * (steps // 7) + naturals[steps % 7]
+
+            alterations = self.alterations + semitones - (new - old)
+            beyond = np.flatnonzero(np.abs(alterations) > 2).tolist()
+
+        else:
+            steps = array("q", [step + staff_spaces for step in self.steps])
+
+            old = [12 * (s // 7) + NATURAL_SEMITONES[s % 7] for s in self.steps]
+            new = [12 * (s // 7) + NATURAL_SEMITONES[s % 7] for s in steps]
+
+            alterations = array(
+                "q",
+                [
+                    a + semitones - (n - o)
+                    for a, o, n in zip(self.alterations, old, new)
+                ],
+            )
+            beyond = [i for i, a in enumerate(alterations) if abs(a) > 2]
+
+        # the pitches altered beyond double sharps/flats (which can't be written) are
+        # respelled, keeping the direction of the alteration
+        for i in beyond:
+            pitch = Pitch(int(steps[i]), int(alterations[i]))
+            steps[i], alterations[i] = Pitch.from_number(
+                pitch.number, pitch.alteration < 0
+            )
+
+        return self._replace(steps=steps, alterations=alterations)
+
+    def scale(self, factor: Fraction) -> Columns:
+        """Return the columns with the durations scaled by the factor. Raises
+        ValueError if the scaled durations aren't whole numbers of ticks."""
+        if np is not None:
+            numerators = self.ticks * factor.numerator
+
+            if np.any(numerators % factor.denominator != 0):
+                raise ValueError(f"The durations can't be scaled by {factor}.")
+
+            return self._replace(ticks=numerators // factor.denominator)
+
+        numerators = [ticks * factor.numerator for ticks in self.ticks]
+
+        if any(n % factor.denominator != 0 for n in numerators):
+            raise ValueError(f"The durations can't be scaled by {factor}.")
+
+        return self._replace(
+            ticks=array("q", [n // factor.denominator for n in numerators])
+        )
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_item(item: str) -> Event:
+    """Parse an item (a note/rest/chord in the LilyPond syntax). Parsing through abjad
+    is slow and the same few items are inserted over and over, so the results are
+    cached (the events are immutable, so they can be shared)."""
+    if item[0] == "r":
+        return Event.from_leaf(abjad.Rest(item))
+    elif item[0] == "<":
+        return Event.from_leaf(abjad.Chord(item))
+    else:
+        return Event.from_leaf(abjad.Note(item))
+
+
+def parse_interval(text: str) -> Tuple[int, int]:
+    """Parse an interval, either named (like +M3 or -P8) or a number of semitones (like
+    -2), returning the number of staff spaces and semitones."""
+    try:
+        semitones = int(text)
+    except ValueError:
+        interval = abjad.NamedInterval(text)
+        return interval.staff_spaces, interval.semitones
+
+    # spell the intervals given by semitones with sharps (so +1 is c -> cs)
+    octaves, semitones_in_octave = divmod(semitones, 12)
+    staff_spaces = (0, 0, 1, 2, 2, 3, 3, 4, 5, 5, 6, 6)[semitones_in_octave]
+
+    return octaves * 7 + staff_spaces, semitones
+
+
+def from_ticks(cls, ticks: int) -> str:
+    """Return the note/rest string corresponding with the given number of ticks (the
+    longest written note value that fits, so dotted notes are drawn without the dot)."""
     return {
-        1: cls.WHOLE,
-        1 / 2: cls.HALF,
-        1 / 4: cls.QUARTER,
-        1 / 8: cls.EIGHT,
-        1 / 16: cls.SIXTEENTH,
-        1 / 32: cls.THIRTY_SECOND,
-        1 / 64: cls.SIXTY_FOURTH,
-    }[float(duration)]
+        NOTE_VALUES[0]: cls.WHOLE,
+        NOTE_VALUES[1]: cls.HALF,
+        NOTE_VALUES[2]: cls.QUARTER,
+        NOTE_VALUES[3]: cls.EIGHT,
+        NOTE_VALUES[4]: cls.SIXTEENTH,
+        NOTE_VALUES[5]: cls.THIRTY_SECOND,
+        NOTE_VALUES[6]: cls.SIXTY_FOURTH,
+    }[max(equal_or_lesser_note_value(ticks), NOTE_VALUES[-1])]
 
 
 class Notation:
@@ -41,8 +329,8 @@ class Notation:
 
     class Durationable:
         @classmethod
-        def from_duration(cls, duration: abjad.Duration) -> str:
-            return from_duration(cls, duration)
+        def from_ticks(cls, ticks: int) -> str:
+            return from_ticks(cls, ticks)
 
     class Note(Durationable):
         WHOLE = "𝅝"
@@ -62,10 +350,6 @@ class Notation:
         THIRTY_SECOND = "𝅀"
         SIXTY_FOURTH = "𝅁"
 
-        @classmethod
-        def from_duration(cls, duration: abjad.Duration) -> str:
-            return from_duration(cls, duration)
-
     class Bar:
         SINGLE = "𝄀"
         DOUBLE = "𝄁"
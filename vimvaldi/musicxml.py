@@ -0,0 +1,527 @@
+"""A module for importing MusicXML files and exporting the score to them. Both stream --
+the import parses the file incrementally (clearing the parsed elements), so the memory
+doesn't depend on the size of the file, and the export writes the elements as it goes
+through the score."""
+
+import io
+import os
+import zipfile
+from math import gcd
+from typing import *
+from xml.etree.ElementTree import iterparse, fromstring
+
+import abjad
+
+from vimvaldi.midi import fifths_to_key, key_to_fifths
+from vimvaldi.music import *
+from vimvaldi.score import *
+
+# the note types of MusicXML (by the note values)
+TYPES = {
+    NOTE_VALUES[0]: "whole",
+    NOTE_VALUES[1]: "half",
+    NOTE_VALUES[2]: "quarter",
+    NOTE_VALUES[3]: "eighth",
+    NOTE_VALUES[4]: "16th",
+    NOTE_VALUES[5]: "32nd",
+    NOTE_VALUES[6]: "64th",
+}
+
+# the durations (in ticks) that the items can have -- the note values with up to two
+# dots -- and their note values and numbers of dots
+DURATIONS = {
+    2 * value - (value >> dots): (value, dots)
+    for value in NOTE_VALUES
+    for dots in range(3)
+    if value >> dots << dots == value
+}
+
+# the grid that the durations that can't be represented exactly (like the ones of the
+# tuplets) are quantized to (a 1/64 note), and the durations that they're split into
+GRID = NOTE_VALUES[-1]
+GRID_DURATIONS = sorted((d for d in DURATIONS if d % GRID == 0), reverse=True)
+
+# the clefs (that can be drawn) and their signs and lines
+CLEFS = {"treble": ("G", "2"), "alto": ("C", "3"), "bass": ("F", "4")}
+
+# the contents of the .mxl archives (besides the score itself)
+MXL_MIMETYPE = "application/vnd.recordare.musicxml"
+MXL_SCORE = "score.musicxml"
+MXL_CONTAINER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    "<container><rootfiles>"
+    f'<rootfile full-path="{MXL_SCORE}" media-type="application/vnd.recordare.'
+    'musicxml+xml"/>'
+    "</rootfiles></container>\n"
+)
+
+HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+    '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 4.0 Partwise//EN" '
+    '"http://www.musicxml.org/dtds/partwise.dtd">\n'
+    '<score-partwise version="4.0">\n'
+    '  <part-list><score-part id="P1"><part-name>Music</part-name></score-part>'
+    "</part-list>\n"
+    '  <part id="P1">\n'
+)
+
+
+def is_musicxml(path: str) -> bool:
+    """Return True if the path is of a MusicXML (.musicxml, .xml or compressed .mxl)
+    file."""
+    return os.path.splitext(path)[1].lower() in (".musicxml", ".xml", ".mxl")
+
+
+def is_compressed(path: str) -> bool:
+    """Return True if the path is of a compressed MusicXML (.mxl) file."""
+    return os.path.splitext(path)[1].lower() == ".mxl"
+
+
+def split_ticks(ticks: int, exact: bool = False) -> List[int]:
+    """Split the number of ticks (a multiple of the grid) into the durations that the
+    items can have, the longest first. If exact is True, a duration that the items can
+    have isn't split and whatever doesn't fit into the grid is the last duration."""
+    if exact and ticks in DURATIONS:
+        return [ticks]
+
+    durations = []
+
+    for duration in GRID_DURATIONS:
+        while ticks >= duration:
+            durations.append(duration)
+            ticks -= duration
+
+    if exact and ticks > 0:
+        durations.append(ticks)
+
+    return durations
+
+
+class MusicXmlWriter:
+    """A streaming writer of single-part MusicXML files. The measures and their notes
+    are written as they come, so the memory doesn't depend on the length of the
+    score."""
+
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.f.write(HEADER)
+
+        self.measure = 0  # the number of the last opened measure
+        self.open = False  # whether a measure is open
+
+    def open_measure(self):
+        """Open the next measure (closing the open one)."""
+        self.close_measure()
+
+        self.measure += 1
+        self.open = True
+
+        self.f.write(f'    <measure number="{self.measure}">\n')
+
+    def close_measure(self):
+        """Close the open measure (if there is one)."""
+        if self.open:
+            self.f.write("    </measure>\n")
+            self.open = False
+
+    def attributes(self, changes: Dict[str, Any], divisions: int = None):
+        """Write the signature changes (and the divisions of a quarter note)."""
+        text = "" if divisions is None else f"<divisions>{divisions}</divisions>"
+
+        if "key" in changes:
+            fifths, minor = key_to_fifths(changes["key"])
+            mode = "minor" if minor else "major"
+            text += f"<key><fifths>{fifths}</fifths><mode>{mode}</mode></key>"
+
+        if "time" in changes:
+            time = changes["time"]
+            text += (
+                f"<time><beats>{time.numerator}</beats>"
+                f"<beat-type>{time.denominator}</beat-type></time>"
+            )
+
+        if "clef" in changes and changes["clef"].name in CLEFS:
+            sign, line = CLEFS[changes["clef"].name]
+            text += f"<clef><sign>{sign}</sign><line>{line}</line></clef>"
+
+        if text != "":
+            self.f.write(f"      <attributes>{text}</attributes>\n")
+
+    def note(self, ticks: int, pitches: Tuple[Pitch, ...], ties: Tuple[str, ...] = ()):
+        """Write a note/rest/chord with the given ties ("start" and/or "stop") of its
+        pitches. The durations that the items can't have are written as 1/64 notes."""
+        value, dots = DURATIONS.get(ticks, (GRID, 0))
+        end = (
+            "".join(f'<tie type="{tie}"/>' for tie in ties)
+            + f"<voice>1</voice><type>{TYPES[value]}</type>"
+            + "<dot/>" * dots
+        )
+
+        if len(ties) != 0:
+            end += (
+                "<notations>"
+                + "".join(f'<tied type="{tie}"/>' for tie in ties)
+                + "</notations>"
+            )
+
+        if len(pitches) == 0:
+            self.f.write(
+                f"      <note><rest/><duration>{ticks}</duration>{end}</note>\n"
+            )
+            return
+
+        for i, pitch in enumerate(pitches):
+            alter = f"<alter>{pitch.alteration}</alter>" if pitch.alteration else ""
+
+            self.f.write(
+                "      <note>"
+                + ("<chord/>" if i != 0 else "")
+                + f"<pitch><step>{pitch.letter.upper()}</step>{alter}"
+                + f"<octave>{pitch.octave}</octave></pitch>"
+                + f"<duration>{ticks}</duration>{end}</note>\n"
+            )
+
+    def close(self):
+        """Close the last measure and the score."""
+        self.close_measure()
+        self.f.write("  </part>\n</score-partwise>\n")
+
+
+def write_score(
+    f: TextIO,
+    score: Sequence[Event],
+    signatures: SignatureIndex,
+    measures: MeasureIndex,
+):
+    """Write the score to the (text) file as MusicXML, in a single pass over the items.
+    The items that cross bar lines are split into notes tied over them."""
+    measures.measure_count()  # brings the measure index up to date
+
+    writer = MusicXmlWriter(f)
+
+    # the first measure (with the divisions, which are the ticks, and the signatures)
+    writer.open_measure()
+    writer.attributes(signatures.changes(0), TICKS_PER_QUARTER)
+
+    tick, measure = 0, 0
+    for position, item in enumerate(score):
+        start, ticks = tick, item.ticks
+        changes = signatures.changes(position) if position != 0 else {}
+
+        while ticks > 0:
+            # a measure is only opened once there is something to write into it
+            if not writer.open:
+                writer.open_measure()
+
+            if len(changes) != 0:
+                writer.attributes(changes)
+                changes = {}
+
+            if measure + 1 < len(measures.starts):
+                end = measures.starts[measure + 1]
+            else:
+                end = tick + ticks
+
+            piece = min(ticks, end - tick)
+
+            # the pieces of the item are tied together (the ones of a rest aren't)
+            for duration in split_ticks(piece, exact=True):
+                ties = ()
+                if not item.is_rest():
+                    ties = (("stop",) if tick != start else ()) + (
+                        ("start",) if duration != ticks else ()
+                    )
+
+                writer.note(duration, item.pitches, ties)
+
+                tick += duration
+                ticks -= duration
+
+            if tick == end:
+                writer.close_measure()
+                measure += 1
+
+    # the changes after the last item (like the ones set at the end of the score)
+    changes = signatures.changes(len(score)) if len(score) != 0 else {}
+
+    if len(changes) != 0:
+        if not writer.open:
+            writer.open_measure()
+
+        writer.attributes(changes)
+
+    writer.close()
+
+
+def write_musicxml(
+    path: str,
+    score: Sequence[Event],
+    signatures: SignatureIndex,
+    measures: MeasureIndex,
+):
+    """Write the score to a MusicXML file (compressed, if the path is of a .mxl one)."""
+    if not is_compressed(path):
+        with open(path, "w", encoding="utf-8", buffering=1 << 16) as f:
+            write_score(f, score, signatures, measures)
+
+        return
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        # the mimetype has to be the first (and uncompressed) file of the archive
+        archive.writestr("mimetype", MXL_MIMETYPE, zipfile.ZIP_STORED)
+        archive.writestr("META-INF/container.xml", MXL_CONTAINER)
+
+        with archive.open(MXL_SCORE, "w") as member:
+            with io.TextIOWrapper(member, encoding="utf-8") as f:
+                write_score(f, score, signatures, measures)
+
+
+def open_score(path: str) -> BinaryIO:
+    """Open the MusicXML file (the score in it, if it's a compressed .mxl file)."""
+    if not is_compressed(path):
+        return open(path, "rb")
+
+    archive = zipfile.ZipFile(path)
+    container = fromstring(archive.read("META-INF/container.xml"))
+
+    rootfile = container.find(".//rootfile")
+    if rootfile is None:
+        raise ValueError("No score in the archive.")
+
+    return archive.open(rootfile.get("full-path"))
+
+
+def child_text(children: Dict[str, Any], tag: str, default: str = None) -> str:
+    """Return the (stripped) text of the child element with the tag (or the default, if
+    there is no such child)."""
+    child = children.get(tag)
+    return child.text.strip() if child is not None and child.text else default
+
+
+def read_musicxml(path: str) -> Tuple[List[Event], SignatureIndex]:
+    """Read the first part of a MusicXML file, returning its events and signatures. Only
+    a single voice (the first one of the first staff) is read; the gaps that the other
+    voices leave in it become rests. The durations that the items can't have (like the
+    ones of the tuplets) are quantized to the grid and split (each part keeps the
+    pitches, like the imported MIDI files)."""
+    score: List[Event] = []
+    signatures = SignatureIndex()
+
+    # the (shared) pitches of the items
+    spellings: Dict[Tuple[int, int], Pitch] = {}
+
+    # the durations are in divisions of a quarter note, which needn't divide the ticks
+    # of a quarter note, so the times are kept in units (fractions of a tick), which
+    # only become finer when the divisions change
+    divisions, unit = 1, 1
+
+    # the voice that is read (known once the first note of the first staff is read)
+    voice, voice_known = None, False
+
+    # the time (in units) that the voice reached, the tick that its items reached (which
+    # only differs from the time inside the quantized durations), and the time at which
+    # the measure starts, its length and the current time in it (of any of the voices)
+    exact, written = 0, 0
+    measure_start, measure_length, cursor = 0, 0, 0
+
+    # the position of the (first part of the) last item that isn't a part of a chord
+    chord_position = None
+
+    def add(end: int, pitches: Tuple[Pitch, ...] = ()):
+        """Add the item that lasts until the end (the time that the voice reaches)."""
+        nonlocal exact, written
+
+        ticks, remainder = divmod(end - exact, unit)
+
+        # the items are quantized only when their duration can't be represented
+        if written * unit == exact and remainder == 0 and ticks in DURATIONS:
+            durations = [ticks]
+        else:
+            grid = GRID * unit
+            durations = split_ticks((2 * end + grid) // (2 * grid) * GRID - written)
+
+            # a note is never rounded away -- it takes a step of the grid (which the
+            # items after it lose instead)
+            if len(durations) == 0 and len(pitches) != 0:
+                durations = [GRID]
+
+        for duration in durations:
+            score.append(Event(duration, pitches))
+            written += duration
+
+        exact = end
+
+    with open_score(path) as f:
+        root = None
+
+        for event, element in iterparse(f, events=("start", "end")):
+            tag = element.tag
+
+            if event == "start":
+                if root is None:
+                    root = element
+
+                    if tag == "score-timewise":
+                        raise ValueError("Only partwise MusicXML files are supported.")
+
+                    if tag != "score-partwise":
+                        raise ValueError("Not a MusicXML file.")
+
+                if tag == "part":
+                    part = element
+
+                continue
+
+            if tag == "note":
+                children = {child.tag: child for child in element}
+                tied = any(
+                    child.tag == "tie" and child.get("type") == "stop"
+                    for child in element
+                )
+
+                element.clear()
+
+                # grace and cue notes don't take any time
+                if "grace" in children or "cue" in children:
+                    continue
+
+                duration = int(child_text(children, "duration", "0"))
+                duration = duration * TICKS_PER_QUARTER * unit // divisions
+
+                is_chord = "chord" in children
+
+                if not is_chord:
+                    cursor += duration
+                    measure_length = max(measure_length, cursor)
+
+                # only the first voice of the first staff is read
+                note_voice = child_text(children, "voice")
+                if child_text(children, "staff", "1") != "1":
+                    continue
+
+                if not voice_known:
+                    voice, voice_known = note_voice, True
+
+                if note_voice != voice:
+                    continue
+
+                pitches = ()
+
+                pitch = children.get("pitch")
+                if pitch is not None:
+                    octave = int(pitch.findtext("octave"))
+                    step = octave * 7 + "CDEFGAB".index(pitch.findtext("step").strip())
+                    alteration = round(float(pitch.findtext("alter", "0")))
+
+                    if (step, alteration) not in spellings:
+                        spellings[step, alteration] = Pitch(step, alteration)
+
+                    pitches = (spellings[step, alteration],)
+
+                # the pitches of a chord are added to (all of the parts of) its first
+                # item
+                if is_chord:
+                    if chord_position is not None and len(pitches) != 0:
+                        for position in range(chord_position, len(score)):
+                            item = score[position]
+
+                            if pitches[0] not in item.pitches:
+                                score[position] = item._replace(
+                                    pitches=item.pitches + pitches
+                                )
+
+                # a note tied to the previous item lengthens it (if it can be)
+                elif (
+                    tied
+                    and chord_position == len(score) - 1
+                    and score[-1].pitches[:1] == pitches
+                    and written * unit == exact
+                    and duration % unit == 0
+                    and score[-1].ticks + duration // unit in DURATIONS
+                ):
+                    score[-1] = score[-1].with_ticks(score[-1].ticks + duration // unit)
+
+                    exact += duration
+                    written += duration // unit
+
+                elif duration > 0:
+                    length = len(score)
+                    add(exact + duration, pitches)
+
+                    # a rest might have been rounded away
+                    chord_position = length if len(score) != length else None
+
+            elif tag in ("backup", "forward"):
+                duration = int(element.findtext("duration", "0"))
+                duration = duration * TICKS_PER_QUARTER * unit // divisions
+
+                cursor += duration if tag == "forward" else -duration
+                measure_length = max(measure_length, cursor)
+
+                # the (invisible) rests of the voice
+                if tag == "forward" and element.findtext("voice") == voice:
+                    add(exact + duration)
+
+            elif tag == "attributes":
+                text = element.findtext("divisions")
+                if text is not None:
+                    divisions = int(text)
+
+                    # the units are made fine enough for the new divisions
+                    finer = divisions // gcd(divisions, TICKS_PER_QUARTER)
+                    factor = finer // gcd(unit, finer)
+
+                    unit *= factor
+                    exact, measure_start = exact * factor, measure_start * factor
+                    measure_length, cursor = measure_length * factor, cursor * factor
+
+                for key in element.iterfind("key"):
+                    fifths = key.findtext("fifths")
+
+                    if fifths is not None and -7 <= int(fifths) <= 7:
+                        minor = key.findtext("mode") == "minor"
+                        signatures.set(
+                            "key", len(score), fifths_to_key(int(fifths), minor)
+                        )
+
+                for time in element.iterfind("time"):
+                    beats, beat_type = time.findtext("beats"), time.findtext(
+                        "beat-type"
+                    )
+
+                    if beats is not None and beat_type is not None:
+                        numerator = sum(map(int, beats.split("+")))
+                        signatures.set(
+                            "time",
+                            len(score),
+                            abjad.TimeSignature((numerator, int(beat_type))),
+                        )
+
+                for clef in element.iterfind("clef"):
+                    if clef.get("number", "1") != "1":
+                        continue
+
+                    sign_line = (clef.findtext("sign"), clef.findtext("line"))
+
+                    for name in CLEFS:
+                        if CLEFS[name] == sign_line:
+                            signatures.set("clef", len(score), abjad.Clef(name))
+
+            elif tag == "measure":
+                # the voice is filled with rests to the end of the measure
+                measure_end = measure_start + measure_length
+
+                if exact < measure_end:
+                    add(measure_end)
+
+                measure_start = max(exact, measure_end)
+                measure_length, cursor = 0, 0
+
+                # the measures are dropped from the part as they're parsed
+                part.clear()
+
+            # only the first part is read
+            elif tag == "part":
+                break
+
+    return score, signatures
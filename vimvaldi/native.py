@@ -0,0 +1,194 @@
+"""A module for the native binary score format (.vvd), which can be opened lazily."""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import *
+
+from vimvaldi.music import *
+from vimvaldi.score import *
+from vimvaldi.utilities import *
+
+MAGIC = b"VVD\x01"
+
+# the counts of the events, pitches and measures and the length of the signatures
+HEADER = struct.Struct("<4sQQQQ")
+
+# the duration of the event, the index of its first pitch and the number of its pitches
+EVENT = struct.Struct("<IIH")
+
+# the step and the alteration of the pitch
+PITCH = struct.Struct("<hb")
+
+# the file is laid out like this (all of the numbers are little-endian):
+# - the header
+# - the events (fixed-width records)
+# - the pitches of the events (fixed-width records)
+# - the ticks at which the events start (plus the total duration), as int64s
+# - the measure table -- the ticks at which the measures start, as int64s
+# - the signature index (lines of "kind position signature", in UTF-8)
+
+
+def is_native(path: str) -> bool:
+    """Return True if the path is of a native (.vvd) file."""
+    return os.path.splitext(path)[1].lower() == ".vvd"
+
+
+def pack_int64s(values: Sequence[int]) -> bytes:
+    """Return the values as little-endian int64s."""
+    values = array("q", values)
+
+    if sys.byteorder != "little":
+        values.byteswap()
+
+    return values.tobytes()
+
+
+def unpack_int64s(view: memoryview) -> Sequence[int]:
+    """Return the little-endian int64s of the view -- as a view of the same memory on
+    little-endian machines and as a (byteswapped) copy on the others."""
+    if sys.byteorder == "little":
+        return view.cast("q")
+
+    values = array("q", view.tobytes())
+    values.byteswap()
+
+    return values
+
+
+def write_vvd(
+    path: str,
+    score: Sequence[Event],
+    signatures: SignatureIndex,
+    measures: MeasureIndex,
+):
+    """Write the score to the file (through atomic_write, so a score that is lazily
+    loaded from the path keeps reading the old file, which it has mapped)."""
+    measures.total_ticks()  # brings the measure index up to date
+
+    pitches = bytearray()
+    pitch_count = 0
+
+    with atomic_write(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0, 0, 0))
+
+        event_count = 0
+        for item in score:
+            f.write(EVENT.pack(item.ticks, pitch_count, len(item.pitches)))
+            event_count += 1
+
+            for pitch in item.pitches:
+                pitches += PITCH.pack(pitch.step, pitch.alteration)
+                pitch_count += 1
+
+        f.write(pitches)
+
+        f.write(pack_int64s(measures.prefix))
+
+        measure_count = measures.measure_count()
+        f.write(pack_int64s(measures.starts))
+
+        text = format_signatures(signatures).encode()
+        f.write(text)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, event_count, pitch_count, measure_count, len(text)))
+
+
+class NativeScore(LazyScore):
+    """A score that is mapped from a .vvd file (see LazyScore)."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, events, pitches, measures, text_length = HEADER.unpack_from(self.map)
+
+        if magic != MAGIC:
+            raise ValueError("Not a Vimvaldi file.")
+
+        self.events_offset = HEADER.size
+        self.pitches_offset = self.events_offset + events * EVENT.size
+
+        # the ticks at which the events and the measures start (without copying them
+        # from the file)
+        prefix_offset = self.pitches_offset + pitches * PITCH.size
+        super().__init__(
+            unpack_int64s(
+                memoryview(self.map)[prefix_offset : prefix_offset + (events + 1) * 8]
+            )
+        )
+
+        self.starts_offset = prefix_offset + (events + 1) * 8
+        self.starts = unpack_int64s(
+            memoryview(self.map)[self.starts_offset : self.starts_offset + measures * 8]
+        )
+
+        self.text_offset = self.starts_offset + measures * 8
+        self.text_length = text_length
+
+        # the decoded events and pitches, so the same ones are shared
+        self.interned: Dict[tuple, Any] = {}
+
+    def decode(self, events: range) -> List[Event]:
+        """Decode the range of the events from the file."""
+        if len(events) == 0:
+            return []
+
+        offset = self.events_offset + events.start * EVENT.size
+        end = offset + len(events) * EVENT.size
+
+        items = []
+        for ticks, first, count in EVENT.iter_unpack(self.map[offset:end]):
+            pitches = tuple(
+                self.__intern(
+                    PITCH.unpack_from(self.map, self.pitches_offset + i * PITCH.size),
+                    Pitch,
+                )
+                for i in range(first, first + count)
+            )
+
+            items.append(self.__intern((ticks, pitches), Event))
+
+        return items
+
+    def close(self):
+        """Close the mapped file once the score is no longer used. If snapshots of the
+        score are still being read (or its ticks are), the file is closed once they are
+        reclaimed instead."""
+        if len(self.snapshots) != 0:
+            return
+
+        try:
+            for ticks in (self.prefix, self.starts):
+                if isinstance(ticks, memoryview):
+                    ticks.release()
+
+            self.map.close()
+        except BufferError:
+            pass
+
+    def __intern(self, values: tuple, cls: type) -> Any:
+        """Return the (shared) object of the class created from the values."""
+        key = (cls, values)
+
+        if key not in self.interned:
+            self.interned[key] = cls(*values)
+
+        return self.interned[key]
+
+
+def read_vvd(
+    path: str,
+) -> Tuple[NativeScore, SignatureIndex, Sequence[int], Sequence[int]]:
+    """Open the file, returning the (lazily loaded) score, its signatures, and the
+    ticks at which its events and measures start (for seeding the measure index). The
+    ticks are read-only views of the mapped file (on little-endian machines), so nothing
+    is copied until the score is edited (see MeasureIndex)."""
+    score = NativeScore(path)
+
+    text = score.map[score.text_offset : score.text_offset + score.text_length]
+
+    return score, parse_signatures(text.decode()), score.prefix, score.starts
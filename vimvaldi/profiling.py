@@ -0,0 +1,170 @@
+"""A module for measuring how long the various parts of the app take."""
+
+import cProfile
+import pstats
+from collections import defaultdict
+from typing import *
+
+
+class Histogram:
+    """A latency histogram. The samples are rounded down to 5 significant bits (so the
+    error is at most ~3 %) and counted in buckets, which makes recording a sample O(1)
+    and keeps the memory constant, no matter how many samples there are."""
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = defaultdict(int)  # microseconds -> count
+
+        self.count = 0
+        self.total = 0.0  # in seconds
+        self.maximum = 0.0  # in seconds
+
+    def record(self, seconds: float):
+        """Record a single sample (in seconds)."""
+        microseconds = int(seconds * 1_000_000)
+        shift = max(0, microseconds.bit_length() - 5)
+
+        self.buckets[(microseconds >> shift) << shift] += 1
+
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def mean(self) -> float:
+        """Return the mean of the samples (in seconds)."""
+        return self.total / self.count if self.count != 0 else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Return the p-th percentile of the samples (in seconds)."""
+        if self.count == 0:
+            return 0.0
+
+        # the number of samples that have to be at or below the percentile
+        threshold = p / 100 * self.count
+
+        seen = 0
+        for microseconds in sorted(self.buckets):
+            seen += self.buckets[microseconds]
+
+            if seen >= threshold:
+                return microseconds / 1_000_000
+
+        return self.maximum
+
+
+class Profiler:
+    """A class for collecting timing statistics about the main loop (keypress handling,
+    command resolution, drawing and each of the dispatched command types), optionally
+    running a cProfile session alongside."""
+
+    def __init__(self):
+        self.enabled = False
+        self.histograms: Dict[str, Histogram] = defaultdict(Histogram)
+
+        # the functools.lru_cache-decorated functions (or other caches with the same
+        # cache_info) whose hits/misses are reported
+        self.caches: Dict[str, Any] = {}
+
+        self.profile: Optional[cProfile.Profile] = None
+
+    def start(self):
+        """Start a new profiling session (throwing away the previous one)."""
+        self.histograms.clear()
+
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+        self.enabled = True
+
+    def stop(self):
+        """Stop the current profiling session (the results can still be dumped)."""
+        if self.profile is not None:
+            self.profile.disable()
+
+        self.enabled = False
+
+    def record(self, name: str, seconds: float):
+        """Record a sample of the given name (if the profiler is running)."""
+        if self.enabled:
+            self.histograms[name].record(seconds)
+
+    def add_cache(self, name: str, cache: Any):
+        """Report the statistics of the cache (see format_caches)."""
+        self.caches[name] = cache
+
+    def dump(self, path: str):
+        """Write the collected statistics (and the cProfile output) to a file."""
+        with open(path, "w") as f:
+            f.write(self.format_histograms())
+
+            if len(self.caches) != 0:
+                f.write("\n" + self.format_caches())
+
+            if self.profile is not None:
+                f.write("\n")
+
+                # creating the stats disables the profile, so possibly turn it back on
+                stats = pstats.Stats(self.profile, stream=f)
+                if self.enabled:
+                    self.profile.enable()
+
+                stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats()
+
+    def format_histograms(self) -> str:
+        """Return the table of the collected histograms (times in milliseconds)."""
+        header = ("name", "count", "mean", "p50", "p95", "p99", "max")
+        rows = [header]
+
+        for name in sorted(self.histograms):
+            h = self.histograms[name]
+
+            rows.append(
+                (name, str(h.count))
+                + tuple(
+                    f"{seconds * 1000:.3f}"
+                    for seconds in (
+                        h.mean(),
+                        h.percentile(50),
+                        h.percentile(95),
+                        h.percentile(99),
+                        h.maximum,
+                    )
+                )
+            )
+
+        return self.__format_table(rows)
+
+    def format_caches(self) -> str:
+        """Return the table of the statistics of the caches (since the app started)."""
+        header = ("cache", "hits", "misses", "hit rate", "size", "max size")
+        rows = [header]
+
+        for name in sorted(self.caches):
+            info = self.caches[name].cache_info()
+            calls = info.hits + info.misses
+
+            rows.append(
+                (
+                    name,
+                    str(info.hits),
+                    str(info.misses),
+                    f"{info.hits / calls * 100 if calls != 0 else 0:.1f} %",
+                    str(info.currsize),
+                    str(info.maxsize),
+                )
+            )
+
+        return self.__format_table(rows)
+
+    @staticmethod
+    def __format_table(rows: List[Tuple[str, ...]]) -> str:
+        """Format the rows as a table (the first column left-aligned, the rest
+        right-aligned)."""
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+
+        return "".join(
+            row[0].ljust(widths[0])
+            + "".join(cell.rjust(width + 2) for cell, width in zip(row[1:], widths[1:]))
+            + "\n"
+            for row in rows
+        )
+
@@ -0,0 +1,153 @@
+"""A module for rendering the score to audio (requires NumPy, see the render extra)."""
+
+import wave
+from functools import lru_cache
+from typing import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from vimvaldi.music import *
+
+SAMPLE_RATE = 44100
+
+# the number of samples that are mixed before they are written to the file
+BLOCK_SIZE = SAMPLE_RATE
+
+# the default tempo (in quarter notes per minute)
+DEFAULT_TEMPO = 120
+
+# the relative amplitudes of the harmonics of the synthesized notes
+HARMONICS = (1.0, 0.5, 0.25, 0.125)
+
+# the envelope of the synthesized notes (in seconds, apart from the sustain level)
+ATTACK, DECAY, SUSTAIN, RELEASE = 0.01, 0.1, 0.6, 0.15
+
+# the amplitude of a single note (so a few simultaneous ones don't clip)
+VOLUME = 0.15
+
+# the notes that are held for at most this many samples are cached (the longer ones
+# are rarer and take up the most memory), as are at most this many of them
+CACHED_LENGTH = SAMPLE_RATE
+CACHE_SIZE = 64
+
+
+def is_available() -> bool:
+    """Return True if the audio can be rendered (NumPy is installed)."""
+    return np is not None
+
+
+def synthesize(numbers: Tuple[int, ...], length: int) -> "np.ndarray":
+    """Return the samples of the notes with the MIDI numbers that are held for the given
+    number of samples (followed by their release). Scores consist of the same few notes,
+    so the short ones are cached (see synthesize_short) and the samples mustn't be
+    modified."""
+    if length <= CACHED_LENGTH:
+        return synthesize_short(numbers, length)
+
+    return generate(numbers, length)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def synthesize_short(numbers: Tuple[int, ...], length: int) -> "np.ndarray":
+    """Return the (read-only) samples of the notes, cached. The cache is cleared after
+    each rendering, so the samples aren't kept around between them."""
+    samples = generate(numbers, length)
+    samples.flags.writeable = False
+
+    return samples
+
+
+def generate(numbers: Tuple[int, ...], length: int) -> "np.ndarray":
+    """Generate the samples of the notes (see synthesize)."""
+    time = np.arange(length + int(RELEASE * SAMPLE_RATE)) / SAMPLE_RATE
+
+    # the harmonics are summed one at a time, so only a few arrays of the length of the
+    # samples are allocated, regardless of the number of the notes
+    samples = np.zeros(len(time))
+    phases = np.empty(len(time))
+
+    for number in numbers:
+        frequency = 440 * 2 ** ((number - 69) / 12)
+
+        for harmonic, amplitude in enumerate(HARMONICS, 1):
+            np.multiply(time, 2 * np.pi * frequency * harmonic, out=phases)
+            np.sin(phases, out=phases)
+            phases *= amplitude / sum(HARMONICS)
+            samples += phases
+
+    # the attack-decay-sustain-release envelope (cut short for short notes)
+    held = length / SAMPLE_RATE
+    samples *= np.interp(
+        time,
+        [0, min(ATTACK, held), min(ATTACK + DECAY, held), held, held + RELEASE],
+        [0, 1, SUSTAIN, SUSTAIN, 0],
+    )
+    samples *= VOLUME
+
+    return samples
+
+
+def render_wav(path: str, score: Sequence[Event], tempo: float = DEFAULT_TEMPO):
+    """Render the score to a 16-bit mono WAV file. The notes are mixed into a buffer
+    that is written (and dropped) a block at a time, once no other note can sound in
+    it, so the memory doesn't depend on the length of the score."""
+    samples_per_tick = SAMPLE_RATE * 60 / (tempo * TICKS_PER_QUARTER)
+
+    try:
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+
+            def write(samples: "np.ndarray"):
+                """Write the samples to the file (clipping them)."""
+                f.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+
+            # the samples from the written ones onward (at least a block of them, so the
+            # rests after the mixed notes are written as silence)
+            buffer = np.zeros(BLOCK_SIZE)
+            written = 0  # the number of the written samples
+
+            tick = 0
+            for item in score:
+                start = round(tick * samples_per_tick)
+                tick += item.ticks
+                end = round(tick * samples_per_tick)
+
+                # the notes are in order, so the blocks before this one are done
+                while start - written >= BLOCK_SIZE:
+                    write(buffer[:BLOCK_SIZE])
+                    buffer = buffer[BLOCK_SIZE:]
+                    written += BLOCK_SIZE
+
+                    if len(buffer) < BLOCK_SIZE:
+                        padding = np.zeros(BLOCK_SIZE - len(buffer))
+                        buffer = np.concatenate((buffer, padding))
+
+                if item.is_rest():
+                    continue
+
+                samples = synthesize(tuple(p.number for p in item.pitches), end - start)
+                offset = start - written
+
+                if offset + len(samples) > len(buffer):
+                    missing = offset + len(samples) - len(buffer) + BLOCK_SIZE
+                    buffer = np.concatenate((buffer, np.zeros(missing)))
+
+                buffer[offset : offset + len(samples)] += samples
+
+            # the rest of the score (and the release of the last notes)
+            end = round(tick * samples_per_tick) - written
+            last = np.flatnonzero(buffer)
+            length = max(end, last[-1] + 1 if len(last) != 0 else 0)
+
+            if length > len(buffer):
+                buffer = np.concatenate((buffer, np.zeros(length - len(buffer))))
+
+            write(buffer[:length])
+    finally:
+        # the samples of the notes aren't kept after the rendering
+        synthesize_short.cache_clear()
@@ -0,0 +1,797 @@
+"""A module for the indexes that are kept alongside the score, so questions like "which
+time signature applies at this event" or "where does this measure start" don't require
+walking through the entire score."""
+
+import copy
+import weakref
+from abc import abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from collections.abc import MutableSequence
+from typing import *
+
+import abjad
+
+from vimvaldi.music import *
+
+# the kinds of signatures that can change in the middle of the score
+SIGNATURE_KINDS = ("time", "key", "clef")
+
+
+def parse_signature(kind: str, text: str) -> Any:
+    """Parse a signature of the given kind (like 'treble', '3/4' or 'ef minor')."""
+    if kind == "clef":
+        return abjad.Clef(text)
+
+    elif kind == "time":
+        pair = text.split("/" if "/" in text else " ")
+        return abjad.TimeSignature(tuple(map(int, pair)))
+
+    elif kind == "key":
+        return abjad.KeySignature(*text.split(" "))
+
+    raise ValueError(f"Invalid signature kind '{kind}'.")
+
+
+def format_signature(kind: str, signature: Any) -> str:
+    """Return the text of the signature (which parse_signature parses back)."""
+    if kind == "clef":
+        return signature.name
+
+    elif kind == "time":
+        return f"{signature.numerator}/{signature.denominator}"
+
+    elif kind == "key":
+        return f"{signature.tonic.name} {signature.mode.mode_name}"
+
+    raise ValueError(f"Invalid signature kind '{kind}'.")
+
+
+def format_signatures(signatures: "SignatureIndex") -> str:
+    """Return the text of the signature changes (lines of 'kind position signature'),
+    which parse_signatures parses back."""
+    return "".join(
+        f"{kind} {position} {format_signature(kind, signature)}\n"
+        for kind in SIGNATURE_KINDS
+        for position, signature in zip(
+            signatures.positions[kind], signatures.signatures[kind]
+        )
+    )
+
+
+def parse_signatures(text: str) -> "SignatureIndex":
+    """Parse the text of the signature changes (see format_signatures)."""
+    signatures = SignatureIndex()
+
+    for line in text.splitlines():
+        kind, position, signature = line.split(" ", 2)
+        signatures.set(kind, int(position), parse_signature(kind, signature))
+
+    return signatures
+
+
+def iter_ticks(score: Sequence[Event], start: int) -> Iterator[int]:
+    """Return the durations of the items of the score from the start on (a lazily
+    loaded score returns them without decoding its items)."""
+    if hasattr(score, "iter_ticks"):
+        return score.iter_ticks(start)
+
+    return (score[i].ticks for i in range(start, len(score)))
+
+
+class SignatureIndex:
+    """The time/key/clef signature changes of the score. For each kind, the changes are
+    stored as a sorted list of positions (a change at position p applies from the p-th
+    event onward) along with the signatures, so finding the signature that applies at
+    the given position is a binary search."""
+
+    def __init__(
+        self,
+        time: abjad.TimeSignature = None,
+        key: abjad.KeySignature = None,
+        clef: abjad.Clef = None,
+    ):
+        self.positions: Dict[str, List[int]] = {kind: [0] for kind in SIGNATURE_KINDS}
+        self.signatures: Dict[str, List[Any]] = {
+            "time": [time or abjad.TimeSignature((4, 4))],
+            "key": [key or abjad.KeySignature("c", "major")],
+            "clef": [clef or abjad.Clef("treble")],
+        }
+
+    def get(self, kind: str, position: int) -> Any:
+        """Return the signature of the given kind that applies at the given position."""
+        return self.signatures[kind][bisect_right(self.positions[kind], position) - 1]
+
+    def set(self, kind: str, position: int, signature: Any):
+        """Change the signature of the given kind from the given position onward."""
+        positions, signatures = self.positions[kind], self.signatures[kind]
+        i = bisect_left(positions, position)
+
+        if i < len(positions) and positions[i] == position:
+            signatures[i] = signature
+        else:
+            positions.insert(i, position)
+            signatures.insert(i, signature)
+
+        # the next change is redundant if it's to the same signature (checked first,
+        # since this one might be removed below)
+        if i + 1 < len(positions) and signatures[i + 1] == signatures[i]:
+            del positions[i + 1], signatures[i + 1]
+
+        # the change is redundant if the previous signature is the same
+        if i != 0 and signatures[i - 1] == signatures[i]:
+            del positions[i], signatures[i]
+
+    def changes(self, position: int) -> Dict[str, Any]:
+        """Return the signatures that change at the given position (kind -> signature)."""
+        changes = {}
+
+        for kind in SIGNATURE_KINDS:
+            i = bisect_left(self.positions[kind], position)
+
+            if i < len(self.positions[kind]) and self.positions[kind][i] == position:
+                changes[kind] = self.signatures[kind][i]
+
+        return changes
+
+    def next_change(self, kind: str, position: int) -> Optional[int]:
+        """Return the position of the first change of the given kind after the given
+        position (None if there isn't one)."""
+        i = bisect_right(self.positions[kind], position)
+        return self.positions[kind][i] if i < len(self.positions[kind]) else None
+
+    def shift(self, position: int, delta: int):
+        """Shift the changes after the given position by delta (when events are inserted
+        at or deleted from the position). Changes that would end up before the position
+        (because the events they were at got deleted) are merged into it."""
+        for kind in SIGNATURE_KINDS:
+            positions, signatures = self.positions[kind], self.signatures[kind]
+
+            for i in range(bisect_right(positions, position), len(positions)):
+                positions[i] = max(position, positions[i] + delta)
+
+            # if more changes ended up at the same position, the last one wins
+            i = len(positions) - 1
+            while i > 0:
+                if positions[i - 1] == positions[i]:
+                    del positions[i - 1], signatures[i - 1]
+                i -= 1
+
+
+class MeasureIndex:
+    """The prefix sums of the durations of the events (in ticks) and the ticks at which
+    the measures start. Both are recomputed lazily, only from the first position that
+    changed since the last query, so looking up the measure of an event or the start of
+    a measure is a binary search (or a list lookup). The given prefix sums and measure
+    starts can be read-only (like the memory-mapped ones of the native files); they are
+    only copied once they change."""
+
+    def __init__(
+        self,
+        score: Sequence[Event],
+        signatures: SignatureIndex,
+        prefix: Sequence[int] = None,
+        starts: Sequence[int] = None,
+    ):
+        self.score = score
+        self.signatures = signatures
+
+        # prefix[i] is the tick at which the i-th event starts (so it has len + 1 items)
+        self.prefix: Sequence[int] = prefix if prefix is not None else [0]
+
+        # the ticks at which the measures start
+        self.starts: Sequence[int] = starts if starts is not None else []
+
+        # the first position whose prefix sum is not up to date (if the prefix sums and
+        # the measures are given, they are up to date)
+        self.dirty: Optional[int] = 0 if prefix is None else None
+
+    def invalidate(self, position: int):
+        """Mark everything from the given position onward as changed."""
+        self.dirty = position if self.dirty is None else min(self.dirty, position)
+
+    def __update(self):
+        """Recompute the prefix sums and the measure starts from the dirty position."""
+        if self.dirty is None:
+            return
+
+        position = min(self.dirty, len(self.prefix) - 1)
+        self.dirty = None
+
+        # the read-only prefix sums and measure starts are copied on the first change
+        if not isinstance(self.prefix, MutableSequence):
+            self.prefix, self.starts = array("q", self.prefix), array("q", self.starts)
+
+        # the prefix sums
+        del self.prefix[position + 1 :]
+        tick = self.prefix[-1]
+        for ticks in iter_ticks(self.score, position):
+            tick += ticks
+            self.prefix.append(tick)
+
+        # the measures that start before the position (except the last one, since it
+        # might have been changed) are unaffected by the change
+        i = max(0, bisect_left(self.starts, self.prefix[position]) - 1)
+        tick = self.starts[i] if i < len(self.starts) else 0
+        del self.starts[i:]
+
+        while True:
+            self.starts.append(tick)
+
+            # the event that the measure starts in
+            position = self.position_of_tick(tick)
+
+            tick += duration_to_ticks(self.signatures.get("time", position).duration)
+
+            # a time signature change always starts a new measure
+            change = self.signatures.next_change("time", position)
+            if change is not None and change < len(self.score):
+                tick = min(tick, self.prefix[change])
+
+            # the score always ends with an unfinished (possibly empty) measure
+            if tick > self.prefix[-1]:
+                break
+
+    def position_of_tick(self, tick: int) -> int:
+        """Return the position of the event playing at the given tick (the number of the
+        events if the tick is past the end of the score)."""
+        return min(bisect_right(self.prefix, tick), len(self.prefix)) - 1
+
+    def tick_of(self, position: int) -> int:
+        """Return the tick at which the event at the given position starts."""
+        self.__update()
+        return self.prefix[min(position, len(self.prefix) - 1)]
+
+    def total_ticks(self) -> int:
+        """Return the total duration of the score (in ticks)."""
+        self.__update()
+        return self.prefix[-1]
+
+    def measure_count(self) -> int:
+        """Return the number of measures of the score (including the unfinished one at
+        the end of the score)."""
+        self.__update()
+        return len(self.starts)
+
+    def measure_of(self, position: int) -> int:
+        """Return the measure that the event at the given position starts in."""
+        self.__update()
+        return bisect_right(self.starts, self.tick_of(position)) - 1
+
+    def measure_start(self, measure: int) -> int:
+        """Return the tick at which the given measure starts. The measures after the end
+        of the score continue in the last time signature."""
+        self.__update()
+
+        if measure < len(self.starts):
+            return self.starts[measure]
+
+        # the length of the measures after the end of the score
+        time = self.signatures.get("time", len(self.score))
+        length = duration_to_ticks(time.duration)
+
+        return self.starts[-1] + (measure - len(self.starts) + 1) * length
+
+    def measure_end(self, measure: int) -> int:
+        """Return the tick at which the given measure ends."""
+        return self.measure_start(measure + 1)
+
+    def measure_position(self, measure: int) -> int:
+        """Return the position of the first event that starts in the given measure (the
+        number of the events if there is no such event)."""
+        tick = self.measure_start(measure)
+        return min(bisect_left(self.prefix, tick), len(self.prefix) - 1)
+
+
+class PatternIndex:
+    """An n-gram index over the pitches of the score (and over the intervals between
+    them, for transposition-invariant searching). The events are given increasing
+    labels with gaps between them, so the index can refer to them by labels that don't
+    change when something is inserted before them and the index can be updated only
+    around the edited positions. A label is converted back to a position by a binary
+    search over the labels."""
+
+    # the length of the indexed n-grams (shorter patterns are searched linearly)
+    N = 3
+
+    # the initial gap between two labels
+    GAP = 1 << 32
+
+    def __init__(self, score: Sequence[Event]):
+        self.score = score
+
+        # the index is only built when it is first used
+        self.built = False
+
+    def __build(self):
+        """(Re)build the index from scratch."""
+        self.labels: List[int] = [i * self.GAP for i in range(len(self.score))]
+
+        # n-gram -> the labels of the events where it starts (for both kinds of n-grams)
+        self.pitch_grams: Dict[tuple, Set[int]] = defaultdict(set)
+        self.interval_grams: Dict[tuple, Set[int]] = defaultdict(set)
+
+        # label -> the n-grams that start at it (so they can be removed)
+        self.grams_of: Dict[int, Tuple[tuple, Optional[tuple]]] = {}
+
+        self.built = True
+
+        self.__add_grams(0, len(self.score))
+
+    @staticmethod
+    def pitches_of(items: Sequence[Event]) -> tuple:
+        """Return the pitches of the items (the MIDI numbers of their pitches)."""
+        return tuple(tuple(p.number for p in item.pitches) for item in items)
+
+    @staticmethod
+    def intervals_of(items: Sequence[Event]) -> Optional[tuple]:
+        """Return the intervals between the items (None if they aren't all notes)."""
+        if any(len(item.pitches) != 1 for item in items):
+            return None
+
+        numbers = [item.pitches[0].number for item in items]
+        return tuple(b - a for a, b in zip(numbers, numbers[1:]))
+
+    def __add_grams(self, start: int, end: int):
+        """Add the n-grams that start at the positions from start to end."""
+        for position in range(max(0, start), min(end, len(self.score) - self.N + 1)):
+            items = self.score[position : position + self.N]
+            grams = (self.pitches_of(items), self.intervals_of(items))
+
+            label = self.labels[position]
+            self.grams_of[label] = grams
+
+            self.pitch_grams[grams[0]].add(label)
+            if grams[1] is not None:
+                self.interval_grams[grams[1]].add(label)
+
+    def __remove_grams(self, start: int, end: int):
+        """Remove the n-grams that start at the positions from start to end."""
+        for position in range(max(0, start), min(end, len(self.labels))):
+            label = self.labels[position]
+
+            if label not in self.grams_of:
+                continue
+
+            pitches, intervals = self.grams_of.pop(label)
+
+            self.pitch_grams[pitches].discard(label)
+            if intervals is not None:
+                self.interval_grams[intervals].discard(label)
+
+    def insert(self, position: int, count: int):
+        """Update the index after count items were inserted at the position."""
+        if not self.built:
+            return
+
+        # the n-grams crossing the position are no longer valid
+        self.__remove_grams(position - self.N + 1, position)
+
+        # label the new items evenly between their neighbours
+        low = self.labels[position - 1] if position != 0 else -self.GAP
+        high = (
+            self.labels[position]
+            if position < len(self.labels)
+            else low + (count + 1) * self.GAP
+        )
+        step = (high - low) // (count + 1)
+
+        # no space between the labels, so relabel everything
+        if step == 0:
+            self.__build()
+            return
+
+        self.labels[position:position] = [low + step * (i + 1) for i in range(count)]
+
+        self.__add_grams(position - self.N + 1, position + count)
+
+    def delete(self, position: int, count: int):
+        """Update the index after count items were deleted from the position."""
+        if not self.built:
+            return
+
+        self.__remove_grams(position - self.N + 1, position + count)
+        del self.labels[position : position + count]
+
+        # the n-grams that now cross the position
+        self.__add_grams(position - self.N + 1, position)
+
+    def find(
+        self, pattern: Sequence[Event], start: int, backward=False, transposed=False
+    ) -> Optional[int]:
+        """Return the position of the first occurrence of the pattern after the start
+        (or before it, if searching backward), wrapping around the score. If transposed
+        is True, the intervals between the notes are compared instead of the pitches."""
+        if not self.built:
+            self.__build()
+
+        matches = self.__matches(pattern, transposed)
+
+        after = [p for p in matches if (p < start if backward else p > start)]
+        if len(after) == 0:
+            after = matches
+
+        if len(after) == 0:
+            return None
+
+        return max(after) if backward else min(after)
+
+    def __matches(self, pattern: Sequence[Event], transposed: bool) -> List[int]:
+        """Return the positions of all of the occurrences of the pattern."""
+        key = self.intervals_of if transposed else self.pitches_of
+        pattern_key = key(pattern)
+
+        if pattern_key is None or len(pattern) == 0:
+            return []
+
+        # the pattern is too short for the index, so look through the entire score
+        if len(pattern) < self.N:
+            candidates = range(len(self.score) - len(pattern) + 1)
+
+        else:
+            grams = self.interval_grams if transposed else self.pitch_grams
+
+            # use the rarest of the pattern's n-grams
+            offset = min(
+                range(len(pattern) - self.N + 1),
+                key=lambda i: len(grams.get(key(pattern[i : i + self.N]), ())),
+            )
+            labels = grams.get(key(pattern[offset : offset + self.N]), ())
+
+            candidates = sorted(bisect_left(self.labels, l) - offset for l in labels)
+
+        return [
+            position
+            for position in candidates
+            if 0 <= position
+            and key(self.score[position : position + len(pattern)]) == pattern_key
+        ]
+
+
+class FormatCache:
+    """The LilyPond text of the items of the score, so saving only formats the items
+    that weren't there during the previous save (formatting through abjad is slow) and
+    copies the text of the rest. The texts are keyed by the items themselves (along
+    with the signature changes at them) rather than by their positions or measures,
+    since inserting an item shifts all of the positions and barlines after it, but the
+    text of the items stays the same."""
+
+    HEADER = "\\new Score\n<<\n    \\new Staff\n    {\n"
+    FOOTER = "    }\n>>\n"
+
+    # the indentation of the items
+    INDENT = " " * 8
+
+    def __init__(self, score: Sequence[Event], signatures: SignatureIndex):
+        self.score = score
+        self.signatures = signatures
+
+        self.texts: Dict[tuple, str] = {}
+
+    def __keys(self) -> List[tuple]:
+        """Return the keys of the items of the score -- the item and the signatures
+        that change at it."""
+        changes = defaultdict(list)
+        for kind in SIGNATURE_KINDS:
+            positions = self.signatures.positions[kind]
+            signatures = self.signatures.signatures[kind]
+
+            for position, signature in zip(positions, signatures):
+                changes[position].append(signature)
+
+        return [
+            (item, tuple(changes[position])) if position in changes else (item, ())
+            for position, item in enumerate(self.score)
+        ]
+
+    def __format(self, keys: List[tuple]) -> List[str]:
+        """Format the items (along with their signature changes)."""
+        leaves = [item.to_leaf() for item, _ in keys]
+
+        for leaf, (_, signatures) in zip(leaves, keys):
+            for signature in signatures:
+                abjad.attach(signature, leaf)
+
+        # time signatures are only formatted in the context of a staff
+        abjad.Staff(leaves)
+
+        return [
+            self.INDENT
+            + format(leaf, "lilypond").replace("\n", "\n" + self.INDENT)
+            + "\n"
+            for leaf in leaves
+        ]
+
+    def write(self, f: TextIO):
+        """Write the score to the file, formatting only the items whose texts aren't
+        cached. Only the texts of the current items are kept afterwards."""
+        keys = self.__keys()
+
+        texts = {key: self.texts[key] for key in keys if key in self.texts}
+
+        missing = list(dict.fromkeys(key for key in keys if key not in texts))
+        texts.update(zip(missing, self.__format(missing)))
+
+        self.texts = texts
+
+        f.write(self.HEADER)
+        f.writelines(texts[key] for key in keys)
+        f.writelines(self.__format_trailing_changes())
+        f.write(self.FOOTER)
+
+    def __format_trailing_changes(self) -> List[str]:
+        """Format the signature changes after the last item (like the ones set at the
+        end of the score), which there is no item to attach to."""
+        lines = []
+        for kind, signature in self.signatures.changes(len(self.score)).items():
+            text = format_signature(kind, signature)
+
+            if kind == "key":
+                tonic, mode = text.split(" ")
+                text = f"{tonic} \\{mode}"
+
+            elif kind == "clef":
+                text = f'"{text}"'
+
+            lines.append(f"{self.INDENT}\\{kind} {text}\n")
+
+        return lines
+
+
+class ChunkedScore(MutableSequence):
+    """A score kept as chunks of events, so editing it only touches the chunk that is
+    edited. Its versions can be snapshotted cheaply (see snapshot) -- the chunks are
+    shared with the snapshots and only copied once they're edited (copy-on-write), so
+    background jobs can read a consistent version of the score while it's edited."""
+
+    # the number of the events in a chunk (the edited chunks are split when they grow
+    # to twice as much, so copying them stays cheap)
+    CHUNK_SIZE = 256
+
+    def __init__(self, events: Iterable[Event] = ()):
+        events = list(events)
+
+        # the chunks -- lists of the events (or ranges of the events in a file, if they
+        # aren't decoded yet, see LazyScore)
+        self.chunks: List[Union[range, List[Event]]] = [
+            events[i : i + self.CHUNK_SIZE]
+            for i in range(0, len(events), self.CHUNK_SIZE)
+        ]
+
+        # the positions at which the chunks start (and the number of the events)
+        self.offsets = [i * self.CHUNK_SIZE for i in range(len(self.chunks))]
+        self.offsets.append(len(events))
+
+        # the version of the score (each snapshot starts a new one) and the versions
+        # in which the chunks were created (a chunk is shared with the snapshots of
+        # its version and the later ones)
+        self.version = 0
+        self.versions = [0] * len(self.chunks)
+
+        # the snapshots that are still being read (once no reader holds a snapshot, it
+        # is reclaimed and its chunks are no longer copied before they're edited)
+        self.snapshots: MutableSet["ChunkedScore"] = weakref.WeakSet()
+        self.frozen = False
+
+    def snapshot(self) -> "ChunkedScore":
+        """Return an immutable snapshot of the current version of the score, which can
+        be read from other threads while the score is edited. Taking it only copies the
+        list of the chunks."""
+        if self.frozen:
+            return self
+
+        snapshot = copy.copy(self)
+        snapshot.chunks, snapshot.offsets = list(self.chunks), list(self.offsets)
+        snapshot.versions = []
+        snapshot.snapshots = weakref.WeakSet()
+        snapshot.frozen = True
+
+        self.snapshots.add(snapshot)
+        self.version += 1
+
+        return snapshot
+
+    def _set_chunk(self, k: int, chunk: List[Event]):
+        """Replace the k-th chunk by a new one (created in the current version)."""
+        self.chunks[k] = chunk
+        self.versions[k] = self.version
+
+    def _chunk(self, k: int) -> List[Event]:
+        """Return the events of the k-th chunk, decoding it if it isn't yet."""
+        if isinstance(self.chunks[k], range):
+            chunk = self.decode(self.chunks[k])
+
+            # the decoded chunks of the snapshots are only kept by them
+            if self.frozen:
+                self.chunks[k] = chunk
+            else:
+                self._set_chunk(k, chunk)
+
+        return self.chunks[k]
+
+    def _locate(self, position: int) -> int:
+        """Return the chunk that the position is in (the last one for the end)."""
+        return max(0, min(bisect_right(self.offsets, position), len(self.chunks)) - 1)
+
+    def __writable_chunk(self, k: int) -> List[Event]:
+        """Return the events of the k-th chunk, copying them first if the chunk is
+        shared with a snapshot that is still being read."""
+        chunk = self._chunk(k)
+
+        if self.versions[k] <= max((s.version for s in self.snapshots), default=-1):
+            chunk = list(chunk)
+            self._set_chunk(k, chunk)
+
+        return chunk
+
+    def __merge(self, start: int, stop: int) -> int:
+        """Merge the (decoded) chunks that contain the positions from start to stop into
+        a single one, returning it."""
+        if len(self.chunks) == 0:
+            self.chunks.append([])
+            self.versions.append(self.version)
+            self.offsets.append(0)
+
+        first, last = self._locate(start), self._locate(max(start, stop - 1))
+
+        if first != last:
+            items = [item for k in range(first, last + 1) for item in self._chunk(k)]
+
+            self.chunks[first : last + 1] = [items]
+            self.versions[first : last + 1] = [self.version]
+            del self.offsets[first + 1 : last + 1]
+
+        self.__writable_chunk(first)
+        return first
+
+    def __split(self, k: int):
+        """Split the k-th chunk if it grew too large."""
+        chunk = self.chunks[k]
+
+        if len(chunk) < 2 * self.CHUNK_SIZE:
+            return
+
+        chunks = [
+            chunk[i : i + self.CHUNK_SIZE]
+            for i in range(0, len(chunk), self.CHUNK_SIZE)
+        ]
+
+        self.chunks[k : k + 1] = chunks
+        self.versions[k : k + 1] = [self.version] * len(chunks)
+        self.offsets[k + 1 : k + 1] = [
+            self.offsets[k] + i * self.CHUNK_SIZE for i in range(1, len(chunks))
+        ]
+
+    def __shift(self, k: int, delta: int):
+        """Shift the offsets of the chunks after the k-th one by delta."""
+        for i in range(k + 1, len(self.offsets)):
+            self.offsets[i] += delta
+
+    def __len__(self) -> int:
+        return self.offsets[-1]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+
+            items = []
+            k = self._locate(start)
+
+            while start < stop:
+                chunk = self._chunk(k)
+                offset = start - self.offsets[k]
+
+                items += chunk[offset : offset + stop - start]
+                start = self.offsets[k + 1]
+                k += 1
+
+            return items
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("score index out of range")
+
+        k = self._locate(index)
+        return self._chunk(k)[index - self.offsets[k]]
+
+    def __setitem__(self, index, value):
+        if self.frozen:
+            raise TypeError("A snapshot of the score can't be changed.")
+
+        if not isinstance(index, slice):
+            index, value = self.__as_slice(index), [value]
+
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            raise ValueError("Only contiguous slices can be assigned.")
+
+        stop = max(start, stop)
+        value = list(value)
+
+        k = self.__merge(start, stop)
+        offset = self.offsets[k]
+
+        self.chunks[k][start - offset : stop - offset] = value
+        self.__shift(k, len(value) - (stop - start))
+        self.__split(k)
+
+    def __delitem__(self, index):
+        self[index if isinstance(index, slice) else self.__as_slice(index)] = []
+
+    def __as_slice(self, index: int) -> slice:
+        """Return the slice of the single (possibly negative) index."""
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("score index out of range")
+
+        return slice(index, index + 1)
+
+    def insert(self, index: int, value: Event):
+        self[index:index] = [value]
+
+    def __iter__(self) -> Iterator[Event]:
+        # the chunks that weren't decoded yet are decoded without being kept
+        for chunk in list(self.chunks):
+            yield from self.decode(chunk) if isinstance(chunk, range) else chunk
+
+    def iter_ticks(self, start: int) -> Iterator[int]:
+        """Return the durations of the events from the start on, without decoding the
+        chunks that weren't decoded yet."""
+        for k in range(self._locate(start), len(self.chunks)):
+            chunk = self.chunks[k]
+            first = max(0, start - self.offsets[k])
+
+            if isinstance(chunk, range):
+                for i in chunk[first:]:
+                    yield self.prefix[i + 1] - self.prefix[i]
+            else:
+                for item in chunk[first:]:
+                    yield item.ticks
+
+
+class LazyScore(ChunkedScore):
+    """A score whose events are decoded from a file a chunk at a time, only when they
+    are first accessed (usually because they are in the viewport), so opening a file
+    doesn't depend on its length. Editing a chunk decodes it, so the file itself is
+    never changed. Subclasses decode the events from their files and provide the ticks
+    at which the events start, so the durations are known without decoding them."""
+
+    def __init__(self, prefix: Sequence[int]):
+        super().__init__()
+
+        events = len(prefix) - 1
+
+        # the ticks at which the events in the file start (and their total duration)
+        self.prefix = prefix
+
+        self.chunks = [
+            range(i, min(i + self.CHUNK_SIZE, events))
+            for i in range(0, events, self.CHUNK_SIZE)
+        ]
+
+        self.offsets = [i * self.CHUNK_SIZE for i in range(len(self.chunks))] + [events]
+        self.versions = [0] * len(self.chunks)
+
+    @abstractmethod
+    def decode(self, events: range) -> List[Event]:
+        """Decode the range of the events from the file."""
+
+    def undecoded(self) -> List[range]:
+        """Return the chunks that weren't decoded yet."""
+        return [chunk for chunk in self.chunks if isinstance(chunk, range)]
+
+    def fill(self, decoded: Dict[range, List[Event]]):
+        """Replace the chunks that weren't decoded yet by their events, decoded
+        elsewhere (like on a background thread). The chunks that were decoded or edited
+        in the meantime are kept as they are."""
+        for k, chunk in enumerate(self.chunks):
+            if isinstance(chunk, range) and chunk in decoded:
+                self._set_chunk(k, decoded[chunk])
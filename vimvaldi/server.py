@@ -0,0 +1,312 @@
+"""A module for the editor server -- a daemon that keeps the editing sessions (along
+with the scores opened in them and their indexes and caches) in memory. Thin clients
+(see client.py) attach to the sessions over a Unix socket, sending the keys and
+receiving the changes of the session's virtual screen as frame diffs.
+
+The messages are lines of JSON. The clients send {"attach": session, "size": [height,
+width]} first and then {"keys": [...]} and {"size": [height, width]}. The server sends
+{"clear": bool, "rows": [[y, [[x, text, attribute], ...]], ...], "cursor": [y, x] or
+null, "pairs": [[pair, foreground, background], ...]} for each frame and {"quit": true}
+once the session is closed."""
+
+import asyncio
+import json
+import logging
+from signal import SIGINT, SIGTERM
+
+from vimvaldi.interface import *
+
+logger = logging.getLogger(__name__)
+
+# the cell of an empty screen (the character and the curses attribute)
+BLANK = (" ", 0)
+
+
+class Screen:
+    """A virtual curses window (the part of its interface that the drawables and the
+    interface use), whose cells are sent to the clients instead of to a terminal."""
+
+    def __init__(self, height: int, width: int):
+        self.resize(height, width)
+
+        self.cursor = (0, 0)
+        self.cursor_visible = False
+
+        # called when the drawing is finished (see Interface.__draw)
+        self.on_refresh: Callable[[], None] = lambda: None
+
+    def resize(self, height: int, width: int):
+        """Resize the screen, clearing it."""
+        self.height, self.width = height, width
+        self.cells = [[BLANK] * width for _ in range(height)]
+
+    def getmaxyx(self) -> Tuple[int, int]:
+        """Overridden window.getmaxyx()."""
+        return self.height, self.width
+
+    def move(self, y: int, x: int):
+        """Overridden window.move()."""
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("move() returned ERR")
+
+        self.cursor = (y, x)
+
+    def addstr(self, y: int, x: int, string: str, attribute: int = 0):
+        """Overridden window.addstr() (raising an error if the string doesn't fit)."""
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise curses.error("addstr() returned ERR")
+
+        row = self.cells[y]
+        for i, char in enumerate(string[: self.width - x]):
+            row[x + i] = (char, attribute)
+
+        self.cursor = (y, min(x + len(string), self.width - 1))
+
+        if x + len(string) > self.width:
+            raise curses.error("addstr() returned ERR")
+
+    def clrtoeol(self):
+        """Overridden window.clrtoeol()."""
+        y, x = self.cursor
+        self.cells[y][x:] = [BLANK] * (self.width - x)
+
+    def clear(self):
+        """Overridden window.clear()."""
+        self.cells = [[BLANK] * self.width for _ in range(self.height)]
+
+    def refresh(self):
+        """Overridden window.refresh() -- the frame is finished."""
+        self.on_refresh()
+
+    def snapshot(self) -> List[List[tuple]]:
+        """Return a copy of the cells of the screen (to diff the next frame with)."""
+        return [list(row) for row in self.cells]
+
+    def diff(self, frame: Optional[List[List[tuple]]]) -> List[list]:
+        """Return the rows of the screen that differ from the frame (all of them if
+        there is no frame), each as its y coordinate and the runs of the cells of the
+        same attribute ([x, text, attribute]) from its first change to its last one."""
+        rows = []
+
+        for y, row in enumerate(self.cells):
+            previous = frame[y] if frame is not None else None
+
+            if row == previous:
+                continue
+
+            first, last = 0, len(row)
+            if previous is not None:
+                while row[first] == previous[first]:
+                    first += 1
+
+                while row[last - 1] == previous[last - 1]:
+                    last -= 1
+
+            runs = []
+            for x in range(first, last):
+                char, attribute = row[x]
+
+                if len(runs) != 0 and runs[-1][2] == attribute:
+                    runs[-1][1] += char
+                else:
+                    runs.append([x, char, attribute])
+
+            rows.append([y, runs])
+
+        return rows
+
+
+class Connection:
+    """A client attached to a session. The frame that it was last sent and the number
+    of the color pairs that it knows are kept, so only the changes are sent to it."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+        self.frame: Optional[List[List[tuple]]] = None
+        self.pairs = 0
+
+    def send(self, message: dict):
+        """Send the message to the client (without waiting for it to be written)."""
+        self.writer.write((json.dumps(message) + "\n").encode())
+
+
+class SessionInterface(Interface):
+    """The interface of a session -- it draws to the session's screen and quitting it
+    closes the session (rather than terminating the server)."""
+
+    def __init__(self, session: "Session", arguments):
+        self.session = session
+
+        super().__init__(session.screen, arguments, asyncio.get_running_loop())
+
+    def show_cursor(self, visible: bool):
+        """The cursor is shown by the clients."""
+        self.window.cursor_visible = visible
+
+    def quit(self):
+        """Close the session."""
+        self.session.close()
+
+
+class Session:
+    """A named editing session, whose screen is shared by all of the clients that are
+    attached to it. The screen has the size of the client that attached (or resized its
+    terminal) last."""
+
+    def __init__(self, server: "Server", name: str):
+        self.server = server
+        self.name = name
+
+        self.screen = Screen(24, 80)
+        self.screen.on_refresh = self.broadcast
+
+        self.connections: List[Connection] = []
+
+        self.interface = SessionInterface(self, server.arguments)
+
+    def attach(self, connection: Connection, height: int, width: int):
+        """Attach the client, resizing the screen to its terminal."""
+        self.connections.append(connection)
+        self.resize(height, width)
+
+    def detach(self, connection: Connection):
+        """Detach the client (the session stays, so it can be attached to again)."""
+        if connection in self.connections:
+            self.connections.remove(connection)
+
+    def resize(self, height: int, width: int):
+        """Resize the screen and redraw it (entirely) for all of the clients."""
+        self.screen.resize(height, width)
+
+        for connection in self.connections:
+            connection.frame = None
+
+        self.interface.resize_windows()
+        self.interface.schedule_draw()
+
+    def broadcast(self):
+        """Send the changes of the screen since the last frame to each client."""
+        pairs = list(Colors.pairs.items())
+        cursor = list(self.screen.cursor) if self.screen.cursor_visible else None
+
+        for connection in self.connections:
+            connection.send(
+                {
+                    "clear": connection.frame is None,
+                    "rows": self.screen.diff(connection.frame),
+                    "cursor": cursor,
+                    "pairs": [
+                        [pair, *colors] for colors, pair in pairs[connection.pairs :]
+                    ],
+                }
+            )
+
+            connection.frame = self.screen.snapshot()
+            connection.pairs = len(pairs)
+
+    def close(self):
+        """Close the session, detaching all of the clients."""
+        for connection in self.connections:
+            connection.send({"quit": True})
+            connection.writer.close()
+
+        self.connections.clear()
+        self.server.sessions.pop(self.name, None)
+
+
+class Server:
+    """The daemon that keeps the sessions and serves their clients."""
+
+    def __init__(self, path: str, arguments):
+        self.path = path
+        self.arguments = arguments
+
+        self.sessions: Dict[str, Session] = {}
+
+    async def serve(self):
+        """Serve the clients until the server is interrupted/terminated."""
+        Colors.initialize(virtual=True)
+
+        check_socket(self.path, create_directory=True)
+
+        if os.path.exists(self.path):
+            # a socket that no server listens on is a leftover of a crashed one
+            try:
+                _, writer = await asyncio.open_unix_connection(self.path)
+                writer.close()
+            except ConnectionError:
+                os.unlink(self.path)
+            else:
+                raise RuntimeError(f"A server is already listening on {self.path}.")
+
+        # the socket is only accessible by the user from the moment it's created (it
+        # can't be changed afterwards without others being able to connect in between)
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(
+                self.__handle_connection, self.path
+            )
+        finally:
+            os.umask(umask)
+
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+
+        for signal_number in (SIGINT, SIGTERM):
+            loop.add_signal_handler(
+                signal_number, lambda: stopped.done() or stopped.set_result(None)
+            )
+
+        try:
+            async with server:
+                await stopped
+        finally:
+            os.unlink(self.path)
+
+    async def __handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """Handle the messages of a client until it disconnects."""
+        connection = Connection(writer)
+        session = None
+
+        try:
+            async for line in reader:
+                message = json.loads(line)
+
+                if "attach" in message:
+                    name = message["attach"]
+
+                    if name not in self.sessions:
+                        self.sessions[name] = Session(self, name)
+
+                    session = self.sessions[name]
+                    session.attach(connection, *message["size"])
+
+                elif session is None:
+                    break
+
+                # a bug in a session shouldn't take the whole server down
+                elif "keys" in message:
+                    try:
+                        session.interface.handle_keys(message["keys"])
+                    except Exception as e:
+                        logger.exception("Error handling the keys of %r.", session.name)
+
+                elif "size" in message:
+                    session.resize(*message["size"])
+
+        except (ConnectionError, ValueError) as e:
+            logger.debug("Client disconnected.", exc_info=True)
+
+        finally:
+            if session is not None:
+                session.detach(connection)
+
+            writer.close()
+
+
+def serve(path: str, arguments):
+    """Run the server on the socket with the given path."""
+    asyncio.run(Server(path, arguments).serve())
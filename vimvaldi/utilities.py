@@ -1,9 +1,30 @@
 """A set of utility functions used throughout the project."""
 
 import curses
+import logging
+import os
+import queue
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
 from typing import *
 from enum import Enum, auto
 
+# where the caches (of the pre-scans of the LilyPond files, of the compiled keymaps...)
+# are kept
+CACHE_DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser(os.path.join("~", ".cache"))),
+    "vimvaldi",
+)
+
+# the directory of the socket of the editor server (see check_socket)
+SOCKET_DIRECTORY = os.path.join(
+    os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(),
+    f"vimvaldi-{os.getuid()}",
+)
+
 
 def center_coordinate(a: int, b: int) -> int:
     """Return the starting coordinate of an object of size b centered in an object of
@@ -29,6 +50,161 @@ def pop_char(string: str) -> Tuple[str, str]:
         return string[0], string[1:]
 
 
+def start_logging(path: Optional[str], level: str) -> Optional[QueueListener]:
+    """Set up logging of the app. The records are only put into a queue, from which a
+    background thread writes them to the file, so no logging I/O happens on the
+    input/render thread. Returns the listener (to be stopped when exiting) or None, if
+    there is no file to log to."""
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level.upper()))
+
+    # don't log anything (importantly, not even to stderr, since it would garble curses)
+    if path is None:
+        root.addHandler(logging.NullHandler())
+        return None
+
+    handler = logging.FileHandler(path)
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+
+    records = queue.SimpleQueue()
+    root.addHandler(QueueHandler(records))
+
+    listener = QueueListener(records, handler)
+    listener.start()
+
+    return listener
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w") -> Iterator[IO]:
+    """Open a temporary file next to the path for writing and move it over the path
+    once it's written, so the file is never read half-written (and a score that is
+    lazily loaded from it keeps reading the old one, which it has open). If the writing
+    fails, the temporary file is removed and the path is left as it was."""
+    temporary = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+    try:
+        with open(temporary, mode.replace("w", "x")) as f:
+            yield f
+
+        os.replace(temporary, path)
+
+    except BaseException:
+        try:
+            os.unlink(temporary)
+        except FileNotFoundError:
+            pass
+
+        raise
+
+
+def default_socket_path() -> str:
+    """Return the path of the socket of the editor server (in the user's own directory
+    in their runtime directory, if there is one, else in the temporary directory)."""
+    return os.path.join(SOCKET_DIRECTORY, "server.sock")
+
+
+def check_socket(path: str, create_directory: bool = False):
+    """Raise a PermissionError if the socket (or the directory of the default socket)
+    might be someone else's. The default socket's directory must be the user's and
+    only accessible by them (like tmux's /tmp/tmux-UID), so nobody else can connect
+    to the server or create a socket in it; it is created if create_directory is True
+    and it doesn't exist."""
+    directory = os.path.dirname(os.path.abspath(path))
+
+    if directory == os.path.abspath(SOCKET_DIRECTORY):
+        if create_directory:
+            try:
+                os.mkdir(directory, 0o700)
+            except FileExistsError:
+                pass
+
+        try:
+            status = os.lstat(directory)
+        except FileNotFoundError:
+            return
+
+        if (
+            not stat.S_ISDIR(status.st_mode)
+            or status.st_uid != os.getuid()
+            or status.st_mode & 0o077 != 0
+        ):
+            raise PermissionError(f"{directory} isn't a private directory of the user.")
+
+    try:
+        status = os.lstat(path)
+    except FileNotFoundError:
+        return
+
+    if status.st_uid != os.getuid():
+        raise PermissionError(f"{path} isn't the user's.")
+
+
+class Colors:
+    """Curses color pairs, allocated on their first use (so the startup doesn't depend
+    on the number of colors the terminal supports)."""
+
+    # (foreground, background) -> the number of the allocated pair
+    pairs: Dict[Tuple[int, int], int] = {}
+
+    # whether the pairs are only numbered, not initialized (when drawing to a virtual
+    # screen, whose clients initialize them in their terminals, see server.py)
+    virtual = False
+
+    # the number of pairs and colors of a virtual screen (pairs are stored in 8 bits)
+    VIRTUAL_PAIRS = VIRTUAL_COLORS = 256
+
+    @classmethod
+    def initialize(cls, virtual: bool = False):
+        """Initialize the colors (must be called after curses is initialized, unless
+        the colors are virtual)."""
+        if not virtual:
+            curses.start_color()
+            curses.use_default_colors()
+
+        cls.virtual = virtual
+        cls.pairs.clear()
+
+    @classmethod
+    def color_pair(cls, pair: int) -> int:
+        """Return the attribute of the pair with the given number (the same one that
+        curses would return, even for the virtual pairs)."""
+        return pair << 8 if cls.virtual else curses.color_pair(pair)
+
+    @staticmethod
+    def pair_number(attribute: int) -> int:
+        """Return the number of the pair of the attribute (see color_pair)."""
+        return (attribute & curses.A_COLOR) >> 8
+
+    @classmethod
+    def get(cls, foreground: int, background: int = -1) -> int:
+        """Return the attribute of the given color pair (-1 being the default color of
+        the terminal). Returns the default pair, if the terminal doesn't support the
+        colors or if it ran out of pairs."""
+        pair = cls.pairs.get((foreground, background))
+
+        if pair is None:
+            pair = len(cls.pairs) + 1
+
+            pairs, colors = (
+                (cls.VIRTUAL_PAIRS, cls.VIRTUAL_COLORS)
+                if cls.virtual
+                else (curses.COLOR_PAIRS, curses.COLORS)
+            )
+
+            if pair >= pairs or foreground >= colors or background >= colors:
+                return cls.color_pair(0)
+
+            if not cls.virtual:
+                curses.init_pair(pair, foreground, background)
+
+            cls.pairs[foreground, background] = pair
+
+        return cls.color_pair(pair)
+
+
 class Position(Enum):
     """For left/midde/right."""
 
@@ -38,7 +214,8 @@ class Position(Enum):
 
 
 class State(Enum):
-    """States that the status line can be in: either normal or insert."""
+    """States that the status line can be in: either normal, insert or search."""
 
     NORMAL = auto()
     INSERT = auto()
+    SEARCH = auto()